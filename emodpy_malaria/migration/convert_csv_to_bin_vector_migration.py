@@ -40,12 +40,13 @@ import collections
 import datetime
 import json
 import os
-import struct
 import sys
-import pandas as pd
 from enum import Enum
 import ast
 
+from emodpy_malaria.migration.edge_list import (read_header, summarize_edges, write_edges_to_bin,
+                                                find_duplicate_destinations)
+
 
 class GenderDataType(Enum):
     SAME_FOR_BOTH_GENDERS = "SAME_FOR_BOTH_GENDERS"
@@ -62,7 +63,9 @@ class MetaData:
         self.filename_out = ""
         self.num_columns = 0
         self.allele_combinations = []
-        self.data_df = None
+        self.filename_in = ""
+        self.header = "infer"
+        self.summary = None
         self.ref_id = None
 
 
@@ -100,12 +103,13 @@ def get_summary_data(metadata):
     # ----------------------------
     # collect data from CSV file
     # ----------------------------
-    data_df = metadata.data_df
-    metadata.num_columns = len(data_df.iloc[0])
+    headers = read_header(metadata.filename_in)
+    metadata.num_columns = len(headers)
     if metadata.num_columns < 3:
         raise ValueError(f"There are {metadata.num_columns} in the file, but we expect at least three. "
                          f"Please review comments for expected column configurations and try again.")
-    if is_number(data_df.columns[0]):  # no column headers
+    if is_number(headers[0]):  # no column headers
+        metadata.header = None
         if metadata.num_columns == 3:
             print(f"File doesn't seem to have headers, and with {metadata.num_columns} columns, "
                   "we are assuming 'FromNodeID', 'ToNodeID', 'Rate' column configuration.")
@@ -119,7 +123,6 @@ def get_summary_data(metadata):
                              f"obvious what the column configuration should be. If you are trying to create a "
                              f"VECTOR_MIGRATION_BY_GENETICS file, please add headers as shown in the comments.")
     else:  # has headers, force user to use one of the three formats
-        headers = data_df.columns
         if 'FromNodeID' not in headers[0] or 'ToNodeID' not in headers[1]:
             raise ValueError(f"With headers, we expect first two column headers to be 'FromNodeID', 'ToNodeID', but "
                              f"they are {headers[0]} and {headers[1]}.")
@@ -132,7 +135,7 @@ def get_summary_data(metadata):
         elif metadata.num_columns > 3:
             if "[]" in headers[2]:
                 metadata.gender_data_type = GenderDataType.VECTOR_MIGRATION_BY_GENETICS
-                for alleles in data_df.columns.tolist()[2:]:
+                for alleles in headers[2:]:
                     metadata.allele_combinations.append(ast.literal_eval(alleles))
             elif metadata.num_columns == 4:
                 if 'RateMales' in headers[2] and 'RateFemales' in headers[3]:
@@ -151,23 +154,17 @@ def get_summary_data(metadata):
     # Find the list node that individuals can migrate from
     # Also find the maximum number of nodes that one can go to from a give node.
     # This max is used in determine the layout of the binary data.
+    # The file is read in chunks, see edge_list.py
     # -------------------------------------------------------------------------
-    from_node_id_list = data_df[data_df.columns[0]].unique().tolist()
-    for from_node_id in from_node_id_list:
-        to_node_id_list = data_df[data_df.iloc[:, 0] == from_node_id].iloc[:, 1]
-        if len(to_node_id_list) != len(to_node_id_list.unique()):
-            raise ValueError(f"For 'FromNodeID' = {from_node_id}, there are non-unique 'ToNodeIDs'.")
-        if len(to_node_id_list) > metadata.max_destinations_per_node:
-            metadata.max_destinations_per_node = len(to_node_id_list)
+    metadata.summary = summarize_edges(metadata.filename_in, header=metadata.header)
+    metadata.max_destinations_per_node = metadata.summary.max_destinations_per_node
+    metadata.node_count = metadata.summary.node_count
 
     # -------------------------------------------------------------------
     # Create NodeOffsets string
     # This contains the location of each From Node's data in the bin file
     # -------------------------------------------------------------------
-    for from_node_id in from_node_id_list:
-        metadata.offset_str += '%0.8X' % from_node_id
-        metadata.offset_str += '%0.8X' % (metadata.node_count * metadata.max_destinations_per_node * 12) # 12 -> sizeof(uint32_t) + sizeof(double)
-        metadata.node_count += 1
+    metadata.offset_str = metadata.summary.offset_str
 
     # return metadata
 
@@ -176,33 +173,12 @@ def get_summary_data(metadata):
 # WriteBinFileGender
 # -----------------------------------------------------------------------------
 def write_bin_file(metadata):
-    bin_file = open(metadata.filename_out, 'wb')
-    data_df = metadata.data_df
-    from_node_id_list = data_df[data_df.columns[0]].unique().tolist()
-    for data_index in range(2, metadata.num_columns):
-        for from_node_id in from_node_id_list:
-            # Initialize with zeros
-            to_node_id_array = [0] * metadata.max_destinations_per_node
-            rates_array = [0] * metadata.max_destinations_per_node
-
-            # Populate arrays with data
-            to_node_id_list = data_df[data_df.iloc[:, 0] == from_node_id].iloc[:, 1].tolist()
-            for index, to_node_id in enumerate(to_node_id_list):
-                rate_list = data_df[(data_df.iloc[:, 0] == from_node_id) & (data_df.iloc[:, 1] == to_node_id)].iloc[:, data_index].to_list()
-                if len(rate_list) > 1:  # should only have one entry for the to/from node id combination
-                    raise ValueError(f"For FromNodeID {from_node_id} and ToNodeID {to_node_id}, there are multiple "
-                                     f"rates in column index {data_index}.")
-                to_node_id_array[index] = to_node_id
-                rates_array[index] = rate_list[0]  # get the one rate
-
-            # Format data into binary
-            bin_data_id = struct.pack('I' * len(to_node_id_array), *to_node_id_array)
-            bin_data_rt = struct.pack('d' * len(rates_array), *rates_array)
-
-            bin_file.write(bin_data_id)
-            bin_file.write(bin_data_rt)
-
-    bin_file.close()
+    write_edges_to_bin(metadata.filename_in, metadata.filename_out, metadata.summary, header=metadata.header)
+
+    from_node_id = find_duplicate_destinations(metadata.filename_out, metadata.summary)
+    if from_node_id is not None:
+        os.remove(metadata.filename_out)
+        raise ValueError(f"For 'FromNodeID' = {from_node_id}, there are non-unique 'ToNodeIDs'.")
 
 
 if __name__ == "__main__":
@@ -217,7 +193,7 @@ if __name__ == "__main__":
 
     meta_data = MetaData()
     meta_data.ref_id = id_ref
-    meta_data.data_df = pd.read_csv(filename_in)
+    meta_data.filename_in = filename_in
     meta_data.filename_out = filename_in.split(".")[0] + ".bin"
     get_summary_data(meta_data)
     write_bin_file(meta_data)
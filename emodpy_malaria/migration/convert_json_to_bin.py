@@ -25,6 +25,8 @@ import struct
 import sys
 from enum import Enum
 
+from emodpy_malaria.node_offsets import encode_node_offsets
+
 # -----------------------------------------------------------------------------
 # Age Limits
 # -----------------------------------------------------------------------------
@@ -237,13 +239,9 @@ def get_summary_data(json_data):
     # Create NodeOffsets string
     # This contains the location of each From Node's data in the bin file
     # -------------------------------------------------------------------
-    offset_str = ""
-    nodecount = 0
-
-    for from_node_id in from_node_id_list:
-        offset_str += '%0.8X' % from_node_id
-        offset_str += '%0.8X' % (nodecount * max_destinations * 12)  # 12 -> sizeof(uint32_t) + sizeof(double)
-        nodecount += 1
+    nodecount = len(from_node_id_list)
+    offsets = [index * max_destinations * 12 for index in range(nodecount)]  # 12 -> sizeof(uint32_t) + sizeof(double)
+    offset_str = encode_node_offsets(from_node_id_list, offsets, uppercase=True)
 
     return SummaryData(nodecount, offset_str, max_destinations)
 
@@ -20,10 +20,11 @@ import collections
 import datetime
 import json
 import os
-import struct
 import sys
 from enum import Enum
 
+from emodpy_malaria.migration.edge_list import summarize_edges, write_edges_to_bin
+
 
 class MigrationTypes(Enum):
     LOCAL_MIGRATION = "LOCAL_MIGRATION"
@@ -47,76 +48,20 @@ if __name__ == "__main__":
     mig_type = sys.argv[3]
     id_ref = sys.argv[4]
 
-    if mig_type not in MigrationTypes:
+    if mig_type not in MigrationTypes.__members__:
         print(f"Invalid MigrationType = {mig_type}, valid MigrationTypes are: "
               f"{MigrationTypes.LOCAL_MIGRATION}, {MigrationTypes.REGIONAL_MIGRATION},"
               f"{MigrationTypes.SEA_MIGRATION}, {MigrationTypes.AIR_MIGRATION}.")
         exit(-1)
 
-    max_destinations_per_node = 0
-    destinations_per_node = 0
-
-    fopen = open(filename)
-    fout = open(outfilename, 'wb')
-    net = {}
-    net_rate = {}
-
-    # ----------------------------
-    # collect data from CSV file
-    # ----------------------------
-    node_id_list = []
-    prev_id = -1
-    for line in fopen:
-        s = line.strip().split(',')
-        ID1 = int(float(s[0]))
-        ID2 = int(float(s[1]))
-        rate = float(s[2])
-        if ID1 not in net:
-            net[ID1] = []
-            net_rate[ID1] = []
-        net[ID1].append(ID2)
-        net_rate[ID1].append(rate)
-        if prev_id != ID1:
-            if destinations_per_node > max_destinations_per_node:
-                max_destinations_per_node = destinations_per_node
-            node_id_list.append(ID1)
-            print(prev_id, max_destinations_per_node)
-            prev_id = ID1
-            destinations_per_node = 0
-        destinations_per_node += 1
-
-    # ---------------
-    # Write bin file
-    # ---------------
-    for ID in net:
-        ID_write = []
-        ID_rate_write = []
-        for i in range(max_destinations_per_node):
-            ID_write.append(0)
-            ID_rate_write.append(0)
-        for i in range(len(net[ID])):
-            ID_write[i] = net[ID][i]
-            ID_rate_write[i] = net_rate[ID][i]
-        # The type needs to be 'I' because Linux handles 'L' differently than Windows.
-        s_write = struct.pack('I' * len(ID_write), *ID_write)
-        s_rate_write = struct.pack('d' * len(ID_rate_write), *ID_rate_write)
-        fout.write(s_write)
-        fout.write(s_rate_write)
-
-    fopen.close()
-    fout.close()
-
-    # -------------------------------------------------------------------
-    # Create NodeOffsets string
-    # This contains the location of each From Node's data in the bin file
-    # -------------------------------------------------------------------
-    offset_str = ""
-    nodecount = 0
-
-    for ID in net:
-        offset_str += '%0.8X' % ID
-        offset_str += '%0.8X' % (nodecount * max_destinations_per_node * 12)  # 12 -> sizeof(uint32_t) + sizeof(double)
-        nodecount += 1
+    # ------------------------------------------------------------------
+    # collect data from CSV file and write bin file, see edge_list.py
+    # NodeOffsets contains the location of each From Node's data in the bin file
+    # ------------------------------------------------------------------
+    summary = summarize_edges(filename, header=None, columns=[0, 1, 2])
+    write_edges_to_bin(filename, outfilename, summary, header=None, columns=[0, 1, 2])
+    max_destinations_per_node = summary.max_destinations_per_node
+    offset_str = summary.offset_str
 
     # -------------------
     # Write Metadata file
@@ -129,7 +74,7 @@ if __name__ == "__main__":
     else:
         migjson['Metadata']['Author'] = os.environ['USER']
 
-    migjson['Metadata']['NodeCount'] = len(node_id_list)
+    migjson['Metadata']['NodeCount'] = summary.node_count
     migjson['Metadata']['IdReference'] = id_ref
     migjson['Metadata']['DateCreated'] = datetime.datetime.now().ctime()
     migjson['Metadata']['Tool'] = os.path.basename(sys.argv[0])
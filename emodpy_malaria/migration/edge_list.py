@@ -0,0 +1,220 @@
+# edge_list.py
+# -----------------------------------------------------------------------------
+# Shared engine for converting migration edge lists (CSV/TXT files with one
+# FromNodeID, ToNodeID, Rate[, Rate, ...] row per source/destination pair) to
+# EMOD binary-formatted migration files.
+#
+# The edge list is read in chunks, so very large files convert in bounded memory:
+#   1) a first pass finds the source nodes (in order of first appearance) and the
+#      number of destinations for each source node, which gives DestinationsPerNode,
+#   2) a second pass scatters each chunk straight into a memory-mapped output file.
+#
+# The binary file has one Node Data section per rate column (layer) and source node.
+# Each Node Data section is DestinationsPerNode uint32 destination node ids followed
+# by DestinationsPerNode double rates, destinations are in the order they appear in
+# the edge list and unused entries are zero.
+# -----------------------------------------------------------------------------
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from emodpy_malaria.node_offsets import encode_node_offsets
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+
+class EdgeListSummary:
+    """
+    Description of an edge list (and the binary file written from it): the source node ids in order of first
+    appearance, the number of destinations for each of them and the rate column names.
+    """
+
+    def __init__(self, nodes: np.ndarray, counts: np.ndarray, rate_columns: list):
+        self.nodes = nodes
+        self.counts = counts
+        self.rate_columns = rate_columns
+
+    @property
+    def node_count(self) -> int:
+        return len(self.nodes)
+
+    @property
+    def max_destinations_per_node(self) -> int:
+        return int(self.counts.max(initial=0))
+
+    @property
+    def offset_str(self) -> str:
+        """NodeOffsets string, the location of each source node's data in the binary file"""
+        offsets = np.arange(self.node_count, dtype=np.int64) * self.max_destinations_per_node * 12
+        return encode_node_offsets(self.nodes, offsets, uppercase=True)
+
+
+def read_header(filename) -> list:
+    """
+    Read the first line of an edge list file as column names.
+
+    Args:
+        filename: path to the CSV/TXT file
+
+    Returns:
+        List of column names (the values of the first line if the file has no header)
+    """
+    return pd.read_csv(filename, nrows=0, skipinitialspace=True).columns.tolist()
+
+
+def read_edges(filename, header="infer", columns: list = None, chunksize: int = DEFAULT_CHUNK_SIZE):
+    """
+    Read an edge list file in chunks.
+
+    Args:
+        filename: path to the CSV/TXT file
+        header: "infer" if the first line holds column names, None if there is no header line
+        columns: (Optional) names or positions of the from node, to node and rate column(s) to read, in that
+            order, default is all columns in file order
+        chunksize: number of rows to read at once
+
+    Returns:
+        Iterator of (sources, destinations, rates) arrays per chunk, node ids as int64 and rates as a 2-D
+        (rows x rate columns) float64 array
+    """
+    for chunk in pd.read_csv(filename, header=header, usecols=columns, chunksize=chunksize, skipinitialspace=True,
+                             float_precision="round_trip"):
+        if columns is not None:
+            chunk = chunk[columns]
+        sources = chunk.iloc[:, 0].to_numpy(dtype=np.float64).astype(np.int64)
+        destinations = chunk.iloc[:, 1].to_numpy(dtype=np.float64).astype(np.int64)
+        rates = chunk.iloc[:, 2:].to_numpy(dtype=np.float64)
+        yield sources, destinations, rates
+
+
+def summarize_edges(filename, header="infer", columns: list = None,
+                    chunksize: int = DEFAULT_CHUNK_SIZE) -> EdgeListSummary:
+    """
+    Find the source nodes, in order of first appearance, and the number of destinations for each of them.
+
+    Args:
+        filename: path to the CSV/TXT file
+        header: "infer" if the first line holds column names, None if there is no header line
+        columns: (Optional) names or positions of the from node, to node and rate column(s) to read, in that
+            order, default is all columns in file order
+        chunksize: number of rows to read at once
+
+    Returns:
+        EdgeListSummary for the file
+    """
+    index = _NodeIndex()
+    counts = np.zeros(0, dtype=np.int64)
+    rate_columns = 0
+    for sources, _, rates in read_edges(filename, header=header, columns=columns, chunksize=chunksize):
+        rate_columns = rates.shape[1]
+        rows = index.add(sources)
+        counts = np.pad(counts, (0, len(index.nodes) - len(counts))) + np.bincount(rows, minlength=len(index.nodes))
+
+    if columns is not None:
+        names = list(columns[2:])
+    elif header is None:
+        names = list(range(2, 2 + rate_columns))
+    else:
+        names = read_header(filename)[2:]
+
+    return EdgeListSummary(index.nodes, counts, names)
+
+
+def write_edges_to_bin(filename_in, filename_out, summary: EdgeListSummary, header="infer", columns: list = None,
+                       chunksize: int = DEFAULT_CHUNK_SIZE) -> None:
+    """
+    Write an edge list file to an EMOD binary migration file, one layer per rate column.
+
+    Args:
+        filename_in: path to the CSV/TXT file
+        filename_out: path of the binary file to write
+        summary: EdgeListSummary of the file from summarize_edges()
+        header: "infer" if the first line holds column names, None if there is no header line
+        columns: (Optional) names or positions of the from node, to node and rate column(s) to read, in that
+            order, default is all columns in file order
+        chunksize: number of rows to read at once
+
+    Returns:
+        None
+    """
+    count = summary.max_destinations_per_node
+    record = np.dtype([("destinations", np.uint32, (count,)), ("rates", np.float64, (count,))])
+    shape = (len(summary.rate_columns), summary.node_count)
+    if record.itemsize == 0 or 0 in shape:
+        Path(filename_out).write_bytes(b"")
+        return
+
+    records = np.memmap(filename_out, dtype=record, mode="w+", shape=shape)
+    index = _NodeIndex(summary.nodes)
+    filled = np.zeros(summary.node_count, dtype=np.int64)
+    for sources, destinations, rates in read_edges(filename_in, header=header, columns=columns, chunksize=chunksize):
+        rows = index.rows(sources)
+        # position of each destination is the number of earlier destinations for the same source node
+        order = np.argsort(rows, kind="stable")
+        lengths = np.bincount(rows, minlength=summary.node_count)
+        ranks = np.empty(len(rows), dtype=np.int64)
+        ranks[order] = np.arange(len(rows)) - (np.cumsum(lengths) - lengths)[rows[order]]
+        slots = filled[rows] + ranks
+        filled += lengths
+        for layer in range(shape[0]):
+            records["destinations"][layer, rows, slots] = destinations
+            records["rates"][layer, rows, slots] = rates[:, layer]
+
+    records.flush()
+    del records
+
+    return
+
+
+def find_duplicate_destinations(filename, summary: EdgeListSummary, block_size: int = 1 << 16):
+    """
+    Find a source node with the same destination node listed more than once in a binary file written by
+    write_edges_to_bin().
+
+    Args:
+        filename: path to the binary file
+        summary: EdgeListSummary the file was written from
+        block_size: number of source nodes checked at once
+
+    Returns:
+        Source node id with a repeated destination node id, None if there is none
+    """
+    count = summary.max_destinations_per_node
+    if count == 0 or summary.node_count == 0:
+        return None
+    record = np.dtype([("destinations", np.uint32, (count,)), ("rates", np.float64, (count,))])
+    records = np.memmap(filename, dtype=record, mode="r", shape=(summary.node_count,))
+    for start in range(0, summary.node_count, block_size):
+        block = slice(start, start + block_size)
+        destinations = np.asarray(records["destinations"][block], dtype=np.int64)
+        destinations[np.arange(count) >= summary.counts[block, np.newaxis]] = -1
+        destinations.sort(axis=1)
+        repeated = ((destinations[:, 1:] == destinations[:, :-1]) & (destinations[:, 1:] >= 0)).any(axis=1)
+        if repeated.any():
+            return int(summary.nodes[start + np.flatnonzero(repeated)[0]])
+
+    return None
+
+
+class _NodeIndex:
+    """Map from node ids to rows, rows are assigned in order of first appearance"""
+
+    def __init__(self, nodes: np.ndarray = None):
+        self.nodes = np.zeros(0, dtype=np.int64) if nodes is None else np.asarray(nodes, dtype=np.int64)
+        self._sorted = np.argsort(self.nodes, kind="stable")
+
+    def add(self, ids: np.ndarray) -> np.ndarray:
+        """Add new node ids (in order of first appearance) and return the row for each of the given ids"""
+        unique, first = np.unique(ids, return_index=True)
+        new = unique[~np.isin(unique, self.nodes)]
+        if len(new):
+            new = new[np.argsort(first[np.isin(unique, new)], kind="stable")]
+            self.nodes = np.concatenate([self.nodes, new])
+            self._sorted = np.argsort(self.nodes, kind="stable")
+        return self.rows(ids)
+
+    def rows(self, ids: np.ndarray) -> np.ndarray:
+        """Row for each of the given (known) node ids"""
+        return self._sorted[np.searchsorted(self.nodes, ids, sorter=self._sorted)]
@@ -1,26 +1,34 @@
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from functools import partial
 import json
 from numbers import Integral
-from os import environ, SEEK_SET
+from os import environ
 from pathlib import Path
 from platform import system
 from warnings import warn
 
 import numpy as np
-import csv
+
+from scipy.sparse import csr_matrix
+from scipy.spatial import cKDTree
 
 # for from_params()
-import scipy.spatial.distance as spspd
 from emod_api.demographics import Demographics as Demog
 
-# for from_demog_and_param_gravity()
-from geographiclib.geodesic import Geodesic
+# for from_demographics_and_gravity_params()
+from pyproj import Geod
 
 from emod_api.migration.client import client
+from emodpy_malaria.migration.edge_list import read_edges, read_header
+from emodpy_malaria.node_offsets import decode_node_offsets, encode_node_offsets
 from emodpy_malaria.vector_config import add_vector_migration
 
+# number of rows counted at once by array backed layers
+_COUNT_BLOCK = 4096
+
+
 class Layer(dict):
     """
     The Layer object represents a mapping from source node (IDs) to destination node (IDs) for a particular
@@ -42,7 +50,7 @@ class Layer(dict):
             Maximum number of data values for any node in this layer
 
         """
-        count = max([len(entry) for entry in self.values()]) if len(self) else 0
+        count = max([len(entry) for entry in dict.values(self)]) if dict.__len__(self) else 0
         return count
 
     @property
@@ -71,6 +79,331 @@ class Layer(dict):
                 raise RuntimeError(f"Migration node IDs must be integer values (key = {key}).")
         return super().__getitem__(key)
 
+    def set_rates(self, sources, destinations, rates) -> None:
+        """Assign rates for many source/destination pairs at once, later values win for repeated pairs
+
+        Args:
+            sources: source node ids
+            destinations: destination node ids, one for each source node id
+            rates: rates, one for each source node id (or a single rate for all)
+
+        Returns:
+            None
+        """
+        for source, destination, rate in zip(*(array.tolist() for array in _rate_arrays(sources, destinations, rates))):
+            self[source][destination] = rate
+        return
+
+    def to_arrays(self) -> tuple:
+        """Flatten this layer into parallel arrays of source node ids, destination node ids and rates
+
+        Returns:
+            Tuple of (sources, destinations, rates) NumPy arrays with one entry per source/destination pair
+        """
+        entries = dict.values(self)
+        counts = np.fromiter((len(entry) for entry in entries), dtype=np.int64, count=len(entries))
+        total = int(counts.sum())
+        sources = np.repeat(np.fromiter(dict.keys(self), dtype=np.int64, count=len(entries)), counts)
+        destinations = np.fromiter((destination for entry in entries for destination in entry.keys()),
+                                   dtype=np.int64, count=total)
+        rates = np.fromiter((rate for entry in entries for rate in entry.values()), dtype=np.float64, count=total)
+        return sources, destinations, rates
+
+
+class _ArrayLayer(Layer):
+    """
+    Base for layers which keep rates for source nodes in arrays and only decode a source node into a dictionary
+    the first time that node is accessed by key. Decoded nodes are held in the layer dictionary as usual.
+    Subclasses provide self._nodes (source node id for each row), self._sorted (argsort of self._nodes) and
+    self._loaded (True for rows already decoded) along with _decode(), _count() and _arrays(). Like the
+    dictionary based Layer, a source node is only present if it has at least one nonzero rate.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._counts = None             # number of outbound rates for each row, computed once
+        self._unloaded_rows = None      # rows with rates which have not been decoded yet
+        self._unloaded_count = None
+
+        return
+
+    def _decode(self, row: int) -> dict:
+        """Dictionary of outbound rates for the given row"""
+        raise NotImplementedError
+
+    def _count(self, rows: np.ndarray) -> np.ndarray:
+        """Number of (nonzero) outbound rates for each of the given rows"""
+        raise NotImplementedError
+
+    def _arrays(self, rows: np.ndarray) -> tuple:
+        """(sources, destinations, rates) arrays for the given rows"""
+        raise NotImplementedError
+
+    def _sync(self) -> None:
+        """Bring the array data up to date before it is read"""
+        return
+
+    def _reset(self) -> None:
+        """Drop cached counts after the array data has changed"""
+        self._counts = None
+        self._unloaded_rows = None
+        self._unloaded_count = None
+
+        return
+
+    def _row_counts(self) -> np.ndarray:
+        """Number of outbound rates for each row, counted in blocks of rows the first time it is needed"""
+        self._sync()
+        if self._counts is None:
+            rows = np.arange(len(self._nodes))
+            blocks = [self._count(rows[start:start + _COUNT_BLOCK]) for start in range(0, len(rows), _COUNT_BLOCK)]
+            self._counts = np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.int64)
+        return self._counts
+
+    def _row(self, key) -> int:
+        """Row for the given source node id, -1 if the node is not in the array data or has already been decoded"""
+        if not isinstance(key, Integral):
+            return -1
+        self._sync()
+        position = np.searchsorted(self._nodes, key, sorter=self._sorted)
+        if position < len(self._nodes) and self._nodes[self._sorted[position]] == key:
+            row = int(self._sorted[position])
+            if not self._loaded[row]:
+                count = self._counts[row] if self._counts is not None else self._count(np.array([row]))[0]
+                if count > 0:
+                    return row
+        return -1
+
+    def _unloaded(self) -> np.ndarray:
+        """Rows with rates which have not been decoded into dictionaries yet"""
+        counts = self._row_counts()
+        if self._unloaded_rows is None:
+            self._unloaded_rows = np.flatnonzero((counts > 0) & ~self._loaded)
+            self._unloaded_count = len(self._unloaded_rows)
+        return self._unloaded_rows
+
+    @property
+    def DatavalueCount(self) -> int:
+        counts = self._row_counts()[self._unloaded()]
+        return max(int(counts.max(initial=0)), super().DatavalueCount)
+
+    def __getitem__(self, key):
+        if not dict.__contains__(self, key):
+            row = self._row(key)
+            if row >= 0:
+                dict.__setitem__(self, key, self._decode(row))
+                self._loaded[row] = True
+                self._unloaded_rows = None
+                if self._unloaded_count is not None:
+                    self._unloaded_count -= 1
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or self._row(key) >= 0
+
+    def __len__(self):
+        self._sync()
+        if self._unloaded_count is None:
+            self._unloaded()
+        return self._unloaded_count + dict.__len__(self)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        return self._nodes[self._unloaded()].tolist() + list(dict.keys(self))
+
+    def values(self):
+        return [self[key] for key in self.keys()]
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def to_arrays(self) -> tuple:
+        """Flatten this layer into parallel arrays of source node ids, destination node ids and rates
+
+        Nodes which have not been accessed are taken directly from the array data without creating dictionaries.
+
+        Returns:
+            Tuple of (sources, destinations, rates) NumPy arrays with one entry per source/destination pair
+        """
+        unloaded = self._arrays(self._unloaded())
+        loaded = super().to_arrays()
+
+        return tuple(np.concatenate([first, second]) for first, second in zip(unloaded, loaded))
+
+
+class MappedLayer(_ArrayLayer):
+    """
+    A Layer backed by a (memory-mapped) block of a migration binary file. Rates for a source node are only decoded
+    into a dictionary the first time that node is accessed by key, so large files can be inspected without loading
+    every rate into Python objects. As with from_file(lazy=False), source nodes listed in the file's NodeOffsets
+    whose rates are all zero are not present in the layer.
+    """
+
+    def __init__(self, nodes: np.ndarray, records: np.ndarray, rows: np.ndarray):
+        """
+        Args:
+            nodes (np.ndarray): source node ids
+            records (np.ndarray): structured array with "destinations" and "rates" fields, one record per row
+            rows (np.ndarray): row in records for each of the source node ids
+        """
+        super().__init__()
+        self._nodes = np.asarray(nodes, dtype=np.int64)
+        self._sorted = np.argsort(self._nodes, kind="stable")
+        self._loaded = np.zeros(len(self._nodes), dtype=bool)
+        self._rows = np.asarray(rows, dtype=np.int64)
+        self._destinations = records["destinations"]
+        self._rates = records["rates"]
+
+        return
+
+    def _decode(self, row: int) -> dict:
+        entry = defaultdict(float)
+        record = self._rows[row]
+        for destination, rate in zip(self._destinations[record].tolist(), self._rates[record].tolist()):
+            if rate > 0:
+                entry[destination] = rate
+        return entry
+
+    def _count(self, rows: np.ndarray) -> np.ndarray:
+        return np.count_nonzero(self._rates[self._rows[rows]] > 0, axis=1)
+
+    def _arrays(self, rows: np.ndarray) -> tuple:
+        records = self._rows[rows]
+        rates = np.asarray(self._rates[records], dtype=np.float64)
+        mask = rates > 0
+        sources = np.repeat(self._nodes[rows], np.count_nonzero(mask, axis=1))
+        destinations = np.asarray(self._destinations[records], dtype=np.int64)[mask]
+        return sources, destinations, rates[mask]
+
+
+class SparseLayer(_ArrayLayer):
+    """
+    A Layer backed by a scipy.sparse CSR matrix of rates with a map from node ids to matrix rows/columns. Rates can
+    be assigned in bulk with set_rates() and the number of rates for each source node is cached, so building and
+    querying layers with very many nodes does not require a dictionary per node. Rates assigned with set_rates()
+    are collected and merged into the matrix at once, the next time the layer is read. A source node is only
+    decoded into a dictionary the first time it is accessed by key.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._nodes = np.zeros(0, dtype=np.int64)
+        self._sorted = np.zeros(0, dtype=np.int64)
+        self._loaded = np.zeros(0, dtype=bool)
+        self._matrix = csr_matrix((0, 0), dtype=np.float64)
+        self._pending = []
+
+        return
+
+    def set_rates(self, sources, destinations, rates) -> None:
+        sources, destinations, rates = _rate_arrays(sources, destinations, rates)
+
+        # source nodes already decoded into dictionaries are updated in place
+        loaded = np.isin(sources, np.fromiter(dict.keys(self), dtype=np.int64, count=dict.__len__(self)))
+        for source, destination, rate in zip(sources[loaded].tolist(), destinations[loaded].tolist(),
+                                             rates[loaded].tolist()):
+            dict.__getitem__(self, source)[destination] = rate
+        if not loaded.all():
+            self._pending.append((sources[~loaded], destinations[~loaded], rates[~loaded]))
+
+        return
+
+    def _sync(self) -> None:
+        """Merge rates assigned with set_rates() into the matrix, keeping the last assignment for each pair"""
+        if not self._pending:
+            return
+        sources, destinations, rates = (np.concatenate(arrays) for arrays in zip(*self._pending))
+        self._pending = []
+
+        ids = np.concatenate([sources, destinations])
+        positions = np.searchsorted(self._nodes, ids)
+        if len(self._nodes) and np.array_equal(self._nodes[np.minimum(positions, len(self._nodes) - 1)], ids):
+            # no new nodes, only the rows of the assigned source nodes are rewritten
+            self._merge(positions[:len(sources)], positions[len(sources):], rates)
+        else:
+            self._rebuild(sources, destinations, rates)
+        self._reset()
+
+        return
+
+    def _merge(self, rows: np.ndarray, columns: np.ndarray, values: np.ndarray) -> None:
+        """Merge entries into the matrix rows, replacing existing entries for the same (row, column) pairs"""
+        matrix, count = self._matrix, len(self._nodes)
+
+        # the last assignment for each (row, column) pair, sorted on row and column
+        keys, last = np.unique((rows * count + columns)[::-1], return_index=True)
+        values = values[::-1][last]
+        touched = np.zeros(count, dtype=bool)
+        touched[keys // count] = True
+
+        # existing entries of the touched rows are merged with the new entries, new entries win
+        lengths = np.diff(matrix.indptr)
+        entry_rows = np.repeat(np.arange(count), lengths)
+        merge = touched[entry_rows]
+        keys, first = np.unique(np.concatenate([keys, entry_rows[merge] * count + matrix.indices[merge]]),
+                                return_index=True)
+        values = np.concatenate([values, matrix.data[merge]])[first]
+        merged_rows = keys // count
+
+        # untouched rows are copied to their new location unchanged
+        lengths = np.where(touched, np.bincount(merged_rows, minlength=count), lengths)
+        indptr = np.concatenate([[0], np.cumsum(lengths)])
+        indices = np.empty(indptr[-1], dtype=np.int64)
+        data = np.empty(indptr[-1], dtype=np.float64)
+        kept = np.flatnonzero(~merge)
+        positions = indptr[entry_rows[kept]] + kept - matrix.indptr[entry_rows[kept]]
+        indices[positions], data[positions] = matrix.indices[kept], matrix.data[kept]
+        positions = indptr[merged_rows] + np.arange(len(keys)) - np.searchsorted(merged_rows, merged_rows)
+        indices[positions], data[positions] = keys % count, values
+        self._matrix = csr_matrix((data, indices, indptr), shape=matrix.shape)
+
+        return
+
+    def _rebuild(self, sources: np.ndarray, destinations: np.ndarray, rates: np.ndarray) -> None:
+        """Rebuild the matrix over the union of existing and new node ids"""
+        # rows of source nodes decoded into dictionaries are dropped from the matrix
+        current = self._matrix.tocoo()
+        keep = ~self._loaded[current.row]
+        nodes = np.union1d(self._nodes, np.concatenate([sources, destinations]))
+        rows = np.searchsorted(nodes, np.concatenate([self._nodes[current.row[keep]], sources]))
+        columns = np.searchsorted(nodes, np.concatenate([self._nodes[current.col[keep]], destinations]))
+        values = np.concatenate([current.data[keep], rates])
+
+        # keep the last assignment for each (row, column) pair
+        _, last = np.unique((rows * len(nodes) + columns)[::-1], return_index=True)
+        keep = len(rows) - 1 - last
+
+        self._loaded = np.isin(nodes, self._nodes[self._loaded])
+        self._nodes = nodes
+        self._sorted = np.arange(len(nodes))
+        self._matrix = csr_matrix((values[keep], (rows[keep], columns[keep])), shape=(len(nodes), len(nodes)))
+
+        return
+
+    def _decode(self, row: int) -> dict:
+        start, end = self._matrix.indptr[row], self._matrix.indptr[row + 1]
+        return defaultdict(float, zip(self._nodes[self._matrix.indices[start:end]].tolist(),
+                                      self._matrix.data[start:end].tolist()))
+
+    def _count(self, rows: np.ndarray) -> np.ndarray:
+        return self._matrix.indptr[rows + 1] - self._matrix.indptr[rows]
+
+    def _arrays(self, rows: np.ndarray) -> tuple:
+        block = self._matrix[rows].tocoo()
+        return self._nodes[rows][block.row], self._nodes[block.col], block.data.astype(np.float64)
+
+
+def _rate_arrays(sources, destinations, rates) -> tuple:
+    """Convert source ids, destination ids and rates to matching 1-D int64, int64, float64 arrays"""
+    sources = np.asarray(sources, dtype=np.int64).ravel()
+    destinations = np.asarray(destinations, dtype=np.int64).ravel()
+    if len(sources) != len(destinations):
+        raise RuntimeError(f"Number of source ids ({len(sources)}) != number of destination ids ({len(destinations)}).")
+    rates = np.broadcast_to(np.asarray(rates, dtype=np.float64).ravel(), sources.shape)
+    return sources, destinations, rates
+
 
 _METADATA = "Metadata"
 _AUTHOR = "Author"
@@ -86,6 +419,9 @@ _INTERPOLATIONTYPE = "InterpolationType"
 _NODEOFFSETS = "NodeOffsets"
 _EMODPYMALARIA = "emodpy-malaria"
 
+_GEOD = Geod(ellps="WGS84")
+_EARTH_RADIUS_KM = 6371.0088
+
 
 class VectorMigration(object):
     """Represents vector migration data in a mapping from source node (IDs) to destination node (IDs) with rates
@@ -115,8 +451,16 @@ class VectorMigration(object):
     LOCAL_MIGRATION = 1
     REGIONAL_MIGRATION = 3
 
-    def __init__(self):
+    IDREF_LEGACY = "Legacy"
+
+    def __init__(self, sparse: bool = False):
+        """
+        Args:
+            sparse (bool): store rates in SparseLayer (scipy.sparse CSR matrix) layers rather than dictionary
+                based layers, for building migration between very many nodes with set_rates() (default = False)
+        """
 
+        self._sparse = sparse
         self._agesyears = []
         try:
             self._author = _author()
@@ -136,7 +480,7 @@ class VectorMigration(object):
         self._layers = []
         for gender in range(0, self._genderdatatype + 1):
             for age in range(0, len(self.AgesYears) if self.AgesYears else 1):
-                self._layers.append(Layer())
+                self._layers.append(SparseLayer() if self._sparse else Layer())
 
         return
 
@@ -262,11 +606,9 @@ class VectorMigration(object):
 
     @property
     def Nodes(self) -> list:
-        node_ids = set()
-        for layer in self._layers:
-            node_ids |= set(layer.keys())
-        node_ids = sorted(node_ids)
-        return node_ids
+        """list: sorted source node ids over all layers of this migration data file"""
+        node_ids = [np.fromiter(layer.keys(), dtype=np.int64, count=len(layer)) for layer in self._layers]
+        return np.unique(np.concatenate(node_ids)).tolist()
 
     @property
     def NodeCount(self) -> int:
@@ -275,14 +617,8 @@ class VectorMigration(object):
         return count
 
     def get_node_offsets(self, limit: int = 100) -> dict:
-        nodes = set()
-        for layer in self._layers:
-            nodes |= set(key for key in layer.keys())
         count = min(self.DatavalueCount, limit)
-        # offsets = {}
-        # for index, node in enumerate(sorted(nodes)):
-        #     offsets[node] = index * 12 * count
-        offsets = {node: 12 * index * count for index, node in enumerate(sorted(nodes))}
+        offsets = {node: 12 * index * count for index, node in enumerate(self.Nodes)}
         return offsets
 
     @property
@@ -347,6 +683,29 @@ class VectorMigration(object):
                 layer_index = self._index_for_gender_and_age(gender, age)
                 return self._layers[layer_index][node_id]
 
+    def set_rates(self, sources, destinations, rates, gender: int = None, age: float = None) -> None:
+        """Assign rates for many source/destination pairs at once in the layer for the given gender and age
+
+        Args:
+            sources: source node ids
+            destinations: destination node ids, one for each source node id
+            rates: rates, one for each source node id (or a single rate for all)
+            gender (int): 0 (male) or 1 (female), required if GenderDataType is
+                ONE_FOR_EACH_GENDER
+            age (float): age for selecting the age bucket, required if AgesYears is set
+
+        Returns:
+            None
+        """
+        if self.GenderDataType == VectorMigration.ONE_FOR_EACH_GENDER and \
+                gender not in [VectorMigration.SAME_FOR_BOTH_GENDERS, VectorMigration.ONE_FOR_EACH_GENDER]:
+            raise RuntimeError(f"Invalid gender ({gender}) for migration.")
+        if self.AgesYears and age is None:
+            raise RuntimeError("Age is required for migration with AgesYears.")
+        layer_index = self._index_for_gender_and_age(gender if gender else 0, age)
+        self._layers[layer_index].set_rates(sources, destinations, rates)
+        return
+
     def _index_for_gender_and_age(self, gender: int, age: float) -> int:
         """
         Use age to determine age bucket, 0 if no age differentiation.
@@ -395,13 +754,8 @@ class VectorMigration(object):
 
         actual_datavalue_count = min(self.DatavalueCount, value_limit)  # limited to 100 destinations
 
-        node_ids = set()
-        for layer in self._layers:
-            node_ids |= set(layer.keys())
-        node_ids = sorted(node_ids)
-
-        offsets = self.get_node_offsets(actual_datavalue_count)
-        node_offsets_string = ''.join([f"{node:08x}{offsets[node]:08x}" for node in sorted(offsets.keys())])
+        node_ids = self.Nodes
+        node_offsets_string = encode_node_offsets(node_ids, 12 * actual_datavalue_count * np.arange(len(node_ids)))
 
         metadata = {
             _METADATA: {
@@ -410,7 +764,7 @@ class VectorMigration(object):
                 _TOOLNAME: self.Tool,
                 _IDREFERENCE: self.IdReference,
                 _MIGRATIONTYPE: self._MIGRATION_TYPE_ENUMS[self.MigrationType],
-                _NODECOUNT: self.NodeCount,
+                _NODECOUNT: len(node_ids),
                 _DATAVALUECOUNT: actual_datavalue_count
             },
             _NODEOFFSETS: node_offsets_string
@@ -423,34 +777,15 @@ class VectorMigration(object):
         with metafile.open("w") as handle:
             json.dump(metadata, handle, indent=4, separators=(",", ": "))
 
-        def key_func(k, d=None):
-            return d[k]
-
         # layers are in age bucket order by gender, e.g. male 0-5, 5-10, 10+, female 0-5, 5-10, 10+
         # see _index_for_gender_and_age()
         # "Writing binary data to '{binaryfile}'
+        node_ids = np.array(node_ids, dtype=np.int64)
         with binaryfile.open("wb") as file:
             for layer in self:
-                for node in node_ids:
-                    destinations = np.zeros(actual_datavalue_count, dtype=np.uint32)
-                    rates = np.zeros(actual_datavalue_count, dtype=np.float64)
-                    if node in layer:
-
-                        # Sort keys descending on rate and ascending on node ID.
-                        # That way if we are truncating the list, we include the "most important" nodes.
-                        keys = sorted(layer[node].keys())  # sorted ascending on node ID
-                        keys = sorted(keys, key=partial(key_func, d=layer[node]), reverse=True)  # descending on rate
-
-                        if len(keys) > actual_datavalue_count:
-                            keys = keys[0:actual_datavalue_count]
-                        # save rates in ascending order so small rates are not lost when looking at the cumulative sum
-                        keys = list(reversed(keys))
-                        destinations[0:len(keys)] = keys
-                        rates[0:len(keys)] = [layer[node][key] for key in keys]
-                    else:
-                        warn(f"No destination nodes found for node {node}", category=UserWarning)
-                    destinations.tofile(file)
-                    rates.tofile(file)
+                for node in node_ids[~np.isin(node_ids, np.fromiter(layer.keys(), dtype=np.int64, count=len(layer)))]:
+                    warn(f"No destination nodes found for node {node}", category=UserWarning)
+                _layer_to_records(layer, node_ids, actual_datavalue_count).tofile(file)
 
         return binaryfile
 
@@ -470,12 +805,69 @@ class VectorMigration(object):
     }
 
 
-def from_file(binaryfile: Path, metafile: Path = None):
+def _layer_to_records(layer: Layer, node_ids: np.ndarray, count: int) -> np.ndarray:
+    """Build the binary records for one layer, one (destinations, rates) record per node in node_ids
+
+    Destinations for each source node are sorted descending on rate and ascending on node ID and truncated to
+    count entries, so the "most important" nodes are kept. They are then saved in ascending rate order so small
+    rates are not lost when looking at the cumulative sum. Unused entries are zero.
+
+    Args:
+        layer (Layer): layer to convert
+        node_ids (np.ndarray): sorted source node ids, one record is produced for each
+        count (int): number of destination values per node
+
+    Returns:
+        Structured array of uint32 destinations and float64 rates matching the EMOD binary layout
+    """
+    record = np.dtype([("destinations", np.uint32, (count,)), ("rates", np.float64, (count,))])
+    records = np.zeros(len(node_ids), dtype=record)
+    sources, destinations, rates = layer.to_arrays()
+    if count == 0 or len(sources) == 0:
+        return records
+
+    rows, destinations, rates, ranks, lengths = _rank_rates(np.searchsorted(node_ids, sources), destinations, rates,
+                                                            len(node_ids))
+    keep = ranks < count
+    rows, ranks, destinations, rates = rows[keep], ranks[keep], destinations[keep], rates[keep]
+
+    # reverse the kept entries so they are written in ascending rate order
+    columns = np.minimum(lengths, count)[rows] - 1 - ranks
+    records["destinations"][rows, columns] = destinations
+    records["rates"][rows, columns] = rates
+
+    return records
+
+
+def _rank_rates(rows: np.ndarray, destinations: np.ndarray, rates: np.ndarray, row_count: int) -> tuple:
+    """Sort entries on row, descending rate and ascending destination node ID and rank them within their row
+
+    Args:
+        rows (np.ndarray): row (source node index) of each entry, 0 <= row < row_count
+        destinations (np.ndarray): destination node id of each entry
+        rates (np.ndarray): rate of each entry
+        row_count (int): number of rows
+
+    Returns:
+        Tuple of sorted (rows, destinations, rates), the rank of each entry within its row (0 being the highest
+        rate) and the number of entries in each row
+    """
+    order = np.lexsort((destinations, -rates, rows))
+    rows, destinations, rates = rows[order], destinations[order], rates[order]
+    lengths = np.bincount(rows, minlength=row_count)
+    starts = np.cumsum(lengths) - lengths
+    ranks = np.arange(len(rows)) - starts[rows]
+    return rows, destinations, rates, ranks, lengths
+
+
+def from_file(binaryfile: Path, metafile: Path = None, lazy: bool = False):
     """Reads migration data file from given binary (and associated JSON metadata file)
 
     Args:
         binaryfile (Path): path to binary file (metadata file is assumed to be at same location with ".json" suffix)
         metafile (Path): use given metafile rather than inferring metafile name from the binary file name
+        lazy (bool): memory-map the binary file and only decode rates for a source node when it is accessed
+            (see MappedLayer), rather than reading all rates into memory (default = False)
 
     Returns:
         Migration object representing binary data in the given file.
@@ -517,19 +909,32 @@ def from_file(binaryfile: Path, metafile: Path = None):
     node_offsets = jason[_NODEOFFSETS]
     if len(node_offsets) != 16 * node_count:
         raise RuntimeError(f"Length of node offsets string {len(node_offsets)} != 16 * node count {node_count}.")
-    offsets = _parse_node_offsets(node_offsets, node_count)
+    nodes, offsets = decode_node_offsets(node_offsets)
     datavalue_count = metadata[_DATAVALUECOUNT]
-    with binaryfile.open("rb") as file:
-        for gender in range(1 if migration.GenderDataType == VectorMigration.SAME_FOR_BOTH_GENDERS else 2):
-            for age in migration.AgesYears if migration.AgesYears else [0]:
-                layer = migration._layers[migration._index_for_gender_and_age(gender, age)]
-                for node, offset in offsets.items():
-                    file.seek(offset, SEEK_SET)
-                    destinations = np.fromfile(file, dtype=np.uint32, count=datavalue_count)
-                    rates = np.fromfile(file, dtype=np.float64, count=datavalue_count)
-                    for destination, rate in zip(destinations, rates):
-                        if rate > 0:
-                            layer[node][destination] = rate
+
+    # each layer is a block of one (destinations, rates) record per node, offsets are relative to the block start
+    record = np.dtype([("destinations", np.uint32, (datavalue_count,)), ("rates", np.float64, (datavalue_count,))])
+    if record.itemsize == 0 or binaryfile.stat().st_size == 0:
+        records = np.zeros(0, dtype=record)
+        rows = np.zeros(node_count, dtype=np.int64)
+    else:
+        records = np.memmap(binaryfile, dtype=record, mode="r") if lazy else np.fromfile(binaryfile, dtype=record)
+        rows = offsets.astype(np.int64) // record.itemsize
+
+    for gender in range(1 if migration.GenderDataType == VectorMigration.SAME_FOR_BOTH_GENDERS else 2):
+        for age in migration.AgesYears if migration.AgesYears else [0]:
+            index = migration._index_for_gender_and_age(gender, age)
+            layer_rows = rows + index * node_count
+            if lazy:
+                migration._layers[index] = MappedLayer(nodes, records, layer_rows)
+            else:
+                layer = migration._layers[index]
+                for node, destinations, rates in zip(nodes.tolist(),
+                                                     records["destinations"][layer_rows],
+                                                     records["rates"][layer_rows]):
+                    mask = rates > 0
+                    for destination, rate in zip(destinations[mask].tolist(), rates[mask].tolist()):
+                        layer[node][destination] = rate
 
     return migration
 
@@ -545,7 +950,7 @@ def examine_file(filename):
     def name_for_migration_type(e: int) -> str:
         return VectorMigration._MIGRATION_TYPE_ENUMS[e] if e in VectorMigration._MIGRATION_TYPE_ENUMS else "unknown"
 
-    migration = from_file(filename)
+    migration = from_file(filename, lazy=True)
     print(f"Author:            {migration.Author}")
     print(f"DatavalueCount:    {migration.DatavalueCount}")
     print(f"DateCreated:       {migration.DateCreated:%a %B %d %Y %H:%M}")
@@ -568,18 +973,6 @@ def _author() -> str:
     return username
 
 
-def _parse_node_offsets(string: str, count: int) -> dict:
-    assert len(string) == 16 * count, f"Length of node offsets string {len(string)} != 16 * node count {count}."
-
-    offsets = {}
-    for index in range(count):
-        base = 16 * index
-        offset = base + 8
-        offsets[int(string[base:base + 8], 16)] = int(string[offset:offset + 8], 16)
-
-    return offsets
-
-
 def _try_parse_date(string: str) -> datetime:
     patterns = [
         "%a %b %d %Y %H:%M:%S",
@@ -618,6 +1011,8 @@ def from_params(demographics_file_path: any = None, population: int = 1e6, num_n
     demographics file created from a few parameters, as opposed to one from real-world data.
     Note that the 'demographics_file_path" input param is not used at this time but in future
     will be exploited to ensure nodes, etc., match.
+    Each node gets rates to its 30 nearest neighbours on the periodic grid, found with a cKDTree so
+    memory use grows linearly with num_nodes.
     """
     # ***** Write migration files *****
     # NOTE: This goes straight from input 'data' -- parameters -- to output file.
@@ -627,46 +1022,27 @@ def from_params(demographics_file_path: any = None, population: int = 1e6, num_n
     nlocs = np.random.rand(num_nodes, 2)
     nlocs[0, :] = 0.5
     nlocs = np.round(np.matmul(nlocs, ucellb), 4)
-    # Calculate inter-node distances on periodic grid
-    nlocs = np.tile(nlocs, (9, 1))
-    nlocs[0 * num_nodes:1 * num_nodes, :] += [0.0, 0.0]
-    nlocs[1 * num_nodes:2 * num_nodes, :] += [1.0, 0.0]
-    nlocs[2 * num_nodes:3 * num_nodes, :] += [-1.0, 0.0]
-    nlocs[3 * num_nodes:4 * num_nodes, :] += [0.0, 0.0]
-    nlocs[4 * num_nodes:5 * num_nodes, :] += [1.0, 0.0]
-    nlocs[5 * num_nodes:6 * num_nodes, :] += [-1.0, 0.0]
-    nlocs[6 * num_nodes:7 * num_nodes, :] += [0.0, 0.0]
-    nlocs[7 * num_nodes:8 * num_nodes, :] += [1.0, 0.0]
-    nlocs[8 * num_nodes:9 * num_nodes, :] += [-1.0, 0.0]
-    nlocs[0 * num_nodes:1 * num_nodes, :] += [0.0, 0.0]
-    nlocs[1 * num_nodes:2 * num_nodes, :] += [0.0, 0.0]
-    nlocs[2 * num_nodes:3 * num_nodes, :] += [0.0, 0.0]
-    nlocs[3 * num_nodes:4 * num_nodes, :] += [-0.5, 0.86603]
-    nlocs[4 * num_nodes:5 * num_nodes, :] += [-0.5, 0.86603]
-    nlocs[5 * num_nodes:6 * num_nodes, :] += [-0.5, 0.86603]
-    nlocs[6 * num_nodes:7 * num_nodes, :] += [0.5, -0.86603]
-    nlocs[7 * num_nodes:8 * num_nodes, :] += [0.5, -0.86603]
-    nlocs[8 * num_nodes:9 * num_nodes, :] += [0.5, -0.86603]
-    distgrid = spspd.squareform(spspd.pdist(nlocs))
-    nborlist = np.argsort(distgrid, axis=1)
-    npops = Demog.get_node_pops_from_params(population, num_nodes, fraction_rural)
-
-    migration = VectorMigration()
+    # Calculate inter-node distances on periodic grid, nodes are tiled 9 times (original and 8 neighbouring cells)
+    nlocs = np.tile(nlocs, (9, 1)).reshape(9, num_nodes, 2)
+    nlocs += np.array([[0.0, 0.0], [1.0, 0.0], [-1.0, 0.0]] * 3)[:, np.newaxis, :]
+    nlocs += np.repeat([[0.0, 0.0], [-0.5, 0.86603], [0.5, -0.86603]], 3, axis=0)[:, np.newaxis, :]
+    nlocs = nlocs.reshape(9 * num_nodes, 2)
+    # nearest 30 neighbours (plus the node itself) of each node in the original cell
+    neighbours = min(31, nlocs.shape[0])
+    distances, nborlist = cKDTree(nlocs).query(nlocs[:num_nodes], k=neighbours)
+    distances, nborlist = distances.reshape(num_nodes, -1)[:, 1:], nborlist.reshape(num_nodes, -1)[:, 1:]
+    npops = np.asarray(Demog.get_node_pops_from_params(population, num_nodes, fraction_rural))
+
+    tnodes = np.mod(nborlist, num_nodes)
+    sources = np.repeat(np.arange(num_nodes), 30)
+    destinations = np.zeros((num_nodes, 30), dtype=np.int64)
+    rates = np.zeros((num_nodes, 30), dtype=np.float64)
+    destinations[:, :neighbours - 1] = tnodes + 1
+    rates[:, :neighbours - 1] = migration_factor * npops[tnodes] / np.sum(npops) / distances
+
+    migration = VectorMigration(sparse=True)
     migration.IdReference = id_ref
-
-    for source in range(num_nodes):
-        for index in range(1, 31):
-            if distgrid.shape[0] > index:
-                destination = int(np.mod(nborlist[source, index], num_nodes)) + 1
-
-                tnode = int(np.mod(nborlist[source, index], num_nodes))
-                idnode = nborlist[source, index]
-                rate = migration_factor * npops[tnode] / np.sum(npops) / distgrid[source, idnode]
-            else:
-                destination = 0
-                rate = 0.0
-
-            migration[source][destination] = rate
+    migration.set_rates(sources, destinations, rates)
 
     migration.MigrationType = migration_type
     return migration
@@ -713,11 +1089,16 @@ def from_demog_and_param_gravity_webservice(demographics_file_path: str, params:
 # TODO: just use task to reload the demographics files into an object to use for this
 
 def from_demographics_and_gravity_params(demographics_object, gravity_params: list,
-                                         filename: str = None):
+                                         filename: str = None, k_nearest: int = None, max_distance: float = None,
+                                         block_size: int = None, processes: int = 1, value_limit: int = 100):
     """
         This function takes a demographics object, creates a vector migration file based on the populations and
         distances of nodes and saves to be used by the sim
 
+        Rates are computed with array arithmetic over blocks of source nodes, so memory use is bounded by
+        block_size * number of nodes, and only the value_limit highest rates for each source node (the ones written
+        to the file) are kept.
+
     Args:
         demographics_object: demographics object created by Demographics class (use Demographics.from_file()
             to load a demographics file you already have and pass in the returned object)
@@ -727,88 +1108,131 @@ def from_demographics_and_gravity_params(demographics_object, gravity_params: li
             if rate >= 1, 1 is used.
         filename: name of migration file to be created and added to the experiment,
             Default: vector_migration.bin
+        k_nearest: (Optional) only compute rates to the k nearest destination nodes of each source node
+        max_distance: (Optional) only compute rates to destination nodes within max_distance kilometers
+        block_size: (Optional) number of source nodes computed at once, default keeps about 4 million
+            node pairs per block
+        processes: (Optional) number of worker processes to split the source node blocks over, default 1
+        value_limit: limit on number of destination values to write for each source node (default = 100)
 
     Returns:
         VectorMigration object
     """
+    nodes = [node.to_dict() for node in demographics_object.nodes]
+    node_ids = np.array([node["NodeID"] for node in nodes], dtype=np.int64)
+    latitudes = np.array([node["NodeAttributes"]["Latitude"] for node in nodes], dtype=np.float64)
+    longitudes = np.array([node["NodeAttributes"]["Longitude"] for node in nodes], dtype=np.float64)
+    populations = np.array([node["NodeAttributes"]["InitialPopulation"] for node in nodes], dtype=np.float64)
+
+    tree = None
+    if k_nearest is not None or max_distance is not None:
+        tree = cKDTree(_unit_vectors(latitudes, longitudes))
+    if block_size is None:
+        block_size = max(1, (1 << 22) // max(1, len(nodes)))
+    blocks = [np.arange(start, min(start + block_size, len(nodes))) for start in range(0, len(nodes), block_size)]
+    compute = partial(_gravity_block, node_ids=node_ids, latitudes=latitudes, longitudes=longitudes,
+                      populations=populations, gravity_params=gravity_params, tree=tree, k_nearest=k_nearest,
+                      max_distance=max_distance, value_limit=value_limit)
+
+    v_migration = VectorMigration(sparse=True)
+    if processes > 1:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(compute, blocks))
+    else:
+        results = [compute(block) for block in blocks]
+    if results:
+        v_migration.set_rates(*(np.concatenate(arrays) for arrays in zip(*results)))
 
-    def _compute_migration_rate(gravity_params, from_node_population, to_node_population, distance):
-        """
-        Utility function for computing migration rates using gravity model
+    v_migration.IdReference = demographics_object.idref
+    v_migration.MigrationType = "LOCAL_MIGRATION"
+    # save migration object to file
+    if not filename:
+        filename = f"vector_migration.bin"
+    v_migration.to_file(Path(filename), value_limit=value_limit)
 
-        Args:
-            gravity_params: a list of four parameters that will affect the gravity model
-                gravity_params[0] denoted as g[0], etc, and they are used in the following way:
-                migration_rate = g[0] * (from_node_population^(g[1]-1)) * (to_node_population^g[2]) * (distance^g[3])
-                if migration_rate >= 1, 1 is used.
-            from_node_population: Initial_Population in the from_node
-            to_node_population: Initial_Population in the to_node
-            distance: distance, in kilomenteres, between two nodes
+    return v_migration
 
-        Returns:
-            Rate of vector migration from from_node to to_node
 
-        """
-        # If home/dest node has 0 pop, assume this node is the regional work node-- no local migration allowed
-        if from_node_population == 0 or to_node_population == 0:
-            return 0
-        else:
-            migration_rate = gravity_params[0] * (from_node_population ** (gravity_params[1] - 1)) \
-                             * (to_node_population ** gravity_params[2]) * (distance ** gravity_params[3])
-            final_rate = np.min([1., migration_rate])
-            return final_rate
+def _unit_vectors(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """Cartesian coordinates of the given latitudes/longitudes on the unit sphere"""
+    phi, theta = np.radians(latitudes), np.radians(longitudes)
+    return np.column_stack([np.cos(phi) * np.cos(theta), np.cos(phi) * np.sin(theta), np.sin(phi)])
 
-    def _compute_migration_dict(node_list: list, gravity_params: list, exclude_nodes: list = None):
-        """
-        Utility function for computing migration value map.
 
-        Args:
-            node_list: list of nodes as dictionaries created from the demographics object
-            gravity_params: a list of four parameters that will affect the gravity model
-                gravity_params[0] denoted as g[0], etc, and they are used in the following way:
-                rate = g[0] * (from_node_population^(g[1]-1)) * (to_node_population^g[2]) * (distance^g[3])
-                if rate >= 1, 1 is used.
-            exclude_nodes: a list of node ids for nodes you don't want any migration happening to or from.
+def _gravity_block(sources: np.ndarray, node_ids: np.ndarray, latitudes: np.ndarray, longitudes: np.ndarray,
+                   populations: np.ndarray, gravity_params: list, tree: cKDTree, k_nearest: int,
+                   max_distance: float, value_limit: int) -> tuple:
+    """
+    Compute gravity model rates from a block of source nodes to all (or the nearest) destination nodes.
 
-        Returns:
-            VectorMigration object based on demographics object that was passed in
-        """
-        excluded_nodes = set(exclude_nodes) if exclude_nodes else set()
-        v_migration = VectorMigration()
-        geodesic = Geodesic.WGS84
-
-        for source_node in node_list:
-            source_id = source_node["NodeID"]
-            src_lat = source_node["NodeAttributes"]["Latitude"]
-            src_long = source_node["NodeAttributes"]["Longitude"]
-            src_pop = source_node["NodeAttributes"]["InitialPopulation"]
-
-            if source_id in excluded_nodes:
-                continue
-            for destination_node in node_list:
-                if destination_node == source_node:
-                    continue
-                dest_id = destination_node["NodeID"]
-                if dest_id in excluded_nodes:
-                    continue
-                dst_lat = destination_node["NodeAttributes"]["Latitude"]
-                dst_long = destination_node["NodeAttributes"]["Longitude"]
-                dst_pop = destination_node["NodeAttributes"]["InitialPopulation"]
-
-                distance = geodesic.Inverse(src_lat, src_long, dst_lat, dst_long, Geodesic.DISTANCE)['s12'] / 1000  # km
-                rate = _compute_migration_rate(gravity_params, src_pop, dst_pop, distance)
-                v_migration[source_id][dest_id] = rate
-
-        return v_migration
+    Args:
+        sources: indices of the source nodes in this block
+        node_ids, latitudes, longitudes, populations: node data for all nodes
+        gravity_params: gravity model parameters, see from_demographics_and_gravity_params()
+        tree: cKDTree of node unit vectors when k_nearest or max_distance are used, otherwise None
+        k_nearest: only keep the k nearest destination nodes of each source node
+        max_distance: only keep destination nodes within max_distance kilometers
+        value_limit: only keep the value_limit highest rates for each source node
+
+    Returns:
+        Tuple of (source node ids, destination node ids, rates) arrays
+    """
+    count = len(node_ids)
+    if tree is None:
+        rows = np.repeat(np.arange(len(sources)), count)
+        columns = np.tile(np.arange(count), len(sources))
+    else:
+        # search on the unit sphere with a slightly larger radius and apply max_distance with geodesic distances
+        radius = np.inf if max_distance is None else 2 * np.sin(min(np.pi, 1.01 * max_distance / _EARTH_RADIUS_KM) / 2)
+        points = tree.data[sources]
+        if k_nearest is not None:
+            _, columns = tree.query(points, k=min(k_nearest + 1, count), distance_upper_bound=radius)
+            columns = columns.reshape(len(sources), -1)
+            rows = np.repeat(np.arange(len(sources)), columns.shape[1])
+            columns = columns.ravel()
+            # drop missing neighbours and the source node itself, then keep the k nearest
+            keep = (columns < count) & (columns != sources[rows])
+            rows, columns = rows[keep], columns[keep]
+            _, starts = np.unique(rows, return_index=True)
+            keep = (np.arange(len(rows)) - np.repeat(starts, np.diff(np.append(starts, len(rows))))) < k_nearest
+            rows, columns = rows[keep], columns[keep]
+        else:
+            neighbours = tree.query_ball_point(points, r=radius)
+            rows = np.repeat(np.arange(len(sources)), [len(entry) for entry in neighbours])
+            columns = np.fromiter((column for entry in neighbours for column in entry), dtype=np.int64,
+                                  count=len(rows))
+
+    origins = sources[rows]
+    keep = columns != origins
+    rows, origins, columns = rows[keep], origins[keep], columns[keep]
+
+    _, _, distance = _GEOD.inv(longitudes[origins], latitudes[origins], longitudes[columns], latitudes[columns])
+    distance = distance / 1000  # km
+    if max_distance is not None:
+        keep = distance <= max_distance
+        rows, origins, columns, distance = rows[keep], origins[keep], columns[keep], distance[keep]
+
+    from_population, to_population = populations[origins], populations[columns]
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        rates = gravity_params[0] * (from_population ** (gravity_params[1] - 1)) \
+            * (to_population ** gravity_params[2]) * (distance ** gravity_params[3])
+    rates = np.minimum(1., rates)
+    # If home/dest node has 0 pop, assume this node is the regional work node-- no local migration allowed
+    rates[(from_population == 0) | (to_population == 0)] = 0
+
+    # when every source has the same number of destinations, drop rates below each source's value_limit-th
+    # highest rate before sorting (ties are kept so truncation matches VectorMigration.to_file())
+    lengths = np.bincount(rows, minlength=len(sources))
+    if len(rows) and value_limit < lengths[0] and (lengths == lengths[0]).all():
+        thresholds = -np.partition(-rates.reshape(len(sources), -1), value_limit - 1, axis=1)[:, value_limit - 1]
+        keep = rates >= thresholds[rows]
+        rows, columns, rates = rows[keep], columns[keep], rates[keep]
+
+    rows, destinations, rates, ranks, _ = _rank_rates(rows, node_ids[columns], rates, len(sources))
+    keep = ranks < value_limit
+
+    return node_ids[sources][rows[keep]], destinations[keep], rates[keep]
 
-    nodes = [node.to_dict() for node in demographics_object.nodes]
-    v_migration = _compute_migration_dict(nodes, gravity_params)
-    v_migration.IdReference = demographics_object.idref
-    v_migration.MigrationType = "LOCAL_MIGRATION"
-    # save migration object to file
-    if not filename:
-        filename = f"vector_migration.bin"
-    v_migration.to_file(Path(filename))
 
 # by gender, by age
 _mapping_fns = {
@@ -864,17 +1288,19 @@ def from_csv(filename_path: str, id_reference: str, migration_type: str = "LOCAL
         Migration object to be manipulated or written out as a file using to_file() function
 
     """
-    migration = VectorMigration()
+    columns = ["from_node", "to_node", "rate"]
+    assert all(column in read_header(filename_path) for column in columns), \
+        "Please make sure you have column headers of 'from_node', 'to_node', 'rate' in your file.\n"
+    edges = [(sources, destinations, rates[:, 0]) for sources, destinations, rates in read_edges(filename_path,
+                                                                                               columns=columns)]
+    assert sum(len(sources) for sources, _, _ in edges), \
+        "Please make sure you have column headers of 'from_node', 'to_node', 'rate' in your file.\n"
+
+    migration = VectorMigration(sparse=True)
     migration.IdReference = id_reference
     migration._migrationtype = VectorMigration._MIGRATION_TYPE_LOOKUP[migration_type]
     if author:
         migration.Author = author
-    with Path(filename_path).open("r") as csvfile:
-        reader = csv.DictReader(csvfile)
-        csv_data_read = False
-        for row in reader:
-            csv_data_read = True
-            migration[int(row['from_node'])][int(row['to_node'])] = float(row['rate'])
-        assert csv_data_read, "Please make sure you have column headers of 'from_node', 'to_node', 'rate' in your file.\n"
+    migration.set_rates(*(np.concatenate(arrays) for arrays in zip(*edges)))
 
     return migration
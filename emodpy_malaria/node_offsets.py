@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+"""
+Codec for the NodeOffsets string used by EMOD binary file metadata (.bin.json), e.g. weather and migration files.
+The string is a sequence of 16 hex digit entries, 8 hex digits of a node id followed by 8 hex digits of the
+byte offset of that node's data in the binary file.
+"""
+
+from typing import Iterable, Tuple
+
+import numpy as np
+
+_MAX_UINT32 = 0xFFFFFFFF
+_ENTRY_LENGTH = 16   # hex digits per entry, node id and offset as 8 hex digits each
+
+
+def decode_node_offsets(offset_str: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Convert a node offset string into arrays of node ids and offsets.
+
+    Args:
+        offset_str: The node offset string, as it appears in the metadata file (upper or lower case hex digits).
+
+    Returns:
+        Tuple of two uint32 arrays, node ids and corresponding offsets, in the order they appear in the string.
+    """
+    if len(offset_str) % _ENTRY_LENGTH != 0:
+        raise ValueError(f"Length of node offsets string {len(offset_str)} is not a multiple of {_ENTRY_LENGTH}.")
+
+    pairs = np.frombuffer(bytes.fromhex(offset_str), dtype=">u4").reshape(-1, 2)
+    return pairs[:, 0].astype(np.uint32), pairs[:, 1].astype(np.uint32)
+
+
+def encode_node_offsets(nodes: Iterable[int], offsets: Iterable[int], uppercase: bool = False) -> str:
+    """
+    Convert node ids and offsets into a node offset string.
+
+    Args:
+        nodes: Node ids.
+        offsets: Node offsets, one per node id.
+        uppercase: (Optional) Flag indicating whether to use upper case hex digits. The default is lower case.
+
+    Returns:
+        The node offset string, as it appears in the metadata file.
+    """
+    nodes = np.fromiter(nodes, dtype=np.int64) if not isinstance(nodes, np.ndarray) else nodes.astype(np.int64)
+    offsets = np.fromiter(offsets, dtype=np.int64) if not isinstance(offsets, np.ndarray) else offsets.astype(np.int64)
+    if len(nodes) != len(offsets):
+        raise ValueError(f"Number of nodes {len(nodes)} doesn't match number of offsets {len(offsets)}.")
+
+    pairs = np.stack([nodes, offsets], axis=1)
+    if np.any((pairs < 0) | (pairs > _MAX_UINT32)):
+        raise ValueError(f"Node ids and offsets must be integers in [0, {_MAX_UINT32}] interval.")
+
+    offset_str = pairs.astype(">u4").tobytes().hex()
+    return offset_str.upper() if uppercase else offset_str
@@ -0,0 +1,5 @@
+from emodpy_malaria.serialization.population_transforms import PopulationTransform, CallbackTransform, NodeReport, \
+    transform_population, scan_population
+from emodpy_malaria.serialization.zero_infections import ZeroInfectionsTransform
+from emodpy_malaria.serialization.replace_genomes import ReplaceGenomesTransform
+from emodpy_malaria.serialization.population_tables import ExtractTransform, extract
@@ -0,0 +1,216 @@
+"""
+Chunk level reading and writing of serialized population (.dtk) files, so nodes can be processed one at a time, or
+in parallel, without loading the whole population.
+
+Files of version 2 to 5 consist of a simulation chunk followed by one chunk per node. Version 6 files consist of a
+simulation chunk, node chunks and human collection chunks, which reference their node by suid.
+"""
+
+import json
+import shutil
+import tempfile
+import time
+import emod_api.serialization.dtkFileSupport as dtk
+import emod_api.serialization.dtkFileTools as dft
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterable, List, Tuple, Union
+
+# Header size is written as a 12 characters long decimal value, after the magic 'number'
+_HEADER_SIZE_LENGTH = 12
+
+# Header of version 2 to 5 files (DtkHeader) or version 6 files (DtkHeaderV6), both SerialObjects
+DtkHeader = Union[dft.DtkHeader, dft.DtkHeaderV6]
+
+
+@dataclass
+class Chunk:
+    """Location and compression engine (NONE, LZ4 or SNAPPY) of a chunk in a serialized population file."""
+    offset: int
+    size: int
+    engine: str
+
+
+@dataclass
+class NodeChunks:
+    """Chunks of a node: the node chunk and, in version 6 files, human collection chunks."""
+    suid: Union[int, None]
+    node: Chunk
+    humans: List[Chunk] = field(default_factory=list)
+    num_humans: List[int] = field(default_factory=list)
+
+
+@dataclass
+class NodeData:
+    """Compressed data of a node, as (engine, data) for the node chunk and (engine, data, num_humans) per human
+    collection chunk."""
+    suid: Union[int, None]
+    node: Tuple[str, bytes]
+    humans: List[Tuple[str, bytes, int]] = field(default_factory=list)
+
+
+@dataclass
+class DtkLayout:
+    """Header and chunk locations of a serialized population file."""
+    header: DtkHeader
+    sim: Chunk
+    nodes: List[NodeChunks]
+
+    @property
+    def version(self) -> int:
+        return self.header.version
+
+
+def read_layout(file_path: Union[str, Path]) -> DtkLayout:
+    """
+    Reads the header of a serialized population file and determines chunk locations.
+
+    Args:
+        file_path: Serialized population file.
+
+    Returns:
+        DtkLayout object.
+    """
+    header, offset = _read_header(file_path)
+    if header.version == 1:
+        raise UserWarning("Serialized population files of version 1 consist of a single chunk and can't be read "
+                          "node by node.")
+
+    if header.version < 6:
+        chunks = []
+        for size in header.chunksizes:
+            chunks.append(Chunk(offset, size, header.engine))
+            offset += size
+        return DtkLayout(header=header, sim=chunks[0], nodes=[NodeChunks(suid=None, node=c) for c in chunks[1:]])
+
+    def next_chunk(size, v6_compression):
+        nonlocal offset
+        chunk = Chunk(offset, int(size, 16), dft._compression_type_v6_to_old(v6_compression))
+        offset += chunk.size
+        return chunk
+
+    sim = next_chunk(header.sim_chunk_size, header.sim_compression)
+    nodes = {}
+    for suid, size, compression in zip(header.node_suids, header.node_chunk_sizes, header.node_compressions):
+        nodes[int(suid, 16)] = NodeChunks(suid=int(suid, 16), node=next_chunk(size, compression))
+    for suid, size, compression, num_humans in zip(header.human_node_suids, header.human_chunk_sizes,
+                                                   header.human_compressions, header.human_num_humans):
+        nodes[int(suid, 16)].humans.append(next_chunk(size, compression))
+        nodes[int(suid, 16)].num_humans.append(int(num_humans, 16))
+
+    return DtkLayout(header=header, sim=sim, nodes=list(nodes.values()))
+
+
+def read_version(file_path: Union[str, Path]) -> int:
+    """Returns the version of a serialized population file."""
+    return _read_header(file_path)[0].version
+
+
+def read_chunk(handle: BinaryIO, chunk: Chunk) -> bytes:
+    """Reads compressed chunk data."""
+    handle.seek(chunk.offset)
+    data = handle.read(chunk.size)
+    if len(data) != chunk.size:
+        raise UserWarning(f"Only read {len(data)} bytes of {chunk.size} for chunk at offset {chunk.offset}.")
+    return data
+
+
+def load_chunk(data: bytes, engine: str) -> dtk.SerialObject:
+    """Uncompresses and parses chunk data."""
+    return json.loads(str(dft.uncompress(data, engine), 'utf-8'), object_hook=dtk.SerialObject)
+
+
+def dump_chunk(item: dict, engine: str = None) -> Tuple[str, bytes]:
+    """
+    Serializes and compresses an object.
+
+    Args:
+        item: Object (simulation, node or human collection).
+        engine: (Optional) Compression engine. If not specified, the engine is chosen based on the data size,
+                like in version 6 files.
+
+    Returns:
+        Tuple of compression engine and compressed data.
+    """
+    data = json.dumps(item, separators=(',', ':'))
+    if engine is None:
+        engine = dft._compression_type_v6_to_old(dft._determine_v6_compression_type(data))
+    return engine, dft.compress(data.encode(), engine)
+
+
+def write_file(dest: BinaryIO,
+               header: DtkHeader,
+               sim: Union[Tuple[str, bytes], Callable[[], Tuple[str, bytes]]],
+               nodes: Iterable[NodeData]) -> None:
+    """
+    Writes a serialized population file, in the format (version) of the header. Chunks are spooled to temp files
+    first, since the header, which precedes them, holds chunk sizes, and in version 6 files human collection chunks
+    follow all node chunks.
+
+    Args:
+        dest: Output file handle.
+        header: Header of the input file, which is updated.
+        sim: Compression engine and data of the simulation chunk, or a function returning them, which is called
+             after all nodes are written (e.g. if the simulation depends on node contents).
+        nodes: Node data, in file order.
+
+    Returns:
+        None
+    """
+    temp_dir = Path(dest.name).parent
+    with tempfile.TemporaryFile(dir=temp_dir) as node_body, tempfile.TemporaryFile(dir=temp_dir) as human_body:
+        node_chunks, human_chunks = [], []
+        for node in nodes:
+            node_body.write(node.node[1])
+            node_chunks.append((node.suid, node.node[0], len(node.node[1])))
+            for engine, data, num_humans in node.humans:
+                human_body.write(data)
+                human_chunks.append((node.suid, engine, len(data), num_humans))
+
+        sim = sim() if callable(sim) else sim
+        _update_header(header, (sim[0], len(sim[1])), node_chunks, human_chunks)
+        if header.version <= 3:
+            header_text = json.dumps({'metadata': header}, separators=(',', ':'))
+        else:
+            header_text = json.dumps(header, separators=(',', ':')).replace('"engine"', '"compression"')
+
+        dest.write(dft.IDTK.encode())
+        dest.write('{:>{}}'.format(len(header_text), _HEADER_SIZE_LENGTH).encode())
+        dest.write(header_text.encode())
+        dest.write(sim[1])
+        for body in [node_body, human_body]:
+            body.seek(0)
+            shutil.copyfileobj(body, dest)
+
+
+def _read_header(file_path: Union[str, Path]) -> Tuple[DtkHeader, int]:
+    """Reads the header, returns it with the offset of the first chunk."""
+    with open(file_path, 'rb') as handle:
+        dft.__check_magic_number__(handle)
+        header = dft.__read_header__(handle)
+        return header, handle.tell()
+
+
+def _update_header(header: DtkHeader, sim: Tuple[str, int], node_chunks: List[Tuple],
+                   human_chunks: List[Tuple]) -> None:
+    """Updates header chunk sizes and compressions, from (engine, size) of the simulation chunk,
+    (suid, engine, size) of node chunks and (suid, engine, size, num_humans) of human collection chunks."""
+    header.date = time.strftime('%a %b %d %H:%M:%S %Y')
+    if header.version < 6:
+        header.chunksizes = [sim[1]] + [size for _, _, size in node_chunks]
+        header.chunkcount = len(header.chunksizes)
+        header.bytecount = sum(header.chunksizes)
+        return
+
+    def v6(engine):
+        return dft._compression_type_old_to_v6(engine)
+
+    header.sim_compression = v6(sim[0])
+    header.sim_chunk_size = format(sim[1], '016x')
+    header.node_suids = [format(suid, '016x') for suid, _, _ in node_chunks]
+    header.node_compressions = [v6(engine) for _, engine, _ in node_chunks]
+    header.node_chunk_sizes = [format(size, '016x') for _, _, size in node_chunks]
+    header.human_node_suids = [format(suid, '016x') for suid, _, _, _ in human_chunks]
+    header.human_compressions = [v6(engine) for _, engine, _, _ in human_chunks]
+    header.human_chunk_sizes = [format(size, '016x') for _, _, size, _ in human_chunks]
+    header.human_num_humans = [format(num_humans, '016x') for _, _, _, num_humans in human_chunks]
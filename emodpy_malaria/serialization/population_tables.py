@@ -0,0 +1,322 @@
+#!/usr/bin/python
+
+"""
+Columnar extraction of serialized population contents. Humans, infections, drugs, vector cohorts and their
+parasites are flattened into typed tables with node ids and genome hashes and written to Parquet files, node by
+node, so populations can be queried (e.g. infected vectors per node by genome) without parsing .dtk files again.
+Requires pyarrow package.
+"""
+
+import argparse
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Union
+
+from emodpy_malaria.serialization.population_transforms import PopulationTransform, scan_population
+from emodpy_malaria.serialization.replace_genomes import NUCLEOTIDE_CHARS
+
+_PARQUET_SUFFIX = ".parquet"
+
+
+def _genome_hash(genome: dict, key: str = "m_HashCode"):
+    inner = genome.get("m_pInner") if genome else None
+    return inner.get(key) if inner else None
+
+
+def _infection_genome(infection: dict):
+    return (infection.get("infection_strain") or {}).get("m_Genome")
+
+
+def _female_genome(parasite: dict):
+    return (parasite.get("m_pStrainIdentity") or {}).get("m_Genome")
+
+
+def _barcode(value: dict) -> str:
+    return NUCLEOTIDE_CHARS[value.get("m_NucleotideSequence", [])].tobytes().decode()
+
+
+# Table columns as (name, arrow type, value function). Node ids are unsigned 32 bit integers, as in EMOD. Value
+# functions are called with the visited object, its parent and the node id. The parent of infections and drugs is
+# the human, of vector cohorts it's the vector population and queue name, of vector parasites the cohort, queue
+# name and stage.
+TABLES = {
+    "humans": [
+        ("node_id", "uint32", lambda h, p, n: n),
+        ("human_id", "int64", lambda h, p, n: h["suid"]["id"]),
+        ("age", "float64", lambda h, p, n: h.get("m_age")),
+        ("gender", "int8", lambda h, p, n: h.get("m_gender")),
+        ("mc_weight", "float64", lambda h, p, n: h.get("m_mc_weight")),
+        ("is_infected", "bool_", lambda h, p, n: h.get("m_is_infected")),
+        ("infectiousness", "float32", lambda h, p, n: h.get("infectiousness")),
+        ("num_infections", "int32", lambda h, p, n: len(h.get("infections", []))),
+        ("female_gametocytes", "float64", lambda h, p, n: h.get("m_female_gametocytes")),
+        ("male_gametocytes", "float64", lambda h, p, n: h.get("m_male_gametocytes")),
+    ],
+    "infections": [
+        ("node_id", "uint32", lambda i, h, n: n),
+        ("human_id", "int64", lambda i, h, n: h["suid"]["id"]),
+        ("infection_id", "int64", lambda i, h, n: (i.get("suid") or {}).get("id")),
+        ("duration", "float32", lambda i, h, n: i.get("duration")),
+        ("total_duration", "float32", lambda i, h, n: i.get("total_duration")),
+        ("infectiousness", "float32", lambda i, h, n: i.get("infectiousness")),
+        ("genome_hash", "int32", lambda i, h, n: _genome_hash(_infection_genome(i))),
+        ("barcode_hash", "int32", lambda i, h, n: _genome_hash(_infection_genome(i), "m_BarcodeHashcode")),
+    ],
+    "drugs": [
+        ("node_id", "uint32", lambda d, h, n: n),
+        ("human_id", "int64", lambda d, h, n: h["suid"]["id"]),
+        ("drug_class", "string", lambda d, h, n: d.get("__class__")),
+        ("name", "string", lambda d, h, n: d.get("m_Name")),
+        ("remaining_doses", "int32", lambda d, h, n: d.get("remaining_doses")),
+        ("time_between_doses", "float32", lambda d, h, n: d.get("time_between_doses")),
+        ("current_concentration", "float32", lambda d, h, n: d.get("current_concentration")),
+        ("current_efficacy", "float32", lambda d, h, n: d.get("current_efficacy")),
+    ],
+    "vectors": [
+        ("node_id", "uint32", lambda c, p, n: n),
+        ("species", "string", lambda c, p, n: p[0].get("species_ID")),
+        ("queue", "string", lambda c, p, n: p[1]),
+        ("cohort_id", "int64", lambda c, p, n: c.get("m_ID")),
+        ("state", "int8", lambda c, p, n: c.get("state")),
+        ("age", "float32", lambda c, p, n: c.get("age")),
+        ("progress", "float32", lambda c, p, n: c.get("progress")),
+        ("population", "int32", lambda c, p, n: c.get("population", 1)),
+        ("num_oocysts", "int32", lambda c, p, n: len(c.get("m_OocystCohorts", []))),
+        ("num_sporozoites", "int32", lambda c, p, n: len(c.get("m_SporozoiteCohorts", []))),
+    ],
+    "vector_parasites": [
+        ("node_id", "uint32", lambda v, p, n: n),
+        ("cohort_id", "int64", lambda v, p, n: p[0].get("m_ID")),
+        ("queue", "string", lambda v, p, n: p[1]),
+        ("stage", "string", lambda v, p, n: p[2]),
+        ("population", "int32", lambda v, p, n: v.get("m_Population")),
+        ("male_genome_hash", "int32", lambda v, p, n: _genome_hash(v.get("m_MaleGametocyteGenome"))),
+        ("female_genome_hash", "int32", lambda v, p, n: _genome_hash(_female_genome(v))),
+    ],
+    "genomes": [
+        ("genome_hash", "int32", lambda g, p, n: g["key"]),
+        ("barcode_hash", "int32", lambda g, p, n: g["value"].get("m_BarcodeHashcode")),
+        ("barcode", "string", lambda g, p, n: _barcode(g["value"])),
+    ],
+}
+
+_HUMAN_TABLES = ["humans", "infections", "drugs"]
+_VECTOR_TABLES = ["vectors", "vector_parasites"]
+
+
+class ExtractTransform(PopulationTransform):
+    """
+    Serialized population transform, which collects rows of the selected tables (TABLES) and writes them to Parquet
+    files, one row group per node. Only selected columns are computed. Files are written under temp names and
+    renamed by close().
+    """
+
+    def __init__(self, out_dir: Union[str, Path], columns: Dict[str, List[str]]):
+        """
+        Args:
+            out_dir: Output directory.
+            columns: Dictionary of table names and column names.
+        """
+        self.out_dir = Path(out_dir)
+        self.columns = columns
+        self._writers = {}
+        self._functions = {}
+        self._node_id = None
+        self._values = {}
+
+    def __getstate__(self):
+        # Parquet writers stay in the main process, node copies only collect values.
+        state = self.__dict__.copy()
+        state["_writers"] = {}
+        state["_functions"] = {}
+        return state
+
+    def visits(self, callback):
+        if callback in ["visit_human", "visit_infection"]:
+            return any([t in self.columns for t in _HUMAN_TABLES])
+        if callback in ["visit_vector_cohort", "visit_oocyst", "visit_sporozoite"]:
+            return any([t in self.columns for t in _VECTOR_TABLES])
+        if callback == "end":
+            return "genomes" in self.columns
+        return super().visits(callback)
+
+    def begin_node(self, node):
+        self._node_id = node.externalId
+        self._values = {table: [[] for _ in columns] for table, columns in self.columns.items()}
+        return True
+
+    def visit_human(self, human, node):
+        self._add_row("humans", human, None)
+        if "drugs" in self.columns:
+            for intervention in (human.get("interventions") or {}).get("interventions", []):
+                if "Drug" in intervention.get("__class__", ""):
+                    self._add_row("drugs", intervention, human)
+        return True
+
+    def visit_infection(self, infection, human, node):
+        self._add_row("infections", infection, human)
+
+    def visit_vector_cohort(self, cohort, queue, vector_population, node):
+        self._add_row("vectors", cohort, (vector_population, queue))
+        return True
+
+    def visit_oocyst(self, oocyst, cohort, queue, node):
+        self._add_row("vector_parasites", oocyst, (cohort, queue, "oocyst"))
+
+    def visit_sporozoite(self, sporozoite, cohort, queue, node):
+        self._add_row("vector_parasites", sporozoite, (cohort, queue, "sporozoite"))
+
+    def end_node(self, node):
+        values, self._values = self._values, {}
+        return {table: _to_table(table, self.columns[table], table_values) for table, table_values in values.items()
+                if table_values and table_values[0]}
+
+    def merge_node(self, result):
+        for table, arrow_table in result.items():
+            self._writer(table).write_table(arrow_table)
+
+    def end(self, simulation):
+        self._node_id = None
+        self._values = {"genomes": [[] for _ in self.columns["genomes"]]}
+        for genome in (simulation.get("ParasiteGenetics") or {}).get("m_ParasiteGenomeMap", []):
+            self._add_row("genomes", genome, None)
+        self.merge_node(self.end_node(None))
+        return False
+
+    def close(self) -> Dict[str, Path]:
+        """Closes Parquet writers, writes empty files of tables without rows and renames temp files."""
+        paths = {}
+        for table in self.columns:
+            writer = self._writer(table)
+            writer.close()
+            paths[table] = self.out_dir.joinpath(f"{table}{_PARQUET_SUFFIX}")
+            os.replace(self._temp_path(table), paths[table])
+        self._writers = {}
+        return paths
+
+    def abort(self) -> None:
+        """Closes Parquet writers and removes temp files."""
+        for table, writer in self._writers.items():
+            writer.close()
+            self._temp_path(table).unlink(missing_ok=True)
+        self._writers = {}
+
+    def _add_row(self, table: str, item: dict, parent) -> None:
+        if table not in self._values:
+            return
+        if table not in self._functions:
+            functions = {name: fn for name, _, fn in TABLES[table]}
+            self._functions[table] = [functions[name] for name in self.columns[table]]
+        for values, fn in zip(self._values[table], self._functions[table]):
+            values.append(fn(item, parent, self._node_id))
+
+    def _writer(self, table: str):
+        if table not in self._writers:
+            _, pq = _import_pyarrow()
+            self._writers[table] = pq.ParquetWriter(self._temp_path(table), _schema(table, self.columns[table]))
+        return self._writers[table]
+
+    def _temp_path(self, table: str) -> Path:
+        return self.out_dir.joinpath(f".{table}{_PARQUET_SUFFIX}.{os.getpid()}.tmp")
+
+
+def extract(dtk_path: Union[str, Path],
+            out_dir: Union[str, Path],
+            tables: Iterable[str] = None,
+            columns: Dict[str, List[str]] = None,
+            jobs: int = 1) -> Dict[str, Path]:
+    """
+    Extracts serialized population contents into Parquet files (<table>.parquet), one per table: humans,
+    infections, drugs, vectors (cohorts of adult vector queues), vector_parasites (oocysts and sporozoites) and
+    genomes (parasite genome map). Rows have node ids, infections and parasites genome hashes, which can be joined
+    with the genomes table. Nodes are read and written one at a time, as one row group per node.
+    Human collections are only parsed if human tables are selected. Requires pyarrow package.
+
+    Examples:
+        Infected vectors per node and genome::
+
+            import pyarrow.parquet as pq
+            extract("state-00365.dtk", "state-00365", tables=["vector_parasites"])
+            df = pq.read_table("state-00365/vector_parasites.parquet").to_pandas()
+            df[df.stage == "sporozoite"].groupby(["node_id", "female_genome_hash"]).size()
+
+    Args:
+        dtk_path: Serialized population file (version 2 or later).
+        out_dir: Output directory.
+        tables: (Optional) Tables to extract, the default is all tables.
+        columns: (Optional) Dictionary of table names and columns to extract (projection), other tables have all
+            columns.
+        jobs: (Optional) Number of nodes processed in parallel.
+
+    Returns:
+        Dictionary of table names and Parquet file paths.
+    """
+    _import_pyarrow()
+    tables = list(TABLES) if tables is None else list(tables)
+    columns = columns or {}
+    unknown = [t for t in set(tables) | set(columns) if t not in TABLES]
+    if unknown:
+        raise ValueError(f"Unknown table(s): {unknown}, supported tables are: {list(TABLES)}.")
+
+    selected = {}
+    for table in tables:
+        names = [c[0] for c in TABLES[table]]
+        selected[table] = list(columns.get(table, names))
+        unknown = [c for c in selected[table] if c not in names]
+        if unknown:
+            raise ValueError(f"Unknown column(s) of table {table}: {unknown}, supported columns are: {names}.")
+
+    out_dir = Path(out_dir)
+    created = not out_dir.exists()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    transform = ExtractTransform(out_dir, selected)
+    try:
+        scan_population(dtk_path, [transform], jobs)
+        paths = transform.close()
+    except BaseException:
+        transform.abort()
+        if created and not any(out_dir.iterdir()):
+            out_dir.rmdir()
+        raise
+
+    for path in paths.values():
+        print(f"Saving file {path}.")
+    return paths
+
+
+def _import_pyarrow():
+    """Imports pyarrow and pyarrow.parquet, an optional dependency used for extracting serialized populations."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as ex:
+        raise ImportError("Extracting serialized populations requires pyarrow package (pip install pyarrow).") \
+            from ex
+
+    return pyarrow, pyarrow.parquet
+
+
+def _schema(table: str, columns: List[str]):
+    pa, _ = _import_pyarrow()
+    types = {name: arrow_type for name, arrow_type, _ in TABLES[table]}
+    return pa.schema([(name, getattr(pa, types[name])()) for name in columns])
+
+
+def _to_table(table: str, columns: List[str], values: List[list]):
+    """Creates an arrow table from lists of column values."""
+    pa, _ = _import_pyarrow()
+    schema = _schema(table, columns)
+    arrays = [pa.array(column_values, type=field.type) for field, column_values in zip(schema, values)]
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract serialized population contents to Parquet files")
+    parser.add_argument("dtk_path", help="Serialized population file (.dtk)")
+    parser.add_argument("out_dir", help="Output directory")
+    parser.add_argument("-t", "--tables", nargs="+", default=None, choices=list(TABLES),
+                        help="Tables to extract (default all)")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of nodes processed in parallel")
+    args = parser.parse_args()
+
+    extract(args.dtk_path, args.out_dir, tables=args.tables, jobs=args.jobs)
@@ -0,0 +1,367 @@
+"""
+Streaming transforms of serialized populations. Transforms are visitors with callbacks for nodes, humans,
+infections, vector cohorts, oocysts and sporozoites. transform_population() walks each node once, applies all
+transforms and writes the node, so several edits (e.g. zeroing infections, replacing genomes, reassigning
+properties) cost one parse and one write of the population. scan_population() walks nodes the same way without
+writing, for transforms which only collect data.
+"""
+
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable, List, Union
+
+from emodpy_malaria.serialization.dtk_chunks import NodeChunks, NodeData, dump_chunk, load_chunk, read_chunk, \
+    read_layout, write_file
+
+# Vector queues of adult vectors, which are visited
+VECTOR_QUEUES = ["InfectiousQueues", "InfectedQueues", "AdultQueues"]
+
+_HUMAN_CALLBACKS = ["visit_human", "visit_infection"]
+_VECTOR_CALLBACKS = ["visit_vector_cohort", "visit_oocyst", "visit_sporozoite"]
+
+
+class PopulationTransform:
+    """
+    Base class of serialized population transforms. Subclasses override the callbacks they need, only overridden
+    callbacks are called. Callbacks modify visited objects in place.
+
+    With jobs > 1 nodes are processed in separate processes, by copies of the transform. Node-local state should be
+    initialized in begin_node() and returned by end_node(); results are passed to merge_node() of the original
+    transform, in node order.
+    """
+
+    def begin_node(self, node: dict) -> Union[bool, None]:
+        """
+        Called first for each node. In version 6 files, humans are not part of the node object.
+        Returns False if the node is skipped by this transform.
+        """
+        return True
+
+    def visit_human(self, human: dict, node: dict) -> Union[bool, None]:
+        """Called for each human. Returns False if the human is removed."""
+        return True
+
+    def visit_infection(self, infection: dict, human: dict, node: dict) -> None:
+        """Called for each infection of a human, after visit_human()."""
+        pass
+
+    def end_humans(self, node: dict) -> None:
+        """
+        Called after the humans of a node or, in version 6 files, of a human collection were visited, before they are
+        written. Only called for transforms visiting humans or infections.
+        """
+        pass
+
+    def visit_vector_cohort(self, cohort: dict, queue: str, vector_population: dict, node: dict) -> Union[bool, None]:
+        """Called for each vector cohort in adult vector queues (VECTOR_QUEUES). Returns False if the cohort is
+        removed."""
+        return True
+
+    def visit_oocyst(self, oocyst: dict, cohort: dict, queue: str, node: dict) -> None:
+        """Called for each oocyst cohort of a vector cohort, after visit_vector_cohort()."""
+        pass
+
+    def visit_sporozoite(self, sporozoite: dict, cohort: dict, queue: str, node: dict) -> None:
+        """Called for each sporozoite cohort of a vector cohort, after oocysts."""
+        pass
+
+    def end_node(self, node: dict) -> Any:
+        """Called last for each node, also for skipped nodes. Returns node-local results, passed to merge_node()."""
+        return None
+
+    def merge_node(self, result: Any) -> None:
+        """Called in the main process with results of end_node(), in node order."""
+        pass
+
+    def end(self, simulation: dict) -> Union[bool, None]:
+        """Called after all nodes with the simulation object. Returns True if the simulation object was modified."""
+        return False
+
+    def visits(self, callback: str) -> bool:
+        """Returns True if the callback is overridden."""
+        return getattr(type(self), callback) is not getattr(PopulationTransform, callback)
+
+
+class CallbackTransform(PopulationTransform):
+    """
+    Transform calling user functions, with the same arguments and return values as PopulationTransform callbacks.
+
+    Examples:
+        Reassign a property of all humans::
+
+            def set_property(human, node):
+                human["m_PropertyList"]["Risk"] = "HIGH"
+
+            transform_population("state-00365.dtk", "state-00365_high.dtk", [CallbackTransform(on_human=set_property)])
+    """
+
+    def __init__(self,
+                 on_node: Callable = None,
+                 on_human: Callable = None,
+                 on_infection: Callable = None,
+                 on_vector_cohort: Callable = None,
+                 on_oocyst: Callable = None,
+                 on_sporozoite: Callable = None):
+        self._callbacks = {
+            "begin_node": on_node,
+            "visit_human": on_human,
+            "visit_infection": on_infection,
+            "visit_vector_cohort": on_vector_cohort,
+            "visit_oocyst": on_oocyst,
+            "visit_sporozoite": on_sporozoite
+        }
+
+    def begin_node(self, node):
+        return self._callbacks["begin_node"](node) if self._callbacks["begin_node"] else True
+
+    def visit_human(self, human, node):
+        return self._callbacks["visit_human"](human, node)
+
+    def visit_infection(self, infection, human, node):
+        return self._callbacks["visit_infection"](infection, human, node)
+
+    def visit_vector_cohort(self, cohort, queue, vector_population, node):
+        return self._callbacks["visit_vector_cohort"](cohort, queue, vector_population, node)
+
+    def visit_oocyst(self, oocyst, cohort, queue, node):
+        return self._callbacks["visit_oocyst"](oocyst, cohort, queue, node)
+
+    def visit_sporozoite(self, sporozoite, cohort, queue, node):
+        return self._callbacks["visit_sporozoite"](sporozoite, cohort, queue, node)
+
+    def visits(self, callback):
+        return self._callbacks.get(callback) is not None
+
+
+@dataclass
+class NodeReport:
+    """Counts of visited objects and duration of transforming a node."""
+    node_id: int
+    humans: int = 0
+    removed_humans: int = 0
+    infections: int = 0
+    vector_cohorts: int = 0
+    removed_vector_cohorts: int = 0
+    oocysts: int = 0
+    sporozoites: int = 0
+    seconds: float = 0.0
+
+    def __str__(self):
+        return (f"Node {self.node_id}: {self.humans} humans ({self.removed_humans} removed), "
+                f"{self.infections} infections, {self.vector_cohorts} vector cohorts "
+                f"({self.removed_vector_cohorts} removed), {self.oocysts} oocysts, {self.sporozoites} sporozoites, "
+                f"{self.seconds:.2f} s")
+
+
+def transform_population(input_file: Union[str, Path],
+                         output_file: Union[str, Path],
+                         transforms: List[PopulationTransform],
+                         jobs: int = 1) -> List[NodeReport]:
+    """
+    Applies transforms to a serialized population (version 2 or later), walking each node once. Nodes (and human
+    collections) are read, transformed and compressed one at a time, so memory is bounded by the largest node.
+    Human collections are only parsed if a transform visits humans or infections. The output file is written under
+    a temp name and then renamed, so it is never partial.
+
+    Args:
+        input_file: Input serialized population file.
+        output_file: Output serialized population file.
+        transforms: Transforms, applied in list order to each visited object.
+        jobs: (Optional) Number of nodes processed in parallel, in separate processes. Transforms must be picklable.
+
+    Returns:
+        List of node reports, in node order.
+    """
+    layout = read_layout(input_file)
+    reports = []
+
+    def transformed_nodes():
+        args_list = [(input_file, layout.version, node_chunks, transforms) for node_chunks in layout.nodes]
+        for node_data, report, results in map_nodes(_transform_node, args_list, jobs):
+            for transform, result in zip(transforms, results):
+                transform.merge_node(result)
+            print(report)
+            reports.append(report)
+            yield node_data
+
+    def sim():
+        with open(input_file, "rb") as handle:
+            data = read_chunk(handle, layout.sim)
+        if not any([t.visits("end") for t in transforms]):
+            return layout.sim.engine, data
+
+        item = load_chunk(data, layout.sim.engine)
+        # Version 2 simulation chunk looks like this {'simulation':{...}}
+        simulation = item.simulation if layout.version == 2 else item
+        modified = [t.end(simulation) for t in transforms]
+        if not any(modified):
+            return layout.sim.engine, data
+        return dump_chunk(item, layout.sim.engine if layout.version < 6 else None)
+
+    output_file = Path(output_file)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = output_file.with_name(f".{output_file.name}.{os.getpid()}.tmp")
+    try:
+        with open(temp_file, "wb") as dest:
+            write_file(dest, layout.header, sim, transformed_nodes())
+        print(f"Saving file {output_file}.")
+        os.replace(temp_file, output_file)
+    finally:
+        temp_file.unlink(missing_ok=True)
+
+    return reports
+
+
+def scan_population(input_file: Union[str, Path],
+                    transforms: List[PopulationTransform],
+                    jobs: int = 1) -> List[NodeReport]:
+    """
+    Walks a serialized population (version 2 or later) like transform_population(), without writing it. Nodes are
+    not compressed again, and the simulation chunk is only parsed if a transform overrides end().
+
+    Args:
+        input_file: Input serialized population file.
+        transforms: Transforms, e.g. collecting data from visited objects.
+        jobs: (Optional) Number of nodes processed in parallel, in separate processes. Transforms must be picklable.
+
+    Returns:
+        List of node reports, in node order.
+    """
+    layout = read_layout(input_file)
+    reports = []
+    args_list = [(input_file, layout.version, node_chunks, transforms, False) for node_chunks in layout.nodes]
+    for _, report, results in map_nodes(_transform_node, args_list, jobs):
+        for transform, result in zip(transforms, results):
+            transform.merge_node(result)
+        print(report)
+        reports.append(report)
+
+    if any([t.visits("end") for t in transforms]):
+        with open(input_file, "rb") as handle:
+            item = load_chunk(read_chunk(handle, layout.sim), layout.sim.engine)
+        simulation = item.simulation if layout.version == 2 else item
+        for transform in transforms:
+            transform.end(simulation)
+
+    return reports
+
+
+def map_nodes(fn: Callable, args_list: Iterable[tuple], jobs: int = 1) -> Iterable:
+    """
+    Calls a function for each item of the argument list, in a process pool if jobs > 1, and yields results in order.
+    Only a few items are submitted ahead, so results waiting to be consumed are bounded.
+    """
+    if jobs <= 1:
+        for args in args_list:
+            yield fn(*args)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        for args in args_list:
+            pending.append(executor.submit(fn, *args))
+            if len(pending) >= 2 * jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _transform_node(input_file: Union[str, Path], version: int, node_chunks: NodeChunks,
+                    transforms: List[PopulationTransform], write: bool = True) -> tuple:
+    """Reads, transforms and compresses a node, returns node data (None if not written), node report and results
+    of end_node()."""
+    start = time.perf_counter()
+    with open(input_file, "rb") as handle:
+        item = load_chunk(read_chunk(handle, node_chunks.node), node_chunks.node.engine)
+        # Version 2 node chunks look like this {'suid':{'id':id},'node':{...}}
+        node = item.node if version == 2 else item
+        report = NodeReport(node_id=node.externalId)
+        active = [t for t in transforms if t.begin_node(node) is not False]
+        human_transforms = [t for t in active if any([t.visits(c) for c in _HUMAN_CALLBACKS])]
+        vector_transforms = [t for t in active if any([t.visits(c) for c in _VECTOR_CALLBACKS])]
+
+        humans = []
+        if version < 6 and human_transforms:
+            node["individualHumans"] = _visit_humans(node["individualHumans"], human_transforms, node, report)
+        for chunk, num_humans in zip(node_chunks.humans, node_chunks.num_humans):
+            if human_transforms:
+                collection = load_chunk(read_chunk(handle, chunk), chunk.engine)
+                collection.human_collection = _visit_humans(collection.human_collection, human_transforms, node,
+                                                            report)
+                if write:
+                    humans.append(dump_chunk(collection) + (len(collection.human_collection),))
+                del collection
+            elif write:
+                humans.append((chunk.engine, read_chunk(handle, chunk), num_humans))
+
+        if vector_transforms:
+            _visit_vectors(node, vector_transforms, report)
+
+    results = [t.end_node(node) for t in transforms]
+    node_data = None
+    if write:
+        node_data = NodeData(suid=node_chunks.suid,
+                             node=dump_chunk(item, node_chunks.node.engine if version < 6 else None),
+                             humans=humans)
+    report.seconds = time.perf_counter() - start
+    return node_data, report, results
+
+
+def _visit_humans(humans: List[dict], transforms: List[PopulationTransform], node: dict,
+                  report: NodeReport) -> List[dict]:
+    """Visits humans and their infections, returns the humans which are kept."""
+    callbacks = [(t.visit_human if t.visits("visit_human") else None,
+                  t.visit_infection if t.visits("visit_infection") else None) for t in transforms]
+    kept = []
+    for human in humans:
+        report.humans += 1
+        keep = True
+        for visit_human, visit_infection in callbacks:
+            if visit_human and visit_human(human, node) is False:
+                keep = False
+                break
+            if visit_infection:
+                for infection in human["infections"]:
+                    visit_infection(infection, human, node)
+        report.infections += len(human["infections"])
+        if keep:
+            kept.append(human)
+        else:
+            report.removed_humans += 1
+    for transform in transforms:
+        transform.end_humans(node)
+    return kept
+
+
+def _visit_vectors(node: dict, transforms: List[PopulationTransform], report: NodeReport) -> None:
+    """Visits vector cohorts, their oocysts and sporozoites, and removes cohorts which are not kept."""
+    callbacks = [(t.visit_vector_cohort if t.visits("visit_vector_cohort") else None,
+                  t.visit_oocyst if t.visits("visit_oocyst") else None,
+                  t.visit_sporozoite if t.visits("visit_sporozoite") else None) for t in transforms]
+    for vector_population in node["m_vectorpopulations"]:
+        for queue in [q for q in VECTOR_QUEUES if q in vector_population]:
+            kept = []
+            for cohort in vector_population[queue]["collection"]:
+                report.vector_cohorts += 1
+                keep = True
+                for visit_cohort, visit_oocyst, visit_sporozoite in callbacks:
+                    if visit_cohort and visit_cohort(cohort, queue, vector_population, node) is False:
+                        keep = False
+                        break
+                    if visit_oocyst:
+                        for oocyst in cohort.get("m_OocystCohorts", []):
+                            visit_oocyst(oocyst, cohort, queue, node)
+                    if visit_sporozoite:
+                        for sporozoite in cohort.get("m_SporozoiteCohorts", []):
+                            visit_sporozoite(sporozoite, cohort, queue, node)
+                if keep:
+                    report.oocysts += len(cohort.get("m_OocystCohorts", []))
+                    report.sporozoites += len(cohort.get("m_SporozoiteCohorts", []))
+                    kept.append(cohort)
+                else:
+                    report.removed_vector_cohorts += 1
+            vector_population[queue]["collection"] = kept
@@ -9,6 +9,19 @@ import numpy
 import emod_api.serialization.SerializedPopulation as SerPop
 from pathlib import Path
 import importlib
+from emodpy_malaria.serialization.dtk_chunks import read_version
+from emodpy_malaria.serialization.population_transforms import PopulationTransform, transform_population
+
+HASH_SEED = 17  # must match value in C++ code, see file ParasiteGnome.cpp
+HASH_MULTIPLIER = numpy.uint32(31)
+
+# Byte lookup table of nucleotide values of barcode characters, -1 for unknown characters
+NUCLEOTIDE_VALUES = numpy.full(256, -1, dtype=numpy.int8)
+NUCLEOTIDE_VALUES[[ord(ch) for ch in "ACGT"]] = numpy.arange(4)
+NUCLEOTIDE_CHARS = numpy.frombuffer(b"ACGT", dtype=numpy.uint8)
+
+# Number of barcodes drawn at once from batch barcode providers (next_barcodes(n))
+BARCODE_BLOCK_SIZE = 4096
 
 
 class Genome:
@@ -28,21 +41,86 @@ class Genome:
         else:
             raise Exception("Unknown character ch=" + ch)
 
-    def create_genome(barcode_str, allele_root_id):
-        g = Genome()
-        g.barcode_str = barcode_str
-        g.hash_code = 17  # must match value in C++ code, see file ParasiteGnome.cpp
-        g.barcode_hash_code = 17  # must match value in C++ code, see file ParasiteGnome.cpp
-
-        for ch in barcode_str:
-            val = Genome.convert_char_to_int(ch)
-            g.nucleotides.append(val)
-            g.allele_roots.append(allele_root_id)
-            g.barcode_hash_code = numpy.int32(31 * g.barcode_hash_code + val)
-            g.hash_code = numpy.int32(31 * g.hash_code + val)
-            g.hash_code = numpy.int32(31 * g.hash_code + allele_root_id)
+    def convert_barcodes_to_ints(barcodes):
+        """
+        Converts barcodes of the same length to nucleotide values at once, using a byte lookup table.
+
+        Args:
+            barcodes: List of barcode strings of the same length, e.g. "TAAT..."
+
+        Returns:
+            2d numpy array of nucleotide values, one row per barcode
+        """
+        length = len(barcodes[0]) if len(barcodes) > 0 else 0
+        if any([len(barcode) != length for barcode in barcodes]):
+            raise Exception("All barcodes must have the same length.")
+
+        chars = numpy.frombuffer("".join(barcodes).encode("ascii", errors="replace"), dtype=numpy.uint8)
+        values = NUCLEOTIDE_VALUES[chars]
+        unknown = numpy.flatnonzero(values < 0)
+        if len(unknown) > 0:
+            raise Exception("Unknown character ch=" + "".join(barcodes)[unknown[0]])
+
+        return values.reshape(len(barcodes), length)
+
+    def hash_nucleotides(nucleotides, allele_root_ids):
+        """
+        Computes hash codes of many genomes at once, matching C++ ParasiteGenome hashes (wrapped int32 arithmetic).
+
+        Args:
+            nucleotides: 2d array of nucleotide values, one row per genome
+            allele_root_ids: Allele root ids, one per genome, or one for all genomes
+
+        Returns:
+            Tuple of genome hash codes and barcode hash codes, int32 arrays
+        """
+        rows = nucleotides.shape[0]
+        roots = numpy.broadcast_to(numpy.asarray(allele_root_ids, dtype=numpy.int64), (rows,)).astype(numpy.uint32)
+        hash_codes = numpy.full(rows, HASH_SEED, dtype=numpy.uint32)
+        barcode_hash_codes = numpy.full(rows, HASH_SEED, dtype=numpy.uint32)
+        # unsigned arithmetic wraps around, as int32 arithmetic does in C++
+        for values in nucleotides.T.astype(numpy.uint32):
+            barcode_hash_codes = barcode_hash_codes * HASH_MULTIPLIER + values
+            hash_codes = (hash_codes * HASH_MULTIPLIER + values) * HASH_MULTIPLIER + roots
+
+        return hash_codes.view(numpy.int32), barcode_hash_codes.view(numpy.int32)
+
+    def create_genomes(barcodes, allele_root_ids):
+        """
+        Creates many genomes at once.
+
+        Args:
+            barcodes: List of barcode strings
+            allele_root_ids: Allele root ids, one per barcode, or one for all barcodes
+
+        Returns:
+            List of genomes
+        """
+        barcodes = list(barcodes)
+        roots = numpy.broadcast_to(numpy.asarray(allele_root_ids, dtype=numpy.int64), (len(barcodes),))
+        indices_by_length = {}
+        for index, barcode in enumerate(barcodes):
+            indices_by_length.setdefault(len(barcode), []).append(index)
+
+        genomes = [None] * len(barcodes)
+        for indices in indices_by_length.values():
+            nucleotides = Genome.convert_barcodes_to_ints([barcodes[i] for i in indices])
+            hash_codes, barcode_hash_codes = Genome.hash_nucleotides(nucleotides, roots[indices])
+            for i, values, root, hash_code, barcode_hash_code in zip(indices, nucleotides.tolist(),
+                                                                     roots[indices].tolist(), hash_codes,
+                                                                     barcode_hash_codes):
+                g = Genome()
+                g.barcode_str = barcodes[i]
+                g.nucleotides = values
+                g.allele_roots = [root] * len(values)
+                g.hash_code = hash_code
+                g.barcode_hash_code = barcode_hash_code
+                genomes[i] = g
+
+        return genomes
 
-        return g
+    def create_genome(barcode_str, allele_root_id):
+        return Genome.create_genomes([barcode_str], [allele_root_id])[0]
 
     def __init__(self):
         self.hash_code = numpy.int32(0)
@@ -85,6 +163,101 @@ class Genome:
         return dtk_map_entry
 
 
+class AlleleFrequencySampler:
+    """
+    Batch barcode provider drawing random barcodes, nucleotide by nucleotide, from allele frequencies of each
+    barcode position. Barcodes are drawn in bulk with next_barcodes(n); the sampler can also be called like a
+    function returning the next barcode. Samplers of per-node substreams (substream(node_id)) draw barcodes
+    independently of each other, so nodes can be processed in any order, or in parallel, with the same result.
+    """
+
+    def __init__(self, allele_frequencies, seed=None):
+        """
+        Args:
+            allele_frequencies: Frequencies of 'A', 'C', 'G', 'T' at each barcode position, one row of four values
+                per position. Rows are normalized to sum up to one.
+            seed: (Optional) Seed of the random number generator, an integer or numpy.random.SeedSequence.
+        """
+        frequencies = numpy.asarray(allele_frequencies, dtype=numpy.float64)
+        if frequencies.ndim != 2 or frequencies.shape[1] != 4:
+            raise Exception("Allele frequencies must have four values ('A', 'C', 'G', 'T') per barcode position.")
+        if (frequencies < 0).any() or (frequencies.sum(axis=1) <= 0).any():
+            raise Exception("Allele frequencies must be non-negative, with a positive sum per barcode position.")
+
+        self.frequencies = frequencies / frequencies.sum(axis=1, keepdims=True)
+        self._thresholds = numpy.cumsum(self.frequencies, axis=1)[:, :-1]
+        self._seed_sequence = seed if isinstance(seed, numpy.random.SeedSequence) else numpy.random.SeedSequence(seed)
+        self._rng = numpy.random.default_rng(self._seed_sequence)
+
+    @property
+    def barcode_length(self):
+        return self.frequencies.shape[0]
+
+    def next_barcodes(self, n):
+        """
+        Draws barcodes.
+
+        Args:
+            n: Number of barcodes
+
+        Returns:
+            numpy array of n barcode strings
+        """
+        draws = self._rng.random((n, self.barcode_length, 1))
+        values = (draws >= self._thresholds).sum(axis=2)
+        chars = numpy.ascontiguousarray(NUCLEOTIDE_CHARS[values])
+        return chars.view(f"S{self.barcode_length}").ravel().astype(str)
+
+    def __call__(self):
+        return str(self.next_barcodes(1)[0])
+
+    def substream(self, key):
+        """
+        Returns a sampler of the same allele frequencies with its own random stream, derived from the seed and the key.
+
+        Args:
+            key: Non-negative integer, e.g. node id
+
+        Returns:
+            AlleleFrequencySampler object
+        """
+        seed = numpy.random.SeedSequence(self._seed_sequence.entropy,
+                                         spawn_key=tuple(self._seed_sequence.spawn_key) + (int(key),))
+        return AlleleFrequencySampler(self.frequencies, seed=seed)
+
+
+class _BarcodeStream:
+    """
+    Hands out barcodes in the order of the barcode provider. Batch providers (with next_barcodes(n)) are drawn from
+    in blocks, other providers are called once per barcode.
+    """
+
+    def __init__(self, barcode_provider, block_size=BARCODE_BLOCK_SIZE):
+        self._provider = barcode_provider
+        self._next_barcodes = getattr(barcode_provider, "next_barcodes", None)
+        self._block_size = block_size
+        self._buffer = []
+        self._position = 0
+
+    def take(self, n):
+        if self._next_barcodes is None:
+            return [self._provider() for _ in range(n)]
+
+        available = len(self._buffer) - self._position
+        if available < n:
+            count = max(n - available, self._block_size)
+            drawn = self._next_barcodes(count)
+            drawn = drawn.tolist() if isinstance(drawn, numpy.ndarray) else list(drawn)
+            if len(drawn) != count:
+                raise Exception(f"Barcode provider returned {len(drawn)} barcodes, {count} were requested.")
+            self._buffer = self._buffer[self._position:] + drawn
+            self._position = 0
+
+        barcodes = self._buffer[self._position:self._position + n]
+        self._position += n
+        return barcodes
+
+
 def print_hashcodes(ser_pop):
     for genome in ser_pop.dtk.simulation["ParasiteGenetics"]["m_ParasiteGenomeMap"]:
         print(genome.key)
@@ -108,31 +281,177 @@ def print_hashcodes(ser_pop):
                           + "sporo-female=" + str(sporo["m_pStrainIdentity"]["m_Genome"]["m_pInner"]["m_HashCode"]))
 
 
+def get_genomes(barcodes, allele_root_ids, ser_pop_genome_map, cache_genome_map):
+    """
+    Returns dtk genome dictionaries of barcodes. Genomes which are not cached yet are created at once and added
+    to the cache and the serialized population genome map.
+
+    Args:
+        barcodes: List of barcode strings
+        allele_root_ids: Allele root ids, one per barcode
+        ser_pop_genome_map: Genome map of the serialized population
+        cache_genome_map: Dictionary of (barcode, allele root id) keys and genomes
+
+    Returns:
+        List of dtk genome dictionaries, one per barcode
+    """
+    keys = list(zip(barcodes, allele_root_ids))
+    new_keys = list(dict.fromkeys([key for key in keys if key not in cache_genome_map]))
+    if new_keys:
+        new_barcodes, new_allele_root_ids = zip(*new_keys)
+        for key, genome in zip(new_keys, Genome.create_genomes(new_barcodes, new_allele_root_ids)):
+            cache_genome_map[key] = genome
+            ser_pop_genome_map.append(genome.to_dtk_map_entry())
+
+    return [cache_genome_map[key].to_dtk_dict() for key in keys]
+
+
 def get_next_genome(next_barcode_fn, allele_root_id, ser_pop_genome_map, cache_genome_map):
-    barcode_str = next_barcode_fn()
-    key = barcode_str + "-" + str(allele_root_id)
+    return get_genomes([next_barcode_fn()], [allele_root_id], ser_pop_genome_map, cache_genome_map)[0]
+
+
+def _human_genome_slots(person):
+    """Genome slots (container, key, allele root id) of the infections of a person."""
+    return [(infection["infection_strain"], "m_Genome", person["suid"]["id"]) for infection in person["infections"]]
+
 
-    if key in cache_genome_map:
-        genome = cache_genome_map[key]
-    else:
-        genome = Genome.create_genome(barcode_str, allele_root_id)
-        cache_genome_map[key] = genome
-        ser_pop_genome_map.append(genome.to_dtk_map_entry())
+def _vector_genome_slots(node):
+    """Genome slots (container, key, allele root id) of oocysts and sporozoites of all vectors in a node."""
+    slots = []
+    for vector_pop in node["m_vectorpopulations"]:
+        for vector in vector_pop["AdultQueues"]["collection"]:
+            for cohort in vector["m_OocystCohorts"] + vector["m_SporozoiteCohorts"]:
+                slots.append((cohort, "m_MaleGametocyteGenome", -999))
+                slots.append((cohort["m_pStrainIdentity"], "m_Genome", -999))
+    return slots
 
-    dtk_genome_obj = genome.to_dtk_dict()
-    # print(genome.barcode + "=" + str(genome.hashcode))
-    return dtk_genome_obj
 
+def _replace_slot_genomes(slots, barcodes, ser_pop_genome_map, cache_genome_map):
+    """Replaces the genomes of slots, one barcode per slot."""
+    genomes = get_genomes(barcodes, [allele_root_id for _, _, allele_root_id in slots], ser_pop_genome_map,
+                          cache_genome_map)
+    for (container, key, _), genome in zip(slots, genomes):
+        length_barcode = len(container[key]["m_pInner"]["m_NucleotideSequence"])
+        assert length_barcode == len(genome["m_pInner"]["m_NucleotideSequence"]), f"New barcode has wrong length."
+        container[key] = genome
+
+
+def _replace_human_genomes(humans, barcodes, ser_pop_genome_map, cache_genome_map):
+    """Replaces genomes of infections of all humans, which are counted first and drawn at once."""
+    slots = [slot for person in humans for slot in _human_genome_slots(person)]
+    _replace_slot_genomes(slots, barcodes.take(len(slots)), ser_pop_genome_map, cache_genome_map)
+
+
+def _replace_vector_genomes(node, barcodes, ser_pop_genome_map, cache_genome_map):
+    """Replaces genomes of oocysts and sporozoites in a node, which are counted first and drawn at once."""
+    slots = _vector_genome_slots(node)
+    _replace_slot_genomes(slots, barcodes.take(len(slots)), ser_pop_genome_map, cache_genome_map)
+
+
+class ReplaceGenomesTransform(PopulationTransform):
+    """
+    Serialized population transform, which replaces genomes of infections and of oocysts and sporozoites of adult
+    vectors, see replace_genomes(). Node-local genome maps are merged into the simulation genome map and
+    deduplicated by hash code.
+    """
 
-def replace_genomes(input_file, next_barcode_fn, output_file):
+    def __init__(self, barcode_provider):
+        """
+        Args:
+            barcode_provider: Function returning the next barcode, or a batch barcode provider with next_barcodes(n),
+                optionally with per-node substreams (substream(node_id)).
+        """
+        self.barcode_provider = barcode_provider
+        self.per_node = hasattr(barcode_provider, "substream")
+        self.genome_map = []
+        self._hash_codes = set()
+        self._barcodes = None if self.per_node else _BarcodeStream(barcode_provider)
+        self._node_genome_map = []
+        self._node_cache = {}
+        self._human_slots = []
+        self._node_slots = []
+
+    def __getstate__(self):
+        # Node copies sent to worker processes only build node genome maps, which are merged in the main process,
+        # so the growing simulation genome map is not pickled for each node.
+        if not self.per_node:
+            # Each worker would restart the barcode sequence, duplicating genomes across nodes.
+            raise Exception("Parallel genome replacement requires a barcode provider with per-node substreams, "
+                            "substream(node_id), e.g. AlleleFrequencySampler.")
+        state = self.__dict__.copy()
+        state["genome_map"] = []
+        state["_hash_codes"] = set()
+        state["_node_genome_map"] = []
+        state["_node_cache"] = {}
+        state["_human_slots"] = []
+        state["_node_slots"] = []
+        state["_barcodes"] = None   # created from the node substream in begin_node()
+        return state
+
+    def begin_node(self, node):
+        if self.per_node:
+            self._barcodes = _BarcodeStream(self.barcode_provider.substream(node.externalId))
+        self._node_genome_map = []
+        self._node_cache = {}
+        self._human_slots = []
+        self._node_slots = []
+        return True
+
+    def visit_human(self, human, node):
+        self._human_slots.extend(_human_genome_slots(human))
+        return True
+
+    def end_humans(self, node):
+        # Human genomes of the node (or human collection) are counted first and drawn at once.
+        slots = self._human_slots
+        _replace_slot_genomes(slots, self._barcodes.take(len(slots)), self._node_genome_map, self._node_cache)
+        self._human_slots = []
+
+    def visit_oocyst(self, oocyst, cohort, queue, node):
+        if queue == "AdultQueues":
+            self._node_slots.append((oocyst, "m_MaleGametocyteGenome", -999))
+            self._node_slots.append((oocyst["m_pStrainIdentity"], "m_Genome", -999))
+
+    def visit_sporozoite(self, sporozoite, cohort, queue, node):
+        self.visit_oocyst(sporozoite, cohort, queue, node)
+
+    def end_node(self, node):
+        # Vector genomes of the node are counted first and drawn at once.
+        slots = self._node_slots
+        _replace_slot_genomes(slots, self._barcodes.take(len(slots)), self._node_genome_map, self._node_cache)
+        self._node_slots = []
+        return self._node_genome_map
+
+    def merge_node(self, result):
+        for entry in result:
+            if entry["key"] not in self._hash_codes:
+                self._hash_codes.add(entry["key"])
+                self.genome_map.append(entry)
+
+    def end(self, simulation):
+        simulation["ParasiteGenetics"]["m_ParasiteGenomeMap"] = self.genome_map
+        return True
+
+
+def replace_genomes(input_file, next_barcode_fn, output_file, jobs=1):
     """
         Replaces genomes in infected individuals and vectors.
+        Genomes are created in batches, for the humans of a node (or, in version 6 files, of a human collection) and
+        for the vectors of a node. Genomes of a batch are counted first, so batch barcode providers draw them in one
+        call.
+
+        Barcode providers with per-node substreams (substream(node_id), e.g. AlleleFrequencySampler) draw the
+        barcodes of each node from its own substream. Nodes are then processed one at a time, or in a process pool
+        if jobs > 1, with the same result for a given seed. Node-local genome maps are merged and deduplicated by
+        hash code.
 
     Args:
         input_file:  Input serialized population file
         next_barcode_fn: Function that return the next barcode. The function is called once for every infection of an
-            individual and once for every vector in the vector population.
+            individual and once for every vector in the vector population. Or a batch barcode provider, an object
+            with a next_barcodes(n) method returning n barcodes, e.g. AlleleFrequencySampler.
         output_file: Output file with replaced genomes.
+        jobs: Number of nodes processed in parallel, requires a barcode provider with per-node substreams.
 
     Returns:
         Nothing
@@ -143,62 +462,29 @@ def replace_genomes(input_file, next_barcode_fn, output_file):
     if next_barcode_fn is None:
         raise Exception("You must provide a function that returns the next barcode string")
 
+    per_node = hasattr(next_barcode_fn, "substream")
+    if jobs > 1 and not per_node:
+        raise Exception("Parallel genome replacement requires a barcode provider with per-node substreams, "
+                        "e.g. AlleleFrequencySampler.")
+    if read_version(input_file) > 1:
+        transform_population(input_file, output_file, [ReplaceGenomesTransform(next_barcode_fn)], jobs)
+        return
+    if jobs > 1:
+        raise Exception("Parallel genome replacement requires a chunked serialized population file (version 2 or "
+                        "later).")
+
     pop = SerPop.SerializedPopulation(input_file)
     ser_pop_genome_map = pop.dtk.simulation["ParasiteGenetics"]["m_ParasiteGenomeMap"]
     ser_pop_genome_map.clear()
 
     cache_genome_map = {}
+    barcodes = _BarcodeStream(next_barcode_fn)
 
     for node in pop.nodes:
-        # tic1 = time.perf_counter()
-        for person in node["individualHumans"]:
-            # print("------------ " + str(person["suid"]["id"]) + " -----------------")
-            for infection in person["infections"]:
-                next_genome = get_next_genome(next_barcode_fn, person["suid"]["id"], ser_pop_genome_map,
-                                              cache_genome_map)
-                length_barcode = len(infection["infection_strain"]["m_Genome"]["m_pInner"]["m_NucleotideSequence"])
-                assert length_barcode == len(
-                    next_genome["m_pInner"]["m_NucleotideSequence"]), f"New barcode has wrong length."
-                infection["infection_strain"]["m_Genome"] = next_genome
-
-        # tic2 = time.perf_counter()
-        # print(f"{tic2 - tic1:0.4f}")
-
-        for vector_pop in node["m_vectorpopulations"]:
-            # print(len(vector_pop["AdultQueues"]))
-            # tic1 = time.perf_counter()
-            for vector in vector_pop["AdultQueues"]["collection"]:
-                # print("------------ VECTOR " + str(vector["m_ID"]) + " -----------------")
-                for oocyst in vector["m_OocystCohorts"]:
-                    genome_oocyst = get_next_genome(next_barcode_fn, -999, ser_pop_genome_map, cache_genome_map)
-                    length_oocyst_barcode = len(oocyst["m_MaleGametocyteGenome"]["m_pInner"]["m_NucleotideSequence"])
-                    assert len(genome_oocyst["m_pInner"][
-                                   "m_NucleotideSequence"]) == length_oocyst_barcode, f"New barcode has wrong length."
-                    oocyst["m_MaleGametocyteGenome"] = genome_oocyst
-
-                    genome_oocyst = get_next_genome(next_barcode_fn, -999, ser_pop_genome_map, cache_genome_map)
-                    length_oocyst_barcode = len(
-                        oocyst["m_pStrainIdentity"]["m_Genome"]["m_pInner"]["m_NucleotideSequence"])
-                    assert len(genome_oocyst["m_pInner"][
-                                   "m_NucleotideSequence"]) == length_oocyst_barcode, f"New barcode has wrong length."
-                    oocyst["m_pStrainIdentity"]["m_Genome"] = genome_oocyst
-
-                for sporo in vector["m_SporozoiteCohorts"]:
-                    genome_sporo = get_next_genome(next_barcode_fn, -999, ser_pop_genome_map, cache_genome_map)
-                    length_sporo_barcode = len(sporo["m_MaleGametocyteGenome"]["m_pInner"]["m_NucleotideSequence"])
-                    assert len(genome_sporo["m_pInner"][
-                                   "m_NucleotideSequence"]) == length_sporo_barcode, f"New barcode has wrong length."
-                    sporo["m_MaleGametocyteGenome"] = genome_sporo
-
-                    genome_sporo = get_next_genome(next_barcode_fn, -999, ser_pop_genome_map, cache_genome_map)
-                    length_sporo_barcode = len(
-                        sporo["m_pStrainIdentity"]["m_Genome"]["m_pInner"]["m_NucleotideSequence"])
-                    assert len(genome_sporo["m_pInner"][
-                                   "m_NucleotideSequence"]) == length_sporo_barcode, f"New barcode has wrong length."
-                    sporo["m_pStrainIdentity"]["m_Genome"] = genome_sporo
-
-            # tic2 = time.perf_counter()
-            # print(f"{tic2 - tic1:0.4f}")
+        if per_node:
+            barcodes = _BarcodeStream(next_barcode_fn.substream(node.externalId))
+        _replace_human_genomes(node["individualHumans"], barcodes, ser_pop_genome_map, cache_genome_map)
+        _replace_vector_genomes(node, barcodes, ser_pop_genome_map, cache_genome_map)
 
     pop.write(output_file)
 
@@ -208,26 +494,19 @@ def test_replace_genomes(input_fn, get_next_barcode):
         raise Exception(f"Couldn't find specified input file: {input_fn}.")
 
     pop = SerPop.SerializedPopulation(input_fn)
+    barcodes = _BarcodeStream(get_next_barcode)
 
     for node in pop.nodes:
+        if hasattr(get_next_barcode, "substream"):
+            barcodes = _BarcodeStream(get_next_barcode.substream(node.externalId))
+        slots = []
         for person in node["individualHumans"]:
-            for infection in person["infections"]:
-                genome_as_int = list(map(Genome.convert_char_to_int, get_next_barcode()))
-                assert infection["infection_strain"]["m_Genome"]["m_pInner"]["m_NucleotideSequence"] == genome_as_int
+            slots.extend(_human_genome_slots(person))
+        slots.extend(_vector_genome_slots(node))
 
-        for vector_pop in node["m_vectorpopulations"]:
-            for vector in vector_pop["AdultQueues"]["collection"]:
-                for oocyst in vector["m_OocystCohorts"]:
-                    genome_as_int = list(map(Genome.convert_char_to_int, get_next_barcode()))
-                    assert oocyst["m_MaleGametocyteGenome"]["m_pInner"]["m_NucleotideSequence"] == genome_as_int
-                    genome_as_int = list(map(Genome.convert_char_to_int, get_next_barcode()))
-                    assert oocyst["m_pStrainIdentity"]["m_Genome"]["m_pInner"]["m_NucleotideSequence"] == genome_as_int
-
-                for sporo in vector["m_SporozoiteCohorts"]:
-                    genome_as_int = list(map(Genome.convert_char_to_int, get_next_barcode()))
-                    assert sporo["m_MaleGametocyteGenome"]["m_pInner"]["m_NucleotideSequence"] == genome_as_int
-                    genome_as_int = list(map(Genome.convert_char_to_int, get_next_barcode()))
-                    assert sporo["m_pStrainIdentity"]["m_Genome"]["m_pInner"]["m_NucleotideSequence"] == genome_as_int
+        sequences = [container[key]["m_pInner"]["m_NucleotideSequence"] for container, key, _ in slots]
+        genomes_as_int = Genome.convert_barcodes_to_ints(barcodes.take(len(slots))).tolist()
+        assert sequences == genomes_as_int
 
 
 if __name__ == "__main__":
@@ -239,6 +518,9 @@ if __name__ == "__main__":
                         help="Module that contains the function to generate the barcodes.")
     parser.add_argument("-f", "--get_next_barcode_func", type=str, default="get_next_barcode",
                         help="Name of the function that returns the barcodes")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of nodes processed in parallel, requires a barcode provider with per-node "
+                             "substreams.")
     args = parser.parse_args()
 
     try:
@@ -248,7 +530,8 @@ if __name__ == "__main__":
         print("Current working directory:", os.getcwd())
         exit(-1)
 
-    replace_genomes(args.input_file, eval("user_defined_mod." + args.get_next_barcode_func), args.output_file)
+    replace_genomes(args.input_file, eval("user_defined_mod." + args.get_next_barcode_func), args.output_file,
+                    args.jobs)
 
     # importlib.reload(user_defined_mod)  # reimport module to reinitialize variables in module containing function to get next barcode
     # test_replace_genomes(args.output_file, eval("user_defined_mod." + args.get_next_barcode_func))
@@ -2,10 +2,15 @@
 
 from __future__ import print_function
 import argparse
+import os
+import time
 import emod_api.serialization.SerializedPopulation as SerPop
 import emod_api.serialization.dtkFileSupport as dtk
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import List
+from typing import Iterable, List, Set
+from emodpy_malaria.serialization.dtk_chunks import read_version
+from emodpy_malaria.serialization.population_transforms import PopulationTransform, transform_population
 
 # VectorStateEnum defined in VectorEnums.h
 STATE_INFECTIOUS = 0
@@ -60,9 +65,11 @@ def zero_vector_infections(vector_pop_list: list, remove=False):
                     cohort.m_pStrain = dtk.NullPtr()
 
 
-def zero_human_infections(humans: List[dict], keep_ids: list = None):
+def zero_human_infections(humans: List[dict], keep_ids: Iterable[int] = None):
     """
     Sets the infection state of individuals to uninfected.
+    Humans of a node share the same keys, so only the first zeroed human is validated against the template keys
+    (KeyError if any are missing). Later humans missing template keys are not reported, update() silently adds them.
 
     Args:
         humans: All humans in a node
@@ -72,22 +79,75 @@ def zero_human_infections(humans: List[dict], keep_ids: list = None):
         None
 
     """
-    if not keep_ids:
-        keep_ids = []
+    keep_ids = _id_set(keep_ids)
+    validated = False
     for person in humans:
-        if person.suid.id not in keep_ids:
-            if all(key in person for key in UNINFECTED_HUMAN):
-                person.update(UNINFECTED_HUMAN)
-            else:
-                missing_keys = set(UNINFECTED_HUMAN).difference(set(person))
+        if person.suid.id in keep_ids:
+            continue
+        if not validated:
+            missing_keys = set(UNINFECTED_HUMAN).difference(set(person))
+            if missing_keys:
                 raise KeyError("Template Uninfected Human and human of serialized population differ in the following "
                                "key(s): ", missing_keys)
+            validated = True
+        person.update(UNINFECTED_HUMAN)
+
+
+class ZeroInfectionsTransform(PopulationTransform):
+    """
+    Serialized population transform, which resets infections of humans and resets or removes infected vectors,
+    see zero_human_infections() and zero_vector_infections(). As there, only the first zeroed human of each node is
+    validated against the template keys.
+    """
+
+    def __init__(self, ignore_nodes: Iterable[int] = None, keep_individuals: Iterable[int] = None, remove=False):
+        """
+        Args:
+            ignore_nodes: Node ids. These nodes are skipped.
+            keep_individuals: Ids of individuals. These individuals are skipped.
+            remove: If true infected vectors are removed, if false infections are reset.
+        """
+        self.ignore_nodes = _id_set(ignore_nodes)
+        self.keep_individuals = _id_set(keep_individuals)
+        self.remove = remove
+        self._validated = False
+
+    def begin_node(self, node):
+        if node.externalId in self.ignore_nodes:
+            print('Ignoring node with node_id: {0}'.format(node.externalId))
+            return False
+        self._validated = False
+        return True
+
+    def visit_human(self, human, node):
+        if human.suid.id in self.keep_individuals:
+            return True
+        # Humans of a node share the same keys, validated once per node
+        if not self._validated:
+            zero_human_infections([human])
+            self._validated = True
+        else:
+            human.update(UNINFECTED_HUMAN)
+        return True
+
+    def visit_vector_cohort(self, cohort, queue, vector_population, node):
+        if self.remove:
+            return cohort.state != STATE_INFECTED and cohort.state != STATE_INFECTIOUS
+
+        assert (cohort['__class__'] == 'VectorCohortIndividual' or cohort['__class__'] == 'VectorCohort')
+        cohort.state = STATE_ADULT
+        cohort.progress = 0.0
+        cohort.m_pStrain = dtk.NullPtr()
+        return True
 
 
 def zero_infections(source_filename: str, dest_filename: str, ignore_nodes: List[int], keep_individuals: List[int],
                     remove=False) -> None:
     """
     Removes/resets infections from humans and vectors.
+    Nodes (and, in version 6 files, human collections) are read, zeroed, compressed and written one at a time,
+    see transform_population(). Files in the original single chunk format are loaded as a whole. The output file is
+    written to a temp file first, which then replaces it.
 
     Args:
         source_filename: input file
@@ -103,8 +163,13 @@ def zero_infections(source_filename: str, dest_filename: str, ignore_nodes: List
     print('Keeping infections in humans {0}'.format(keep_individuals))
     print("Reading file: '{0}'".format(source_filename))
 
-    ser_pop = SerPop.SerializedPopulation(source_filename)
+    if read_version(source_filename) > 1:
+        transform_population(source_filename, dest_filename,
+                             [ZeroInfectionsTransform(ignore_nodes, keep_individuals, remove)])
+        return
 
+    ser_pop = SerPop.SerializedPopulation(source_filename)
+    ignore_nodes = _id_set(ignore_nodes)
     for index, node in enumerate(ser_pop.nodes):
         print('Reading node {0} with node_id: {1}'.format(index, node.externalId))
         if node.externalId not in ignore_nodes:
@@ -115,16 +180,34 @@ def zero_infections(source_filename: str, dest_filename: str, ignore_nodes: List
         else:
             print('Ignoring node {0}'.format(index))
 
+    # Version 1 nodes are copies decoded from the single simulation chunk, which is written back on write().
+    simulation = ser_pop.dtk.simulation
+    for entry, node in zip(simulation.nodes, ser_pop.nodes):
+        entry.node = node
+    ser_pop.dtk.simulation = simulation
+
     # create output path if it doesn't exist
-    out_path = Path(dest_filename).parent
-    out_path.mkdir(parents=True, exist_ok=True)
-    ser_pop.write(dest_filename)
+    dest_filename = Path(dest_filename)
+    dest_filename.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temp file first, a partial output would be taken as already zeroed by zero_infection_path.
+    temp_filename = dest_filename.with_name(f".{dest_filename.name}.{os.getpid()}.tmp")
+    try:
+        ser_pop.write(str(temp_filename))
+        os.replace(temp_filename, dest_filename)
+    finally:
+        temp_filename.unlink(missing_ok=True)
+
+
+def _id_set(ids: Iterable[int] = None) -> Set[int]:
+    """Returns ids as a set, for constant time lookups."""
+    return ids if isinstance(ids, (set, frozenset)) else set(ids or [])
 
 
 def _get_paths(ser_paths: List[str], ser_date: List[str]) -> List[List[Path]]:
     """
     Get the path to all dtk files with a certain time stamp in a list of directories.
-    Files with 'zero' in the name are skipped.
+    Files with 'zero' in the name are skipped, as well as files which already have a '_zero' output file.
+    Each directory is scanned once.
 
     Args:
         ser_paths: a list of directories to look into for *.dtk files
@@ -137,13 +220,14 @@ def _get_paths(ser_paths: List[str], ser_date: List[str]) -> List[List[Path]]:
     files = []
     for s, serpath in enumerate(ser_paths):
         print('Processing simulation %d of %d' % (s + 1, len(ser_paths)))
-        dtk_files = [x.name for x in Path(serpath).glob('*.dtk')]
+        dtk_files = sorted([x.name for x in Path(serpath).glob('*.dtk')])
+        existing_files = set(dtk_files)
         serialization_files = [Path(serpath, x) for x in dtk_files if
                                ('zero' not in x and any(map(lambda s: s in x, ser_date)))]
 
         for filename in serialization_files:
             output_filename = Path(filename.parent, filename.stem + '_zero' + filename.suffix)
-            if output_filename.name in [x.name for x in Path(serpath).glob('*.dtk')]:
+            if output_filename.name in existing_files:
                 print(output_filename.name, ' already zeroed')
                 continue
             print('Found: {0}   Output: {1}'.format(filename, output_filename))
@@ -151,25 +235,72 @@ def _get_paths(ser_paths: List[str], ser_date: List[str]) -> List[List[Path]]:
     return files
 
 
-def zero_infection_path(in_out_paths: list, ser_date: list, ignore_nodeids: list = None, keep_humanids: list = None):
+def _zero_file(in_path: Path, out_path: Path, ignore_nodeids: List[int], keep_humanids: List[int]) -> list:
+    """Zeroes infections of one file, returns input and output paths, sizes (bytes) and duration (seconds)."""
+    start = time.perf_counter()
+    zero_infections(in_path, out_path, ignore_nodeids, keep_humanids)
+    return [in_path, out_path, Path(in_path).stat().st_size, Path(out_path).stat().st_size,
+            time.perf_counter() - start]
+
+
+def _print_summary(results: List[list]) -> None:
+    """Prints per file duration and sizes, and totals."""
+    print('\nZeroed {0} file(s):'.format(len(results)))
+    for in_path, out_path, in_size, out_size, seconds in results:
+        print('{0:8.1f} s  {1:10.1f} MB -> {2:10.1f} MB  {3} -> {4}'.format(
+            seconds, in_size / 1e6, out_size / 1e6, in_path, Path(out_path).name))
+    print('{0:8.1f} s  {1:10.1f} MB -> {2:10.1f} MB  total'.format(
+        sum([r[4] for r in results]), sum([r[2] for r in results]) / 1e6, sum([r[3] for r in results]) / 1e6))
+
+
+def zero_infection_path(in_out_paths: list, ser_date: list, ignore_nodeids: list = None, keep_humanids: list = None,
+                        jobs: int = 1) -> List[list]:
     """
     Loop over all .dtk files in ser_paths that have ser_date in the file name but not 'zero' and remove human and
-     vector infections. '_zero' is appended to the output files.
+     vector infections. '_zero' is appended to the output files. Files are processed in parallel, in separate
+     processes, if more than one job is specified. A per file duration and size summary is printed at the end.
 
     Args:
         in_out_paths: a list of lists of paths for directories to look into for .dtk files
         ser_date:  List of timestamps
         ignore_nodeids: list of nodes that are ignored
         keep_humanids: infections are not removed from these humans
+        jobs: number of files processed in parallel, default is 1
 
+    Returns:
+        List of input and output paths, sizes (bytes) and durations (seconds), one per file.
     """
     if not ignore_nodeids:
         ignore_nodeids = []
     if not keep_humanids:
         keep_humanids = []
     file_paths = _get_paths(in_out_paths, ser_date)
-    for in_path, out_path in file_paths:
-        zero_infections(in_path, out_path, ignore_nodeids, keep_humanids)
+
+    results, failed = [], []
+    if jobs > 1 and len(file_paths) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(_zero_file, in_path, out_path, ignore_nodeids, keep_humanids): in_path
+                       for in_path, out_path in file_paths}
+            for future in as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception as ex:
+                    failed.append([futures[future], ex])
+    else:
+        for in_path, out_path in file_paths:
+            try:
+                results.append(_zero_file(in_path, out_path, ignore_nodeids, keep_humanids))
+            except Exception as ex:
+                failed.append([in_path, ex])
+
+    results = sorted(results, key=lambda r: str(r[0]))
+    _print_summary(results)
+    if failed:
+        for in_path, ex in failed:
+            print('Failed: {0}   {1}: {2}'.format(in_path, type(ex).__name__, ex))
+        raise RuntimeError('Zeroing infections failed for {0} of {1} file(s).'.format(len(failed), len(file_paths)))
+
+    return results
 
 
 if __name__ == '__main__':
@@ -188,6 +319,8 @@ if __name__ == '__main__':
     remove_from_paths_group.add_argument("-t", "--time_stamps", default=[], nargs='+', type=str,
                                          help="List of timesteps. Filenames containing this timestep are "
                                               "processed, e.g. 001,021,365 ")
+    remove_from_paths_group.add_argument("-j", "--jobs", default=1, type=int,
+                                         help="Number of files processed in parallel.")
 
     args = parser.parse_args()
 
@@ -196,7 +329,7 @@ if __name__ == '__main__':
         zero_infections(args.source, args.destination, args.ignore, args.keep)
 
     elif args.paths and not args.source:
-        zero_infection_path(args.paths, args.time_stamps, args.ignore, args.keep)
+        zero_infection_path(args.paths, args.time_stamps, args.ignore, args.keep, args.jobs)
 
     else:
         parser.print_help()
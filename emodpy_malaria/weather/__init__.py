@@ -1,13 +1,17 @@
 import pandas as pd
-from typing import Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
 
 from emodpy_malaria.weather.weather_utils import *
 from emodpy_malaria.weather.weather_variable import WeatherVariable
 from emodpy_malaria.weather.weather_metadata import WeatherMetadata, WeatherAttributes
 from emodpy_malaria.weather.weather_data import WeatherData, DataFrameInfo
 from emodpy_malaria.weather.weather_set import WeatherSet
-from emodpy_malaria.weather.weather_request import WeatherRequest, WeatherArgs, RequestReport
+from emodpy_malaria.weather.weather_summary import WeatherSummary
+from emodpy_malaria.weather.weather_cache import WeatherCache
+from emodpy_malaria.weather.weather_request import WeatherRequest, WeatherRequestJob, WeatherArgs, RequestReport
 
+from idmtools.core.platform_factory import Platform
 from idmtools_platform_comps.comps_platform import COMPSPlatform
 
 # module level doc-string
@@ -27,16 +31,20 @@ Here are main features:
 
 # Use __all__ to let type checkers know what is part of the public API.
 _all_ = ['csv_to_weather',
-         'generate_weather'
+         'generate_weather',
+         'generate_weather_batch',
          'weather_to_csv',
          'WeatherRequest',
+         'WeatherRequestJob',
          'WeatherArgs',
          'RequestReport',
+         'WeatherCache',
          'WeatherMetadata',
          'WeatherAttributes',
          'WeatherData',
          'DataFrameInfo',
          'WeatherSet',
+         'WeatherSummary',
          'WeatherVariable']
 
 
@@ -51,7 +59,8 @@ def generate_weather(platform: Union[str, COMPSPlatform],
                      request_name: str = "",
                      local_dir: Union[str, Path] = None,
                      data_source: str = None,
-                     force: bool = False) -> WeatherRequest:
+                     force: bool = False,
+                     cache: WeatherCache = None) -> WeatherRequest:
     """
     Generate weather files by submitting a request and downloading generated weather files to a specified dir.
 
@@ -70,6 +79,7 @@ def generate_weather(platform: Union[str, COMPSPlatform],
         local_dir: (Optional) Local dir where files will be downloaded.
         data_source: (Optional) SSMT data source to be used.
         force: (Optional) Flag ensuring a new weather request is submitted, even if weather files exist in "local_dir".
+        cache: (Optional) Local weather cache, used to reuse weather files generated for the same arguments.
 
             **Example**::
 
@@ -92,13 +102,57 @@ def generate_weather(platform: Union[str, COMPSPlatform],
                      lon_column=lon_column,
                      id_reference=id_reference)
 
-    wr = WeatherRequest(platform=platform, local_dir=local_dir, data_source=data_source)
+    wr = WeatherRequest(platform=platform, local_dir=local_dir, data_source=data_source, cache=cache)
     wr.generate(weather_args=wa, request_name=request_name, force=force)
     wr.download(force=force)
 
     return wr
 
 
+def generate_weather_batch(platform: Union[str, COMPSPlatform],
+                           weather_args: List[WeatherArgs],
+                           local_dirs: List[Union[str, Path]] = None,
+                           data_source: str = None,
+                           force: bool = False,
+                           cache: WeatherCache = None,
+                           max_workers: int = 8) -> List[WeatherRequest]:
+    """
+    Generate weather files for a batch of weather arguments (e.g. many sites or date ranges). Requests are submitted
+    in parallel, each one's weather files are downloaded to its own local dir as soon as generated.
+
+    Args:
+        platform: Platform name (like "Calculon") or COMPSPlatform object, where the work items will run.
+        weather_args: List of weather arguments, each defining one request space and time scope.
+        local_dirs: (Optional) Local dirs where files will be downloaded, one per weather arguments.
+                    If not specified temp dirs are created.
+        data_source: (Optional) SSMT data source to be used.
+        force: (Optional) Flag ensuring new weather requests are submitted, even if weather files exist in local dirs.
+        cache: (Optional) Local weather cache, used to reuse weather files generated for the same arguments.
+        max_workers: (Optional) Max number of requests running at the same time. The default is 8.
+
+            **Example**::
+
+                wa_list = [WeatherArgs(site_file=f, start_date=2015, end_date=2016) for f in site_files]
+                requests = generate_weather_batch(platform="Calculon", weather_args=wa_list)
+
+    Returns:
+        List of WeatherRequest objects, in the order of weather arguments.
+    """
+    local_dirs = local_dirs or [None] * len(weather_args)
+    assert len(local_dirs) == len(weather_args), "The number of local dirs must match the number of weather args."
+
+    platform = Platform(platform) if isinstance(platform, str) else platform
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        jobs = [WeatherRequest(platform=platform, local_dir=local_dir, data_source=data_source, cache=cache)
+                .generate_async(weather_args=wa, force=force, download=True, executor=executor)
+                for wa, local_dir in zip(weather_args, local_dirs)]
+
+        for job in jobs:
+            job.wait()
+
+    return [job.request for job in jobs]
+
+
 def csv_to_weather(csv_data: Union[str, Path, pd.DataFrame],
                    node_column: str = "nodes",
                    step_column: str = "steps",
@@ -156,7 +210,8 @@ def weather_to_csv(weather_dir: Union[str, Path],
                    csv_file: Union[str, Path] = None,
                    node_column: str = "nodes",
                    step_column: str = "steps",
-                   weather_columns: Dict[WeatherVariable, str] = None) -> Tuple[pd.DataFrame, WeatherAttributes]:
+                   weather_columns: Dict[WeatherVariable, str] = None,
+                   chunk_nodes: int = None) -> Tuple[pd.DataFrame, WeatherAttributes]:
     """
     Convert weather files into a dataframe and a .csv file, if csv file path is specified.
 
@@ -169,6 +224,9 @@ def weather_to_csv(weather_dir: Union[str, Path],
         step_column: (Optional) Column containing node index for weather time series values. The default is "steps".
         weather_columns: (Optional) Dictionary of weather variables (keys) and weather column names (values).
                          Defaults are WeatherVariables values are used: "airtemp", "humidity", "rainfall", "landtemp".
+        chunk_nodes: (Optional) Number of nodes written at once, used only if csv file path is specified. If specified,
+                     weather files are memory-mapped and the csv file is written in blocks of nodes, without creating
+                     the dataframe for all nodes (in that case the returned dataframe is None).
 
             **Example**::
 
@@ -177,12 +235,17 @@ def weather_to_csv(weather_dir: Union[str, Path],
     Returns:
         Dataframe and weather attributes objects.
     """
-    ws = WeatherSet.from_files(dir_path=weather_dir, prefix=weather_file_prefix, file_names=weather_file_names)
+    mmap = chunk_nodes is not None and bool(csv_file)
+    ws = WeatherSet.from_files(dir_path=weather_dir,
+                               prefix=weather_file_prefix,
+                               file_names=weather_file_names,
+                               mmap=mmap)
     if csv_file:
         df = ws.to_csv(file_path=csv_file,
                        node_column=node_column,
                        step_column=step_column,
-                       weather_columns=weather_columns)
+                       weather_columns=weather_columns,
+                       chunk_nodes=chunk_nodes)
     else:
         df = ws.to_dataframe(node_column=node_column,
                              step_column=step_column,
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+
+"""
+Content-addressed local cache of weather files, used by WeatherRequest to reuse already generated weather sets.
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from pathlib import Path
+from typing import Dict, List, NoReturn, TYPE_CHECKING, Union
+
+from emodpy_malaria.weather.weather_utils import make_path, ymd
+
+if TYPE_CHECKING:
+    from emodpy_malaria.weather.weather_request import WeatherArgs
+
+_INDEX_FILE_NAME = "index.json"
+_LOCK_FILE_NAME = ".lock"
+_DEFAULT_CACHE_DIR = Path.home().joinpath(".emodpy_malaria", "weather_cache")
+
+
+def _synchronized(method):
+    """
+    Decorator running a cache method under the cache lock, so the cache can be shared by threads and processes.
+    The thread lock is held together with an exclusive lock of the lock file in the cache dir.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            if self._lock_depth == 0:
+                self._lock_handle = open(self._cache_dir.joinpath(_LOCK_FILE_NAME), "a+b")
+                _lock_file(self._lock_handle)
+            self._lock_depth += 1
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    _unlock_file(self._lock_handle)
+                    self._lock_handle.close()
+                    self._lock_handle = None
+
+    return wrapper
+
+
+if os.name == "nt":
+    import msvcrt
+
+    def _lock_file(file) -> NoReturn:
+        file.seek(0)
+        while True:
+            try:
+                msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:     # LK_LOCK gives up after 10 seconds
+                continue
+
+    def _unlock_file(file) -> NoReturn:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock_file(file) -> NoReturn:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(file) -> NoReturn:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+class WeatherCache:
+    """
+    Local on-disk cache of weather files. Each entry is a set of weather files stored in a subdir named by the entry
+    key, which is a canonical hash of weather arguments (site file content, dates, columns, id reference) and
+    the data source name. The index file tracks entry files, sizes, asset collection ids and last use time.
+    When the cache size exceeds the max size the least recently used entries are evicted.
+    Changes to the cache are made under a lock file, so one cache dir can be used by several processes.
+    """
+
+    def __init__(self, cache_dir: Union[str, Path] = None, max_size: int = None, link: bool = False):
+        """
+        Initializes weather cache object.
+
+        Args:
+            cache_dir: (Optional) Cache dir. The default is "~/.emodpy_malaria/weather_cache".
+            max_size: (Optional) Max total size of cached files, in bytes. The default is no limit.
+            link: (Optional) Flag indicating whether cached files are hardlinked into target dirs, when possible.
+                  The default is False, files are copied. Hardlinked files share content with the cache and must
+                  not be modified in place (WeatherData and WeatherMetadata to_file replace files, which is safe).
+                  If linking is not possible (e.g. a different file system) files are copied.
+        """
+        if max_size is not None and max_size < 0:
+            raise ValueError("Max cache size must be a non-negative number of bytes.")
+
+        self._cache_dir: Path = Path(cache_dir or _DEFAULT_CACHE_DIR)
+        self._max_size: Union[int, None] = max_size
+        self._link: bool = link
+        self._lock = threading.RLock()
+        self._lock_depth: int = 0
+        self._lock_handle = None
+        make_path(self._cache_dir)
+
+    @property
+    def cache_dir(self) -> Path:
+        """Cache dir property."""
+        return self._cache_dir
+
+    @property
+    def size(self) -> int:
+        """Total size of cached files, in bytes."""
+        return sum([e["size"] for e in self._read_index().values()])
+
+    @property
+    def keys(self) -> List[str]:
+        """List of cache entry keys, from the least to the most recently used."""
+        index = self._read_index()
+        return sorted(index, key=lambda k: index[k]["last_used"])
+
+    @classmethod
+    def make_key(cls, weather_args: WeatherArgs, data_source: str) -> str:
+        """
+        Creates cache key, a canonical hash of weather arguments and data source name.
+        The site file is represented by its content, so the same sites in different dirs share the entry.
+
+        Args:
+            weather_args: Arguments defining space and time scope and weather files' id reference.
+            data_source: Data source name.
+
+        Returns:
+            Hex digest string.
+        """
+        wa = weather_args
+        content = {
+            "data_source": data_source,
+            "site_file": hashlib.sha256(Path(wa.site_file).read_bytes()).hexdigest(),
+            "site_file_type": Path(wa.site_file).suffix.lower(),
+            "start_date": ymd(wa.start_date),
+            "end_date": ymd(wa.end_date),
+            "node_column": wa.node_column,
+            "lat_column": wa.lat_column,
+            "lon_column": wa.lon_column,
+            "id_reference": wa.id_reference
+        }
+        return cls._hash(content)
+
+    @classmethod
+    def make_data_key(cls, data_id: str) -> str:
+        """Creates cache key for weather files downloaded by data id (asset collection id) only."""
+        return cls._hash({"data_id": str(data_id)})
+
+    def contains(self, key: str) -> bool:
+        """Returns True if the cache contains all files of the entry."""
+        entry = self._read_index().get(key)
+        return entry is not None and all([self._entry_dir(key).joinpath(f).is_file() for f in entry["files"]])
+
+    def data_id(self, key: str) -> Union[str, None]:
+        """Returns data id (asset collection id) of the entry, if known."""
+        entry = self._read_index().get(key)
+        return entry["data_id"] if entry else None
+
+    def find(self, data_id: str) -> Union[str, None]:
+        """Returns the key of the most recently used entry with the specified data id, or None if not found."""
+        if data_id is None:
+            return None
+
+        found = [k for k in reversed(self.keys) if self.data_id(k) == data_id and self.contains(k)]
+        return found[0] if found else None
+
+    @_synchronized
+    def get(self, key: str, target_dir: Union[str, Path]) -> Union[List[str], None]:
+        """
+        Places cached weather files into the target dir, replacing existing files with the same names.
+        Each file is first linked (or copied) under a temp name and then renamed, so target files are never partial.
+
+        Args:
+            key: Cache entry key.
+            target_dir: Dir where weather files are placed.
+
+        Returns:
+            List of placed file paths, or None if the entry is not found.
+        """
+        if not self.contains(key):
+            return None
+
+        files = self._read_index()[key]["files"]
+        make_path(target_dir)
+        paths = [self._place_file(self._entry_dir(key).joinpath(f), Path(target_dir).joinpath(f)) for f in files]
+        self._touch(key)
+
+        return [str(p) for p in paths]
+
+    @_synchronized
+    def put(self, key: str, files: List[Union[str, Path]], data_id: str = None) -> NoReturn:
+        """
+        Adds weather files to the cache, replacing the existing entry, and evicts least recently used entries
+        if the cache size exceeds the max size.
+
+        Args:
+            key: Cache entry key.
+            files: Weather file paths.
+            data_id: (Optional) Data id (asset collection id) of weather files.
+
+        Returns:
+            None
+        """
+        files = [Path(f) for f in files]
+        assert len(files) > 0 and all([f.is_file() for f in files]), "All cached weather files must exist."
+
+        # Copy into a temp dir, inside the cache dir, and move the whole entry dir in place.
+        temp_dir = Path(tempfile.mkdtemp(dir=self._cache_dir, prefix=".tmp-"))
+        try:
+            for f in files:
+                shutil.copy2(f, temp_dir.joinpath(f.name))
+
+            self._remove_entry_dir(key)
+            os.replace(temp_dir, self._entry_dir(key))
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        index = self._read_index()
+        index[key] = {
+            "files": sorted([f.name for f in files]),
+            "size": sum([f.stat().st_size for f in files]),
+            "data_id": data_id,
+            "last_used": self._now(index)
+        }
+        self._write_index(index)
+        self.evict(keep=[key])
+
+    @_synchronized
+    def evict(self, max_size: int = None, keep: List[str] = None) -> List[str]:
+        """
+        Removes least recently used entries until the cache size is not larger than the max size.
+
+        Args:
+            max_size: (Optional) Max total size of cached files. The default is the cache max size.
+            keep: (Optional) Keys of entries which are not evicted.
+
+        Returns:
+            List of evicted keys.
+        """
+        max_size = self._max_size if max_size is None else max_size
+        if max_size is None:
+            return []
+
+        index = self._read_index()
+        size = sum([e["size"] for e in index.values()])
+        evicted = []
+        for key in sorted(index, key=lambda k: index[k]["last_used"]):
+            if size <= max_size:
+                break
+            if key in (keep or []):
+                continue
+            size -= index.pop(key)["size"]
+            self._remove_entry_dir(key)
+            evicted.append(key)
+
+        self._write_index(index)
+        return evicted
+
+    @_synchronized
+    def clear(self) -> NoReturn:
+        """Removes all cache entries."""
+        for key in self._read_index():
+            self._remove_entry_dir(key)
+
+        self._write_index({})
+
+    # Helpers
+
+    @classmethod
+    def _hash(cls, content: Dict) -> str:
+        """Hash of canonical json representation of a dictionary."""
+        return hashlib.sha256(json.dumps(content, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+    def _entry_dir(self, key: str) -> Path:
+        return self._cache_dir.joinpath(key)
+
+    def _remove_entry_dir(self, key: str) -> NoReturn:
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def _place_file(self, source: Path, target: Path) -> Path:
+        """Links or copies a file under a temp name in the target dir and renames it to the target name."""
+        temp = target.with_name(f".{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        temp.unlink(missing_ok=True)
+        try:
+            if not self._link:
+                raise OSError("Linking disabled.")
+            os.link(source, temp)
+        except OSError:
+            shutil.copy2(source, temp)
+
+        os.replace(temp, target)
+        return target
+
+    def _touch(self, key: str) -> NoReturn:
+        index = self._read_index()
+        index[key]["last_used"] = self._now(index)
+        self._write_index(index)
+
+    @classmethod
+    def _now(cls, index: Dict[str, Dict]) -> float:
+        """Current time, later than last use time of all entries (keeps LRU order if the clock is coarse)."""
+        return max([time.time()] + [e["last_used"] + 1e-6 for e in index.values()])
+
+    def _read_index(self) -> Dict[str, Dict]:
+        index_path = self._cache_dir.joinpath(_INDEX_FILE_NAME)
+        return json.loads(index_path.read_text()) if index_path.is_file() else {}
+
+    def _write_index(self, index: Dict[str, Dict]) -> NoReturn:
+        """Writes index file, to a temp file first, which then replaces the index file."""
+        index_path = self._cache_dir.joinpath(_INDEX_FILE_NAME)
+        temp_path = index_path.with_name(f".{_INDEX_FILE_NAME}.{os.getpid()}.tmp")
+        temp_path.write_text(json.dumps(index, indent=2))
+        os.replace(temp_path, index_path)
@@ -9,13 +9,24 @@ from __future__ import annotations
 import numpy as np
 import pandas as pd
 
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, Iterable, List, NoReturn, Tuple, Union
+from typing import Callable, Dict, Iterable, List, NoReturn, Tuple, Union
 
 
-from emodpy_malaria.weather.weather_utils import hash_series, invert_dict, make_path
+from emodpy_malaria.weather.weather_utils import invert_dict, make_path, replace_file, unique_series
 from emodpy_malaria.weather.weather_variable import WeatherVariable
 from emodpy_malaria.weather.weather_metadata import WeatherMetadata, WeatherAttributes, SERIES_BYTE_VALUE_SIZE
+from emodpy_malaria.weather.weather_metadata import _META_DATA_YEARS, _META_START_DOY, _META_UPDATE_FREQUENCY
+
+# Resampling periods, as pandas period aliases and EMOD update resolutions.
+_RESAMPLE_PERIODS = {
+    "week": ("W", "CLIMATE_UPDATE_WEEK"),
+    "month": ("M", "CLIMATE_UPDATE_MONTH"),
+    "year": ("Y", "CLIMATE_UPDATE_YEAR"),
+}
+_RESAMPLE_AGGREGATIONS = {"mean": np.add, "sum": np.add, "min": np.minimum, "max": np.maximum}
+_DAILY_UPDATE_RESOLUTIONS = ["CLIMATE_UPDATE_DAY", "Unspecified", None]
 
 
 class WeatherData:
@@ -35,6 +46,8 @@ class WeatherData:
         """
         data = self._ensure_data_type(data)
         self._data: np.ndarray = data
+        self._node_index: Union[Tuple[np.ndarray, np.ndarray], None] = None     # sorted node ids and data rows
+        self._file_path: Union[str, None] = None    # weather file matching the data, set by from_file, open, to_file
 
         if metadata is not None:
             # If metadata is provided ensure data shape matches metadata info
@@ -73,13 +86,238 @@ class WeatherData:
         """Raw data, reshaped in one row per node weather time series."""
         return self._data
 
+    @property
+    def file_path(self) -> Union[str, None]:
+        """The weather file (.bin) the data was read from or written to, None if the data was transformed since."""
+        return self._file_path
+
+    # Node access members
+
+    def series(self, node_id: int) -> np.ndarray[np.float32]:
+        """
+        Returns the weather time series of a node, as a view of the data array (memory-mapped data is not copied).
+
+        Args:
+            node_id: The node id.
+
+        Returns:
+            Node weather time series.
+        """
+        rows = self._node_rows([node_id])
+        return self._data[rows[0]]
+
+    def slice(self, nodes: Iterable[int] = None, start_step: int = 0, end_step: int = None) -> np.ndarray[np.float32]:
+        """
+        Returns weather time series of selected nodes and time steps, one row per node. Only the selected values
+        are read, so cutting a region or a period from a memory-mapped weather file doesn't load the whole file.
+
+        Args:
+            nodes: (Optional) Node ids. The default is all nodes, in the node-offset dictionary order.
+            start_step: (Optional) Zero-based index of the first time step. The default is 0.
+            end_step: (Optional) Zero-based index of the time step after the last one. The default is series length.
+
+        Returns:
+            A 2d float32 array with rows corresponding to nodes and columns to time steps.
+        """
+        nodes = self.metadata.nodes if nodes is None else list(nodes)
+        rows = self._node_rows(nodes)
+        return np.array(self._data[rows, start_step:end_step])
+
+    def node_groups(self) -> Iterable[Tuple[List[int], np.ndarray[np.float32]]]:
+        """
+        Iterates over unique weather time series and nodes sharing them, in the order series are stored.
+        Series are views of the data array (memory-mapped data is not copied).
+
+        Returns:
+            Iterator of tuples, a list of node ids and their weather time series.
+        """
+        for row, nodes in enumerate(self.metadata.offset_nodes.values()):
+            yield nodes, self._data[row]
+
+    def _node_rows(self, nodes: Iterable[int]) -> np.ndarray:
+        """Returns data array rows of node weather time series, based on the metadata node-offset dictionary."""
+        if self._node_index is None:
+            node_ids, offsets = self.metadata.node_offset_arrays
+            # Series are stored in the order of offsets, the row is the rank of node offset among distinct offsets.
+            rows = np.searchsorted(np.unique(offsets), offsets)
+            order = np.argsort(node_ids)
+            self._node_index = node_ids[order], rows[order]
+
+        node_ids, rows = self._node_index
+        nodes = np.asarray(nodes, dtype=np.int64).reshape(-1)
+        positions = np.minimum(np.searchsorted(node_ids, nodes), len(node_ids) - 1)
+        missing = nodes[node_ids[positions] != nodes]
+        if len(missing) > 0:
+            raise KeyError(f"Nodes not found in weather data: {missing[:5].tolist()}")
+
+        return rows[positions]
+
+    # Transformation members
+    # Transformations operate on unique weather time series, keep node offsets and return this object (for chaining).
+
+    def apply(self, func: Callable[[np.ndarray], np.ndarray]) -> WeatherData:
+        """
+        Applies a function to weather data, a 2d array of unique weather time series (rows) and time steps (columns).
+
+        Args:
+            func: Function taking and returning a 2d array with the same number of rows. The number of columns
+                  (time steps) can change, in which case the weather series length is updated.
+
+        Returns:
+            This WeatherData object.
+        """
+        return self._replace_data(func(self._data))
+
+    def scale(self, factor: Union[float, Iterable[float]]) -> WeatherData:
+        """
+        Multiplies weather values by a factor (e.g. rainfall scaling).
+
+        Args:
+            factor: A single factor or a factor per time step.
+
+        Returns:
+            This WeatherData object.
+        """
+        return self._replace_data(self._data * np.asarray(factor, dtype=np.float32))
+
+    def offset(self, value: Union[float, Iterable[float]]) -> WeatherData:
+        """
+        Adds a value to weather values (e.g. warming offset).
+
+        Args:
+            value: A single value or a value per time step.
+
+        Returns:
+            This WeatherData object.
+        """
+        return self._replace_data(self._data + np.asarray(value, dtype=np.float32))
+
+    def roll(self, steps: int) -> WeatherData:
+        """
+        Shifts weather time series by a number of time steps. Values shifted beyond the last step are reintroduced
+        at the first step (and vice versa).
+
+        Args:
+            steps: Number of time steps, positive values shift series forward in time.
+
+        Returns:
+            This WeatherData object.
+        """
+        return self._replace_data(np.roll(self._data, steps, axis=1))
+
+    def clip(self, min_value: float = None, max_value: float = None) -> WeatherData:
+        """
+        Limits weather values to an interval.
+
+        Args:
+            min_value: (Optional) Min value. The default is no lower limit.
+            max_value: (Optional) Max value. The default is no upper limit.
+
+        Returns:
+            This WeatherData object.
+        """
+        assert min_value is not None or max_value is not None, "Min or max value must be specified."
+        return self._replace_data(np.clip(self._data, min_value, max_value))
+
+    def resample(self, period: str = "month", how: str = "mean") -> WeatherData:
+        """
+        Aggregates daily weather values by calendar weeks, months or years. Dates of time steps are based on
+        the data years and start day of year attributes, and the update resolution attribute is set to the period.
+
+        Args:
+            period: (Optional) Aggregation period: "week", "month" or "year". The default is "month".
+            how: (Optional) Aggregation: "mean", "sum", "min" or "max". The default is "mean".
+
+        Returns:
+            This WeatherData object.
+        """
+        if period not in _RESAMPLE_PERIODS:
+            raise ValueError(f"Unsupported period {period}, supported are: {', '.join(_RESAMPLE_PERIODS)}.")
+        if how not in _RESAMPLE_AGGREGATIONS:
+            raise ValueError(f"Unsupported aggregation {how}, supported are: {', '.join(_RESAMPLE_AGGREGATIONS)}.")
+
+        alias, update_resolution = _RESAMPLE_PERIODS[period]
+        periods = self._step_dates().to_period(alias).asi8
+        starts = np.flatnonzero(np.concatenate(([True], periods[1:] != periods[:-1])))
+        data = _RESAMPLE_AGGREGATIONS[how].reduceat(self._data.astype(np.float64), starts, axis=1)
+        if how == "mean":
+            data /= np.diff(np.append(starts, len(periods)))
+
+        return self._replace_data(data, {_META_UPDATE_FREQUENCY: update_resolution})
+
+    def select_years(self, start_year: int, end_year: int = None) -> WeatherData:
+        """
+        Selects daily weather values of a range of years. Dates of time steps are based on the data years and
+        start day of year attributes, which are updated to the selected years.
+
+        Args:
+            start_year: The first selected year.
+            end_year: (Optional) The last selected year. The default is the start year.
+
+        Returns:
+            This WeatherData object.
+        """
+        end_year = end_year or start_year
+        dates = self._step_dates()
+        selected = (dates.year >= start_year) & (dates.year <= end_year)
+        if not selected.any():
+            raise ValueError(f"No weather data for years {start_year}-{end_year}.")
+
+        start_doy = self.metadata.attributes_dict.get(_META_START_DOY, 1)
+        first = dates[selected][0]
+        start_doy = first.dayofyear if str(start_doy).isdigit() else f"{first.strftime('%B')} {first.day}"
+        attributes = {_META_DATA_YEARS: f"{start_year}-{end_year}", _META_START_DOY: start_doy}
+        return self._replace_data(self._data[:, selected], attributes)
+
+    def _step_dates(self) -> pd.DatetimeIndex:
+        """Dates of daily time steps, based on data years and start day of year attributes."""
+        wm = self.metadata
+        assert wm.update_resolution in _DAILY_UPDATE_RESOLUTIONS, "Weather data must have daily time steps."
+        start_year = int(str(wm.data_years).split("-")[0])
+        start_doy = str(wm.attributes_dict.get(_META_START_DOY, 1))
+        if start_doy.isdigit():
+            start_date = datetime(start_year, 1, 1) + timedelta(days=int(start_doy) - 1)
+        else:
+            start_date = datetime.strptime(f"{start_doy} {start_year}", "%B %d %Y")
+
+        return pd.date_range(start_date, periods=wm.series_len, freq="D")
+
+    def _replace_data(self, data: np.ndarray, attributes: Dict[str, Union[str, int]] = None) -> WeatherData:
+        """
+        Replaces weather data with transformed unique series, keeping node-series mapping. If series length changes,
+        or attributes are updated, metadata is recreated with offsets based on the new series length.
+
+        Args:
+            data: 2d array of transformed weather data, with the same number of rows (unique series).
+            attributes: (Optional) Metadata attributes to be updated.
+
+        Returns:
+            This WeatherData object.
+        """
+        data = np.ascontiguousarray(data, dtype=np.float32)
+        assert data.ndim == 2 and data.shape[0] == self._data.shape[0], "Transformed data must keep unique series."
+        if data.shape[1] != self.metadata.series_len or attributes:
+            node_ids, offsets = self.metadata.node_offset_arrays
+            rows = np.searchsorted(np.unique(offsets), offsets)
+            offsets = rows.astype(np.int64) * data.shape[1] * SERIES_BYTE_VALUE_SIZE
+            self._metadata = WeatherMetadata(node_ids=(node_ids, offsets),
+                                             series_len=data.shape[1],
+                                             attributes={**self.metadata.attributes_dict, **(attributes or {})})
+            self._node_index = None
+
+        self._data = data
+        self._file_path = None
+        self.validate()
+        return self
+
     # Import/Export members
 
     @classmethod
     def from_dict(cls,
                   node_series: Dict[int, Union[np.ndarray[np.float32], List[float]]],
                   same_nodes: Dict[int, List[int]] = None,
-                  attributes: WeatherAttributes = None) -> WeatherData:
+                  attributes: WeatherAttributes = None,
+                  tolerance: float = None) -> WeatherData:
         """
         Creates a WeatherData object from a dictionary mapping nodes and node weather time series.
         The method identifies unique node weather time series and produces a corresponding node-offset dictionary.
@@ -89,6 +327,8 @@ class WeatherData:
             same_nodes: (Optional) Dictionary, mapping nodes from 'node_series' dictionary to additional nodes
                                    which series are the same. Keys are node ids, values are lists of node ids.
             attributes: (Optional) Attributes used to initiate weather metadata. If not provided, defaults are used.
+            tolerance: (Optional) If specified, series which are the same after rounding values to the nearest multiple
+                       of tolerance are stored once (e.g. 0.01 for gridded data). By default, only exact duplicates.
 
         Returns:
             WeatherData object.
@@ -119,19 +359,43 @@ class WeatherData:
         if any(np.isnan(series_values.reshape(-1))):    #
             raise ValueError("Time series contains 'NaN' values.")
 
+        nodes = np.array([int(n) for n in node_series], dtype=np.int64)     # Make sure node ids are int.
+        wd = cls._from_series_array(nodes=nodes, series_values=series_values, same_nodes=same_nodes,
+                                    attributes=attributes, tolerance=tolerance)
+        return wd
+
+    @classmethod
+    def _from_series_array(cls,
+                           nodes: np.ndarray,
+                           series_values: np.ndarray,
+                           same_nodes: Dict[int, List[int]] = None,
+                           attributes: WeatherAttributes = None,
+                           tolerance: float = None) -> WeatherData:
+        """
+        Creates a WeatherData object from an array of node ids and a 2d array of corresponding node weather time series.
+        The method identifies unique node weather time series and produces a corresponding node-offset dictionary.
+        Used by from_dict and from_dataframe after input is validated.
+
+        Args:
+            nodes: Array of distinct node ids, one per row of series_values.
+            series_values: A 2d float32 array, one weather time series per row (don't have to be unique).
+            same_nodes: (Optional) Dictionary, mapping nodes from 'nodes' array to additional nodes
+                                   which series are the same. Keys are node ids, values are lists of node ids.
+            attributes: (Optional) Attributes used to initiate weather metadata. If not provided, defaults are used.
+            tolerance: (Optional) Rounding step used to merge near-duplicate series. By default, only exact duplicates.
+
+        Returns:
+            WeatherData object.
+        """
         same_nodes = same_nodes or {}
 
-        # Identify unique node weather time series, make sure node ids are int.
-        node_series_hashes = {int(n): hash_series(s) for n, s in node_series.items()}       # Create node->hash dict
-        unique_nodes = {h: nn[0] for h, nn in invert_dict(node_series_hashes).items()}      # Invert into hash->nodes
-        unique_series = [node_series[n] for n in unique_nodes.values()]                     # List unique time series
+        # Identify unique node weather time series and the unique series representing each node.
+        unique_rows, inverse = unique_series(series_values, tolerance=tolerance)
 
         # Calculate offset increment per node as time series length x number of bytes per value
         offset_increment = series_values.shape[1] * SERIES_BYTE_VALUE_SIZE
-        # Create node->offset dict, for nodes with unique weather time series
-        node_offsets = {n: (i * offset_increment) for i, n in enumerate(unique_nodes.values())}
-        # Update node->offset dict, add nodes sharing same offsets
-        node_offsets.update({n: node_offsets[unique_nodes[h]] for n, h in node_series_hashes.items()})
+        # Create node->offset dict, nodes sharing the same series share the same offset
+        node_offsets = dict(zip(nodes.tolist(), (inverse * offset_increment).tolist()))
 
         # Add other nodes, if specified
         # Invert dict from "unique node"->"list of nodes with that same offset" to "...same..."->"unique node"
@@ -140,8 +404,8 @@ class WeatherData:
         # Sort by node, offset
         node_offsets = dict(sorted(node_offsets.items()))
 
-        # Convert the list of weather timeseries into a NumPy array and init WeatherMetadata and WeatherData objects
-        data = np.array(unique_series, dtype=np.float32)
+        # Select unique weather time series and init WeatherMetadata and WeatherData objects
+        data = np.array(series_values[unique_rows], dtype=np.float32)
         wm = WeatherMetadata(node_ids=node_offsets, series_len=data.shape[1], attributes=attributes)
         wd = WeatherData(data=data, metadata=wm)
 
@@ -170,7 +434,11 @@ class WeatherData:
         return data_dict
 
     @classmethod
-    def from_csv(cls, file_path: Union[str, Path], info: DataFrameInfo = None, attributes: WeatherAttributes = None) -> WeatherData:
+    def from_csv(cls,
+                 file_path: Union[str, Path],
+                 info: DataFrameInfo = None,
+                 attributes: WeatherAttributes = None,
+                 tolerance: float = None) -> WeatherData:
         """
         Creates a WeatherData object from a csv file. Used for creating or editing weather files.
         The method identifies unique node weather time series and produces a corresponding node-offset dictionary.
@@ -179,13 +447,15 @@ class WeatherData:
             file_path: The csv file path from which weather data is loaded (expected columns: node, step, value).
             info: (Optional) Dataframe info object describing dataframe columns and content.
             attributes: (Optional) Attributes used to initiate weather metadata. If not provided, defaults are used.
+            tolerance: (Optional) If specified, series which are the same after rounding values to the nearest multiple
+                       of tolerance are stored once (e.g. 0.01 for gridded data). By default, only exact duplicates.
 
         Returns:
             WeatherData object.
         """
         assert Path(file_path).is_file(), f"Weather file not found: {file_path}."
         df = pd.read_csv(file_path)
-        wd = cls.from_dataframe(df, info=info, attributes=attributes)
+        wd = cls.from_dataframe(df, info=info, attributes=attributes, tolerance=tolerance)
         return wd
 
     def to_csv(self, file_path: Union[str, Path], info: DataFrameInfo = None) -> pd.DataFrame:
@@ -208,7 +478,8 @@ class WeatherData:
     def from_dataframe(cls,
                        df: pd.DateFrame,
                        info: DataFrameInfo = None,
-                       attributes: WeatherAttributes = None) -> WeatherData:
+                       attributes: WeatherAttributes = None,
+                       tolerance: float = None) -> WeatherData:
         """
         Creates WeatherData object from the Pandas dataframe. The dataframe is expected to contain
         node ids, time steps and weather node weather time series as separate columns.
@@ -217,6 +488,8 @@ class WeatherData:
             df: Dataframe containing nodes and weather time series (expected columns: node, step, value).
             info: (Optional) Dataframe info object describing dataframe columns and content.
             attributes: (Optional) Attributes used to initiate weather metadata. If not provided, defaults are used.
+            tolerance: (Optional) If specified, series which are the same after rounding values to the nearest multiple
+                       of tolerance are stored once (e.g. 0.01 for gridded data). By default, only exact duplicates.
 
         Returns:
             WeatherData object.
@@ -226,52 +499,109 @@ class WeatherData:
             raise exception("df argument must be a non-empty pandas DataFrame")
 
         info = info or DataFrameInfo.detect_columns(df=df)
-        nc, sc, vc = [info.node_column, info.step_column, info.value_column]
+        nodes, order = cls._index_series_rows(df=df, info=info)
+        wd = cls._from_series_column(df=df, info=info, nodes=nodes, order=order, attributes=attributes,
+                                     tolerance=tolerance)
+        return wd
+
+    @classmethod
+    def _index_series_rows(cls, df: pd.DataFrame, info: DataFrameInfo) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Index dataframe rows by node and step. The index is shared by all value columns of the same dataframe.
+
+        Args:
+            df: Dataframe containing nodes and weather time series (expected columns: node, step, value).
+            info: Dataframe info object describing dataframe columns and content.
+
+        Returns:
+            Tuple of sorted distinct node ids and a 2d array of dataframe row positions, having one row per node and
+            one column per step (rows are ordered by node and columns by step).
+        """
+        nc, sc = [info.node_column, info.step_column]
 
-        # Test for "nan" values in target columns.
-        for c in [nc, sc, vc]:
+        # Test for "nan" values in node and step columns.
+        for c in [nc, sc]:
             if df[c].hasnans:
                 raise ValueError(f"Column {c} contains 'NaN' values.")
 
-        df = df[[nc, sc, vc]].sort_values(by=[nc, sc])
-        df = df[[nc, vc]].set_index(nc)
-        node_series = df.groupby(nc).apply(lambda r: r.to_dict('records')).to_dict()
-        node_series = {node: [list(d.values())[0] for d in rw] for node, rw in node_series.items()}
+        # Sort rows by node and step, so each node weather time series is a contiguous block of values.
+        node_values = df[nc].to_numpy()
+        step_values = df[sc].to_numpy()
+        order = np.lexsort((step_values, node_values))
+        nodes, counts = np.unique(node_values[order], return_counts=True)
+        if np.any(counts != counts[0]):
+            raise ValueError("All time series must be of the same length.")
+
+        order = order.reshape(len(nodes), counts[0])
+        steps = step_values[order]
+        if np.any(steps[:, 1:] == steps[:, :-1]):
+            raise ValueError(f"Column {sc} contains repeated steps for the same node.")
+
+        return nodes.astype(np.int64), order
+
+    @classmethod
+    def _from_series_column(cls,
+                            df: pd.DataFrame,
+                            info: DataFrameInfo,
+                            nodes: np.ndarray,
+                            order: np.ndarray,
+                            attributes: WeatherAttributes = None,
+                            tolerance: float = None) -> WeatherData:
+        """
+        Creates WeatherData object from the dataframe value column, using the row index from _index_series_rows.
+
+        Args:
+            df: Dataframe containing nodes and weather time series (expected columns: node, step, value).
+            info: Dataframe info object describing dataframe columns and content.
+            nodes: Sorted distinct node ids.
+            order: 2d array of dataframe row positions, one row per node and one column per step.
+            attributes: (Optional) Attributes used to initiate weather metadata. If not provided, defaults are used.
+            tolerance: (Optional) Rounding step used to merge near-duplicate series. By default, only exact duplicates.
+
+        Returns:
+            WeatherData object.
+        """
+        vc = info.value_column
+        if df[vc].hasnans:
+            raise ValueError(f"Column {vc} contains 'NaN' values.")
 
-        wd = cls.from_dict(node_series=node_series, attributes=attributes)
+        try:
+            series_values = df[vc].to_numpy(dtype=np.float32)[order]
+        except ValueError:
+            raise ValueError("Time series contains values which are not numbers.")
+
+        if np.any(np.isinf(series_values)):
+            raise ValueError("Time series contains 'inf' values which indicates failed conversion into np.float32.")
+
+        wd = cls._from_series_array(nodes=nodes, series_values=series_values, attributes=attributes,
+                                    tolerance=tolerance)
         return wd
 
-    def to_dataframe(self, info: DataFrameInfo = None) -> pd.DataFrame:
+    def to_dataframe(self, info: DataFrameInfo = None, nodes: Iterable[int] = None) -> pd.DataFrame:
         """
         Creates a dataframe containing node ids, time steps and weather time series as separate columns.
 
         Args:
             info: (Optional) Dataframe info object describing dataframe columns and content.
+            nodes: (Optional) Node ids to include, used to export weather data in blocks of nodes. The default is
+                   all nodes (or one node per unique series, if info.only_unique_series is set).
 
         Returns:
-            Dataframe containing node ids and weather time series.
+            Dataframe containing node ids and weather time series, sorted by node and step.
         """
         info = info or DataFrameInfo()
-        data_dict = self.to_dict(only_unique_series=info.only_unique_series)
+        if nodes is None and info.only_unique_series:
+            nodes = [nn[0] for nn in self.metadata.offset_nodes.values()]
 
-        actual_nodes = list(data_dict.keys())
-        series_len = self.metadata.series_len
-        nodes = np.repeat(actual_nodes, series_len)
-        steps = list(range(1, series_len + 1)) * len(actual_nodes)
-        values = np.array(list(data_dict.values())).reshape(len(data_dict) * self.metadata.series_len)
+        nodes = sorted(self.metadata.nodes if nodes is None else nodes)
 
-        assert len(nodes) == len(steps) == len(values), "Dataframe series lengths don't match"
-        # assert all([n == nodes[0] for n in nodes[:series_len] and  == steps[series_len:series_len + 1],
-        if len(data_dict) > 1:  # Skip validation in case of a single node.
-            assert steps[:series_len] == steps[series_len:series_len * 2], "Steps series is not valid."
-
-        column_series_dict = {info.node_column: nodes, info.step_column: steps, info.value_column: values}
+        series_len = self.metadata.series_len
+        values = self.slice(nodes=nodes).reshape(-1)
+        column_series_dict = {
+            info.node_column: np.repeat(np.array(nodes, dtype=int), series_len),
+            info.step_column: np.tile(np.arange(1, series_len + 1, dtype=int), len(nodes)),
+            info.value_column: values}
         df = pd.DataFrame(column_series_dict)
-        # Set data types
-        df[info.node_column] = df[info.node_column].astype(int)
-        df[info.step_column] = df[info.step_column].astype(int)
-        df[info.value_column] = df[info.value_column].astype(np.float32)
-        df.sort_values(by=[info.node_column, info.step_column])
         return df
 
     @classmethod
@@ -294,6 +624,36 @@ class WeatherData:
         msg += f" ({wm.series_count} * {wm.series_len} = {wm.total_value_count})"
         assert wm.total_value_count == data_len, msg
         wd = WeatherData(data=data, metadata=wm)
+        wd._file_path = file_path
+        return wd
+
+    @classmethod
+    def open(cls, file_path: Union[str, Path], mmap: bool = True) -> WeatherData:
+        """
+        Open weather binary (.bin) and metadata (.bin.json) files. In the memory-mapped mode (default) weather data
+        is not loaded into memory, values are read from the file when accessed (e.g., using series, slice or
+        node_groups), which allows inspecting or cutting weather files larger than available memory.
+
+        Args:
+            file_path: The weather binary (.bin) file path. The metadata file path is constructed by appending ".json".
+            mmap: (Optional) Flag indicating whether to memory-map the binary file (read-only) instead of loading it.
+
+        Returns:
+            WeatherData object.
+        """
+        if not mmap:
+            return cls.from_file(file_path)
+
+        file_path = str(file_path)
+        wm: WeatherMetadata = WeatherMetadata.from_file(f"{file_path}.json")
+        assert Path(file_path).is_file(), f"Data file not found: {file_path}."
+        data_len = Path(file_path).stat().st_size // SERIES_BYTE_VALUE_SIZE
+        msg = f"Data length {data_len} doesn't match metadata"
+        msg += f" ({wm.series_count} * {wm.series_len} = {wm.total_value_count})"
+        assert wm.total_value_count == data_len, msg
+        data = np.memmap(file_path, dtype=np.float32, mode="r", shape=(wm.series_count, wm.series_len))
+        wd = WeatherData(data=data, metadata=wm)
+        wd._file_path = file_path
         return wd
 
     def to_file(self, file_path: Union[str, Path]) -> NoReturn:
@@ -310,10 +670,11 @@ class WeatherData:
         self.validate()
         make_path(Path(file_path).parent)
         self._ensure_data_type(self._data)
-        with open(file_path, "wb") as bf:
+        with replace_file(file_path) as bf:
             self._data.reshape(self.metadata.total_value_count).tofile(bf)
 
         self._metadata.to_file(f"{file_path}.json")
+        self._file_path = file_path
 
     @classmethod
     def _ensure_data_type(cls, data: Iterable) -> np.ndarray[np.float32]:
@@ -327,6 +688,11 @@ class WeatherData:
         Returns:
             Node weather time series as a NumPy float32 array.
         """
+        if isinstance(data, np.memmap) and data.dtype == np.float32:
+            # Memory-mapped data is used as is, to avoid reading the whole file.
+            assert data.size > 0, "Data must have at least one item"
+            return data
+
         is_iter_ok = isinstance(data, Iterable) and len(list(data)) > 0
         assert data is not None and is_iter_ok, "Data must have at least one item"
         data = np.array(data, dtype=np.float32)
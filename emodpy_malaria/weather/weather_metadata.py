@@ -11,9 +11,10 @@ import json
 
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Iterable, List, NoReturn, Union
+from typing import Dict, Iterable, List, NoReturn, Tuple, Union
 
-from emodpy_malaria.weather.weather_utils import invert_dict, make_path, save_json,  validate_str_value
+from emodpy_malaria.node_offsets import decode_node_offsets, encode_node_offsets
+from emodpy_malaria.weather.weather_utils import make_path, save_json, validate_str_value
 
 SERIES_BYTE_VALUE_SIZE = 4  # Single series value is stored as 4 bytes = 32b
 assert SERIES_BYTE_VALUE_SIZE == np.dtype(np.float32).itemsize, "Unexpected weather time series value size."
@@ -282,6 +283,46 @@ class WeatherAttributes:
             assert self._attributes_dict[a] is not None and len(str(a).strip()) > 0, f"{a} metadata attribute is not set."
 
 
+class _NodeOffsetDict(dict):
+    """Node-offset dictionary returned by WeatherMetadata.node_offsets, flags edits so they can be written back."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.modified = False
+
+    def __setitem__(self, key, value):
+        self.modified = True
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self.modified = True
+        super().__delitem__(key)
+
+    def __ior__(self, other):
+        self.modified = True
+        return super().__ior__(other)
+
+    def clear(self):
+        self.modified = True
+        super().clear()
+
+    def pop(self, *args):
+        self.modified = True
+        return super().pop(*args)
+
+    def popitem(self):
+        self.modified = True
+        return super().popitem()
+
+    def setdefault(self, key, default=None):
+        self.modified = True
+        return super().setdefault(key, default)
+
+    def update(self, *args, **kwargs):
+        self.modified = True
+        super().update(*args, **kwargs)
+
+
 class WeatherMetadata(WeatherAttributes):
     """
     Weather metadata containing weather data attributes, counts and node offsets.
@@ -290,7 +331,7 @@ class WeatherMetadata(WeatherAttributes):
 
     # REQUIRED_ATTRIBUTES = ["Tool", ]
     def __init__(self,
-                 node_ids: Union[List[int], Dict[int, int]],
+                 node_ids: Union[List[int], Dict[int, int], Tuple[np.ndarray, np.ndarray]],
                  series_len: int = None,
                  attributes: Union[WeatherMetadata, WeatherAttributes, Dict[str, Union[str, int, float]]] = None):
         """
@@ -300,6 +341,7 @@ class WeatherMetadata(WeatherAttributes):
             node_ids: A dictionary with node ids as keys and offsets as values, or just a list of node ids.
                       If node-offset dictionary is provided, node offsets are set per that dictionary.
                       If a list of nodes ids is provided, offsets are calculated based on weather time series length.
+                      A tuple of node id and offset arrays can be used instead of a node-offset dictionary.
             series_len: The length of a weather time series (aka "data value count").
             attributes: Weather attributes, either as an objects or a dictionary.
 
@@ -311,18 +353,25 @@ class WeatherMetadata(WeatherAttributes):
 
         super().__init__(attributes_dict=attributes_dict)
 
-        # Set node offsets dictionary based on node_ids argument.
+        # Set node id and offset arrays based on node_ids argument.
+        self._node_offsets: Union[Dict[int, int], None] = None      # node-offset dictionary, created when needed
         if isinstance(node_ids, Dict):
-            self._node_offsets = node_ids
+            self._node_ids = self._to_int_array(list(node_ids.keys()))
+            self._offsets = self._to_int_array(list(node_ids.values()))
+            series_len = int(series_len or self._expected_series_len())
+            self._validate_series_len(series_len)
+        elif isinstance(node_ids, Tuple):
+            self._node_ids, self._offsets = [self._to_int_array(a) for a in node_ids]
+            assert len(self._node_ids) == len(self._offsets), "Node id and offset arrays must have the same length."
             series_len = int(series_len or self._expected_series_len())
             self._validate_series_len(series_len)
         else:
             # If node id list is provided, offsets are calculated based on weather time series length.
             self._validate_series_len(series_len)   # if node_ids is a list a valid series_len must be provided.
-            self._node_offsets = {
-                node_id: series_len * node_ids.index(node_id) * SERIES_BYTE_VALUE_SIZE
-                for node_id in sorted(node_ids)
-            }
+            node_ids = self._to_int_array(list(node_ids))
+            # Offsets follow the order of the list, nodes are sorted (the first occurrence is used for repeated nodes).
+            self._node_ids, index = np.unique(node_ids, return_index=True)
+            self._offsets = index * series_len * SERIES_BYTE_VALUE_SIZE
 
         self._series_len = series_len
 
@@ -335,15 +384,45 @@ class WeatherMetadata(WeatherAttributes):
     def __eq__(self, other: WeatherMetadata):
         """Equality operator for WeatherMetadata objects"""
         attributes_eq = super().__eq__(other)
-        nodes_eq = sorted(self.node_offsets) == sorted(other.node_offsets)
-        offsets_eq = [self.node_offsets[k] == other.node_offsets[k] for k in self.node_offsets] if nodes_eq else [False]
+        order, other_order = np.argsort(self._node_ids), np.argsort(other._node_ids)
+        nodes_eq = np.array_equal(self._node_ids[order], other._node_ids[other_order])
+        offsets_eq = nodes_eq and np.array_equal(self._offsets[order], other._offsets[other_order])
         return attributes_eq and nodes_eq and offsets_eq
 
+    @property
+    def _node_ids(self) -> np.ndarray:
+        self._sync_node_offsets()
+        return self._node_id_array
+
+    @_node_ids.setter
+    def _node_ids(self, value: np.ndarray):
+        self._node_id_array = value
+        self._node_offsets = None
+
+    @property
+    def _offsets(self) -> np.ndarray:
+        self._sync_node_offsets()
+        return self._offset_array
+
+    @_offsets.setter
+    def _offsets(self, value: np.ndarray):
+        self._offset_array = value
+        self._node_offsets = None
+
+    def _sync_node_offsets(self):
+        """Rebuild node id and offset arrays after the node_offsets dictionary was edited."""
+        if self._node_offsets is None or not self._node_offsets.modified:
+            return
+        self._node_offsets.modified = False
+        self._node_id_array = self._to_int_array(list(self._node_offsets.keys()))
+        self._offset_array = self._to_int_array(list(self._node_offsets.values()))
+        self.update(self._metadata_count_dict)
+
     @property
     def _metadata_count_dict(self):
-        node_count = len(self.nodes)
+        node_count = len(self._node_ids)
         return {
-            _META_OFFSET_COUNT: len(self._node_offsets),
+            _META_OFFSET_COUNT: len(self._offsets),
             _META_DTK_NODES_COUNT: node_count,
             _META_NODE_COUNT: node_count,
             _META_DATA_VALUE_COUNT: self._series_len,
@@ -357,8 +436,8 @@ class WeatherMetadata(WeatherAttributes):
 
     def _expected_series_len(self) -> int:
         """Returns expected node weather time series length."""
-        if self._node_offsets and len(self._node_offsets) > 0:
-            offsets2 = sorted(set(self._node_offsets.values()))[:2]
+        if len(self._offsets) > 0:
+            offsets2 = np.unique(self._offsets)[:2].tolist()
             expected = int(float(offsets2[1] - offsets2[0]) / 4) if len(offsets2) > 1 else -1
         else:
             expected = -1
@@ -369,20 +448,15 @@ class WeatherMetadata(WeatherAttributes):
         super().validate()
 
         # Validate nodes and offsets
-        assert isinstance(self.nodes, Iterable), "node_ids must be iterable"
-        assert len(self.nodes) > 0, "node_ids must not be empty"
-        assert all(map(lambda i: isinstance(i, int), self.nodes)), "node_ids must be integers"
+        assert len(self._node_ids) > 0, "node_ids must not be empty"
+        assert self._node_ids.dtype.kind in "iu", "node_ids must be integers"
+        assert self._offsets.dtype.kind in "iu", "offsets must be integers"
 
         # Validate node id and offset range
         # https://github.com/InstituteforDiseaseModeling/DtkTrunk/blob/master/Eradication/Climate.h#L151-L154
         max_uint32 = int("FFFFFFFF", 16)   # max unsigned 32 bit value
-        invalid_nodes, invalid_offsets = [], []
-        for node_id, offset in self.node_offsets.items():
-            if not 0 < node_id <= max_uint32:
-                invalid_nodes.append(node_id)
-
-            if not 0 <= offset <= max_uint32:
-                invalid_offsets.append(offset)
+        invalid_nodes = self._node_ids[(self._node_ids <= 0) | (self._node_ids > max_uint32)].tolist()
+        invalid_offsets = self._offsets[(self._offsets < 0) | (self._offsets > max_uint32)].tolist()
 
         if len(invalid_nodes) > 0:
             print(f"Found {len(invalid_nodes)} invalid node ids: {invalid_nodes[:5]}")
@@ -392,9 +466,7 @@ class WeatherMetadata(WeatherAttributes):
             print(f"Found {len(invalid_offsets)} invalid offsets: {invalid_offsets[:5]}")
             raise ValueError(f"Node offset values must be integers in [0, {str(max_uint32)}] interval.")
 
-        assert len(set(self.nodes)) == len(self.nodes), "node_ids must be unique"
-
-        assert len(self.node_offset_str) == self.node_count * 16, "node_offset_str length doesn't match node count. "
+        assert len(np.unique(self._node_ids)) == len(self._node_ids), "node_ids must be unique"
 
         # Validate series_len
         self._validate_series_len(self._series_len)
@@ -423,7 +495,7 @@ class WeatherMetadata(WeatherAttributes):
     @property
     def series_count(self) -> int:
         """The number of weather time series (expected based on metadata), corresponding to the number of offsets."""
-        return len(set(list(self._node_offsets.values())))
+        return len(np.unique(self._offsets))
 
     @property
     def series_unique_count(self):
@@ -438,27 +510,42 @@ class WeatherMetadata(WeatherAttributes):
     @property
     def nodes(self) -> List[int]:
         """The list of nodes (node ids) in the node-offset dictionary."""
-        return list(self._node_offsets)
+        return self._node_ids.tolist()
 
     @property
     def node_count(self) -> int:
         """The number of node in the node-offset dictionary."""
-        return len(self.nodes)
+        return len(self._node_ids)
 
     @property
     def node_offset_str(self) -> str:
         """The node offset string, as it will appear in the weather metadata file (.bin.json)."""
-        return self._convert_offset_dict_to_str(self._node_offsets)
+        return encode_node_offsets(self._node_ids, self._offsets)
 
     @property
     def node_offsets(self) -> Dict[int, int]:
-        """Node-offset dictionary, mapping node ids (keys) to node offsets (values)."""
+        """
+        Node-offset dictionary, mapping node ids (keys) to node offsets (values). Edits to the dictionary are applied
+        to the node id and offset arrays the next time they are used (e.g. when the metadata is written).
+        """
+        if self._node_offsets is None:
+            node_offsets = _NodeOffsetDict(zip(self._node_ids.tolist(), self._offsets.tolist()))
+            self._node_offsets = node_offsets
         return self._node_offsets
 
+    @property
+    def node_offset_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Node id and offset arrays, in the node-offset dictionary order."""
+        return self._node_ids, self._offsets
+
     @property
     def offset_nodes(self) -> Dict[int, List[int]]:
         """The offset-nodes dictionary, grouping nodes (values) by offset (key). Used to find unique series."""
-        offset_nodes = invert_dict(self._node_offsets, sort=True)
+        # Sort by offset, then node, and split node ids into groups of the same offset.
+        order = np.lexsort((self._node_ids, self._offsets))
+        offsets, starts = np.unique(self._offsets[order], return_index=True)
+        node_groups = np.split(self._node_ids[order], starts[1:])
+        offset_nodes = {offset: nodes.tolist() for offset, nodes in zip(offsets.tolist(), node_groups)}
         return offset_nodes
 
     # Import/Export members
@@ -477,7 +564,7 @@ class WeatherMetadata(WeatherAttributes):
         # Ensure parent dir exists.
         make_path(Path(file_path).parent)
         # Construct the node offset string.
-        offset_str = self._convert_offset_dict_to_str(self._node_offsets)
+        offset_str = self.node_offset_str
         # Prepare json object based on metadata and node offset string.
         content = dict(Metadata=self.attributes_dict, NodeOffsets=offset_str)
         # Save json object to a file.
@@ -494,8 +581,8 @@ class WeatherMetadata(WeatherAttributes):
         with open(str(file_path), "rb") as file:
             content = json.load(file)
 
-        # Convert node offset string into a node-offset dictionary
-        node_offsets = cls._convert_offset_str_to_dict(content["NodeOffsets"])
+        # Convert node offset string into node id and offset arrays
+        node_offsets = decode_node_offsets(content["NodeOffsets"])
         if "Metadata" in content and _META_DATA_VALUE_COUNT in content["Metadata"]:
             series_len = content["Metadata"][_META_DATA_VALUE_COUNT]
         else:
@@ -508,40 +595,9 @@ class WeatherMetadata(WeatherAttributes):
     # Helpers
 
     @staticmethod
-    def _convert_offset_str_to_dict(offset_str: str) -> Dict[int, int]:
-        """
-        Convert node offset string into a node-offset dictionary.
-
-        Args:
-            offset_str: The node offset string.
-
-        Returns:
-            The node-offset dictionary, having node ids as keys and offsets as values.
-        """
-        entry_count = len(offset_str) // 16
-        node_offsets = {}
-        for i in range(entry_count):
-            idx = i * 16
-            entry_str = offset_str[idx: idx + 16]
-            node_id = int(entry_str[:8], 16)
-            offset = int(entry_str[8:16], 16)
-            node_offsets[node_id] = offset
-
-        return node_offsets
-
-    @staticmethod
-    def _convert_offset_dict_to_str(node_offsets: Dict[int, int]) -> str:
-        """
-        Convert node-offset dictionary into a string.
-
-        Args:
-            node_offsets: The node offset string.
-
-        Returns:
-            The node offset string, as it appears in the weather metadata file.
-        """
-        offset_str = ""
-        for node_id, offset in node_offsets.items():
-            offset_str += f"{node_id:08x}{offset:08x}"
-
-        return offset_str
+    def _to_int_array(values: Union[List[int], np.ndarray]) -> np.ndarray:
+        """Convert node ids or offsets into an array, integers are kept as int64 (or uint64 if larger)."""
+        values = np.asarray(values)
+        if values.dtype.kind in "iu" and values.dtype != np.uint64:
+            values = values.astype(np.int64)
+        return values
@@ -6,10 +6,15 @@ Weather service methods for submitting and working with weather data requests.
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
+import os
 import pandas as pd
 import tempfile
+import time
 
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List, NoReturn, Tuple, Union
@@ -22,6 +27,7 @@ from idmtools_platform_comps.comps_platform import AssetCollection
 from idmtools_platform_comps.ssmt_work_items.comps_workitems import SSMTWorkItem
 
 from emodpy_malaria.weather.data_sources import _get_data_source_metadata
+from emodpy_malaria.weather.weather_cache import WeatherCache
 from emodpy_malaria.weather.weather_utils import make_path, parse_date, ymd
 from emodpy_malaria.weather.weather_variable import WeatherVariable
 from emodpy_malaria.weather.weather_metadata import _META_DEFAULT_ID_REFERENCE
@@ -29,6 +35,7 @@ from emodpy_malaria.weather.weather_set import WeatherSet
 
 _DATE_MIN = datetime(year=2000, month=1, day=1)
 _DATE_MAX = datetime(year=2030, month=12, day=31)
+_DOWNLOAD_CHUNK_SIZE = 1 << 20     # Bytes per downloaded chunk.
 
 
 class WeatherArgs:
@@ -101,7 +108,14 @@ class WeatherArgs:
 
 class RequestReport:
     """Specifies an object containing weather request operational reports."""
-    download: Dict[str, List[str]] = None   # Status of downloaded files: ok, fail, skip.
+    download: Dict[str, List[str]] = None   # Status of downloaded files: ok, fail, skip, cache.
+    download_bytes: int = 0                 # Total size of downloaded files, in bytes.
+    download_seconds: float = 0.0           # Download (wall clock) time, in seconds.
+
+    @property
+    def download_throughput(self) -> float:
+        """Download throughput, in bytes per second."""
+        return self.download_bytes / self.download_seconds if self.download_seconds > 0 else 0.0
 
 
 class DataSource:
@@ -144,21 +158,31 @@ class WeatherRequest:
     _image: str = "idm-docker-{}.packages.idmod.org/dse/weather-files"  # weather tool image name.
     _create_asset: bool = True         # flag to indicate creation of a weather asset.
     _platform: COMPSPlatform = None    # The name of COMPS platfrom on which to run the SSMT work item.
+    _download_backoff: float = 1.0     # Wait before the first download retry, in seconds, doubled for each next retry.
 
-    def __init__(self, platform: Union[str, COMPSPlatform], local_dir: str = None, data_source: str = None, is_staging: bool = None):
+    def __init__(self,
+                 platform: Union[str, COMPSPlatform],
+                 local_dir: str = None,
+                 data_source: str = None,
+                 is_staging: bool = None,
+                 cache: WeatherCache = None):
         """
         Initializes a weather request per specified time-space, weather files and SSMT arguments.
 
         Args:
             platform: SSMT platform name or COMPSPlatform object. Determined where the work item will run.
+                      Any other platform object providing 'endpoint' and 'get_item' (e.g. a local stand-in) is used
+                      as is.
             local_dir: (Optional) Local dir where files will be downloaded. If not specified a temp dir is created.
             data_source: (Optional) Data source name to be used by SSMT platform.
             is_staging: (Optional) Flag determining weather image. By default, set based on the platform endpoint.
+            cache: (Optional) Local weather cache. If specified, weather files generated or downloaded before, for the
+                   same weather arguments and data source (or data id), are placed into the local dir from the cache.
         """
 
         # Initialize the platform object
         platform = platform or Platform("SLURMStage")
-        self._platform = platform if isinstance(platform, COMPSPlatform) else Platform(platform)
+        self._platform = Platform(platform) if isinstance(platform, str) else platform
         is_staging = is_staging or self._platform.endpoint == "https://comps2.idmod.org"
         self._image = self._image.format("staging" if is_staging else "production")
         # Exposed as properties
@@ -166,6 +190,8 @@ class WeatherRequest:
         self._data_source: DataSource = DataSource(data_source)  # The data source name, as used by weather SSMT.
         self._asset_collection_id: Union[str, None] = None
         self._report: RequestReport = RequestReport()
+        self._cache: Union[WeatherCache, None] = cache
+        self._cache_key: Union[str, None] = None    # The cache key of weather arguments used to generate data.
 
         # Operational
         self._asset_file_tuples: Union[List[Tuple[str, Path]], None] = None
@@ -302,77 +328,327 @@ class WeatherRequest:
 
         self._asset_collection_id: Union[str, None] = None
 
+        # Reuse weather files from the cache, if generated before for the same weather arguments and data source.
+        if self._cache:
+            self._cache_key = self._cache.make_key(weather_args=weather_args, data_source=self._data_source.name)
+            if not force and self._cache.get(key=self._cache_key, target_dir=self.local_dir):
+                self._asset_collection_id = self._cache.data_id(self._cache_key)
+                print("Skipping weather request, files restored from the cache.")
+                return self
+
         # TODO: add date range validation (when supported by the service)
 
-        command = self._construct_command(weather_args=weather_args)
-        work_item: SSMTWorkItem = self._init_work_item(weather_args=weather_args,
-                                                       command=command,
-                                                       name=request_name)
         try:
-            # Run work item
-            # Note: For simplicity reasons only synchronous scenario is supported (covers the majority of use cases).
-            work_item.run(wait_until_done=True)
-            comps_wi = work_item.get_platform_object(force=True)
-
-            # Get asset collection and set data id
-            acs = comps_wi.get_related_asset_collections(RelationType.Created)
-            assert acs and len(acs) > 0, f"Failed to get asset collection for work item {work_item.id}"
-            self._asset_collection_id = str(acs[0].id)
+            self._asset_collection_id = self._run_work_item(weather_args=weather_args, request_name=request_name)
             print(f"Generated asset collection ID: {self._asset_collection_id}")
         except ValueError:
             return None
 
         return self
 
-    def download(self, data_id: str = None, local_dir: Union[str, Path] = None, force: bool = False) -> WeatherRequest:
+    def generate_async(self,
+                       weather_args: WeatherArgs,
+                       request_name: str = None,
+                       force: bool = False,
+                       download: bool = False,
+                       executor: Executor = None) -> WeatherRequestJob:
+        """
+        Submits the weather request in the background and returns immediately. Many requests can be submitted
+        this way and collected as they finish, using the returned job handle (status, wait or await).
+
+            **Example**::
+
+                jobs = [WeatherRequest(platform="Calculon").generate_async(wa, download=True) for wa in weather_args]
+                requests = [job.wait() for job in jobs]
+
+        Args:
+            weather_args: Arguments defining space and time scope and weather files' id reference.
+            request_name: (Optional) Name to be used for the weather SSMT work item.
+            force: (Optional) Force the request and download, even if target weather files already exist.
+            download: (Optional) Flag indicating whether to also download weather files, once generated.
+            executor: (Optional) Executor running requests, can be used to limit the number of concurrent requests.
+                      If not specified the request is run in its own thread.
+
+        Returns:
+            WeatherRequestJob handle.
+        """
+        def run() -> Union[WeatherRequest, None]:
+            wr = self.generate(weather_args=weather_args, request_name=request_name, force=force)
+            if wr is not None and download:
+                wr.download(force=force)
+            return wr
+
+        # The work item run is synchronous, so each request waits for its own work item in a separate thread.
+        own_executor = executor is None
+        executor = executor or ThreadPoolExecutor(max_workers=1)
+        job = WeatherRequestJob(request=self, future=executor.submit(run))
+        if own_executor:
+            executor.shutdown(wait=False)   # The thread exits when the request is finished.
+
+        return job
+
+    def _run_work_item(self, weather_args: WeatherArgs, request_name: str = None) -> str:
+        """
+        Runs SSMT work item generating weather files and returns the id of the created asset collection.
+
+        Args:
+            weather_args: Arguments defining space and time scope and weather files' id reference.
+            request_name: (Optional) Name to be used for the weather SSMT work item.
+
+        Returns:
+            Asset collection id.
+        """
+        command = self._construct_command(weather_args=weather_args)
+        work_item: SSMTWorkItem = self._init_work_item(weather_args=weather_args,
+                                                       command=command,
+                                                       name=request_name)
+        # Run work item and wait for it, in the calling thread (generate_async runs this in a background thread).
+        work_item.run(wait_until_done=True)
+        comps_wi = work_item.get_platform_object(force=True)
+
+        # Get asset collection
+        acs = comps_wi.get_related_asset_collections(RelationType.Created)
+        assert acs and len(acs) > 0, f"Failed to get asset collection for work item {work_item.id}"
+        return str(acs[0].id)
+
+    def download(self,
+                 data_id: str = None,
+                 local_dir: Union[str, Path] = None,
+                 force: bool = False,
+                 max_workers: int = 4,
+                 retries: int = 3) -> WeatherRequest:
         """
-        Downloads weather files.
+        Downloads weather files. Files are downloaded concurrently, each into a temp (.part) file, which is verified
+        against asset size and checksum and then renamed. Failed downloads are retried and resumed from the end of
+        the temp file. Download status of each file and download throughput are stored in the report.
 
         Args:
             data_id: (Optional) Asset collection ID to be downloaded, even if not generated by this request.
             local_dir: (Optional) Local dir where files will be downloaded. If not specified a temp dir is created.
             force: (Optional) Force the download, even if target weather files already exist in the local dir.
+            max_workers: (Optional) Max number of files downloaded at the same time. The default is 4.
+            retries: (Optional) Number of retries of a failed file download. The default is 3.
 
         Returns:
             Returns this WeatherRequest object (to support method chaining).
         """
         # Override asset collection id and local dir is specified.
         if data_id:
+            if data_id != self._asset_collection_id:
+                self._cache_key = None
             self._asset_collection_id = data_id
 
         if local_dir:
             self._local_dir = local_dir
 
+        self.report.download_bytes, self.report.download_seconds = 0, 0.0
+
         # Skip if files already exist, unless the 'force' flag is set.
         if self.files_exist and not force:
-            self.report.download = {"ok": [], "fail": [], "skip": self.files}
+            self.report.download = {"ok": [], "fail": [], "skip": self.files, "cache": []}
             print("Skipping download, files already exist.")
             return self
 
+        # Place files from the cache, if available for the generated weather arguments or the data id.
+        if self._cache and not force:
+            for cache_key in [self._cache_key, self._cache.find(data_id=self._asset_collection_id)]:
+                cached_files = self._cache.get(key=cache_key, target_dir=self.local_dir) if cache_key else None
+                if cached_files:
+                    self.report.download = {"ok": [], "fail": [], "skip": [], "cache": cached_files}
+                    print("Skipping download, files restored from the cache.")
+                    return self
+
         assert len(self._asset_collection_id) == 36, "Invalid 'asset collection id' length."
         make_path(self._local_dir)
 
-        result = {"ok": [], "fail": [], "skip": []}
+        result = {"ok": [], "fail": [], "skip": [], "cache": []}
+        asset_files = []
         for asset, file_path in self._asset_files:
             assert asset.filename == file_path.name, "Asset and file name do not match."
-            try:
-                mtime_before = file_path.stat().st_mtime if file_path.is_file() else 0
-                if not file_path.is_file() or force:
-                    asset.download_to_path(str(file_path), force=force)
-
-                if not file_path.is_file():
-                    key = "fail"
-                elif file_path.stat().st_mtime > mtime_before:
+            if file_path.is_file() and not force:
+                result["skip"].append(str(file_path))
+            else:
+                asset_files.append((asset, file_path))
+
+        start_time = time.perf_counter()
+        download_bytes = 0
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(asset_files)))) as executor:
+            futures = [executor.submit(self._download_file, asset, file_path, retries, force)
+                       for asset, file_path in asset_files]
+            for future, (_, file_path) in zip(futures, asset_files):
+                try:
+                    download_bytes += future.result()
                     key = "ok"
-                else:
-                    key = "skip"
 
-            # TODO: More specific exception handling
-            except Exception as ex:
-                print(str(ex))
-                key = "fail"
+                # TODO: More specific exception handling
+                except Exception as ex:
+                    print(f"Failed to download {file_path.name}: {str(ex)}")
+                    key = "fail"
 
-            result[key].append(str(file_path))
+                result[key].append(str(file_path))
 
         self.report.download = result
+        self.report.download_bytes = download_bytes
+        self.report.download_seconds = time.perf_counter() - start_time
+
+        # Add downloaded files to the cache, keyed by weather arguments if generated by this request, or by data id.
+        if self._cache and len(result["fail"]) == 0:
+            cache_key = self._cache_key or self._cache.make_data_key(self._asset_collection_id)
+            self._cache.put(key=cache_key,
+                            files=[f for _, f in self._asset_files],
+                            data_id=self._asset_collection_id)
+
         return self
+
+    def _download_file(self, asset: Any, file_path: Path, retries: int = 3, force: bool = False) -> int:
+        """
+        Downloads an asset into a temp file, verifies it and renames it to the target file name.
+        Failed downloads are retried, with exponential backoff, and resumed from the end of the temp file.
+
+        Args:
+            asset: Asset object.
+            file_path: Target file path.
+            retries: (Optional) Number of retries if the download fails.
+            force: (Optional) Flag indicating whether to discard the existing temp file, instead of resuming it.
+
+        Returns:
+            Size of the downloaded file, in bytes.
+        """
+        part_path = file_path.with_name(f"{file_path.name}.part")
+        if force:
+            part_path.unlink(missing_ok=True)
+
+        for attempt in range(retries + 1):
+            try:
+                self._download_part(asset, part_path)
+                self._verify_file(asset, part_path)
+                os.replace(part_path, file_path)
+                return file_path.stat().st_size
+            except Exception as ex:
+                if attempt == retries:
+                    raise
+
+                print(f"Retrying download of {file_path.name}: {str(ex)}")
+                time.sleep(self._download_backoff * 2 ** attempt)
+
+    @classmethod
+    def _download_part(cls, asset: Any, part_path: Path) -> NoReturn:
+        """
+        Downloads the missing part of an asset, appending it to the temp file.
+
+        Args:
+            asset: Asset object.
+            part_path: Temp file path.
+
+        Returns:
+            None
+        """
+        hook = getattr(asset, "download_generator_hook", None)
+        if not hook:
+            # Assets without a download generator can only be downloaded as a whole.
+            asset.download_to_path(str(part_path), force=True)
+            return
+
+        start = part_path.stat().st_size if part_path.is_file() else 0
+        length = getattr(asset, "length", None)
+        if length is not None and start >= length:
+            # The temp file is complete (or invalid, which is caught by verification).
+            return
+
+        try:
+            chunks = hook(chunk_size=_DOWNLOAD_CHUNK_SIZE, resume_byte_pos=start)
+        except TypeError:
+            # The generator doesn't support resuming, download the whole asset.
+            start, chunks = 0, hook()
+
+        with open(part_path, "ab" if start > 0 else "wb") as file:
+            for chunk in chunks:
+                file.write(chunk)
+
+    @classmethod
+    def _verify_file(cls, asset: Any, file_path: Path) -> NoReturn:
+        """
+        Verifies the downloaded file size and md5 checksum against asset metadata, when available.
+        Invalid files are removed, incomplete files are kept, so the download can be resumed.
+
+        Args:
+            asset: Asset object.
+            file_path: Downloaded file path.
+
+        Returns:
+            None
+        """
+        length = getattr(asset, "length", None)
+        size = file_path.stat().st_size
+        if length is not None and size < length:
+            raise IOError(f"Incomplete download, {size} of {length} bytes.")
+
+        checksum = getattr(asset, "checksum", None)
+        if length is not None and size > length:
+            message = f"Invalid download size, {size} instead of {length} bytes."
+        elif checksum and _md5(file_path) != str(checksum).replace("-", "").lower():
+            message = "Invalid download checksum."
+        else:
+            return
+
+        file_path.unlink()
+        raise ValueError(message)
+
+
+class WeatherRequestJob:
+    """Handle of a weather request running in the background, returned by WeatherRequest.generate_async."""
+
+    def __init__(self, request: WeatherRequest, future: Future):
+        """
+        Initializes job handle.
+
+        Args:
+            request: Weather request object.
+            future: Future of the running request.
+        """
+        self._request: WeatherRequest = request
+        self._future: Future = future
+
+    @property
+    def request(self) -> WeatherRequest:
+        """Weather request object."""
+        return self._request
+
+    def status(self) -> str:
+        """Returns job status: "pending", "running", "succeeded" or "failed"."""
+        if not self._future.done():
+            return "running" if self._future.running() else "pending"
+
+        failed = self._future.cancelled() or self._future.exception() is not None or self._future.result() is None
+        return "failed" if failed else "succeeded"
+
+    def done(self) -> bool:
+        """Returns True if the job is finished, successfully or not."""
+        return self._future.done()
+
+    def wait(self, timeout: float = None) -> Union[WeatherRequest, None]:
+        """
+        Waits for the job to finish.
+
+        Args:
+            timeout: (Optional) Max wait time, in seconds. The default is to wait until the job is finished.
+
+        Returns:
+            Weather request object, or None if the request failed. Errors raised by the request are re-raised.
+            concurrent.futures.TimeoutError is raised if the job is not finished within the timeout.
+        """
+        return self._future.result(timeout=timeout)
+
+    def __await__(self):
+        """Supports awaiting the job in asyncio code, e.g. 'wr = await job'."""
+        return asyncio.wrap_future(self._future).__await__()
+
+
+def _md5(file_path: Path) -> str:
+    """Calculates md5 checksum of a file."""
+    md5 = hashlib.md5()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(_DOWNLOAD_CHUNK_SIZE), b""):
+            md5.update(block)
+
+    return md5.hexdigest()
@@ -6,15 +6,24 @@ Weather set module is implementing functionality for working with sets of weathe
 
 from __future__ import annotations
 
+import importlib
+import json
+import numpy as np
 import pandas as pd
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, NoReturn, Tuple, Union
+from typing import Callable, Dict, Iterable, List, NoReturn, Tuple, Union
 
+from emodpy_malaria.node_offsets import decode_node_offsets
 from emodpy_malaria.weather.weather_utils import make_path
 from emodpy_malaria.weather.weather_variable import WeatherVariable
-from emodpy_malaria.weather.weather_metadata import WeatherAttributes
+from emodpy_malaria.weather.weather_metadata import WeatherMetadata, WeatherAttributes
 from emodpy_malaria.weather.weather_data import WeatherData, DataFrameInfo
+from emodpy_malaria.weather.weather_summary import WeatherSummary
+
+# Arrow schema metadata key, under which weather columns, attributes and node offsets are stored.
+_ARROW_METADATA_KEY = b"emodpy_malaria.weather"
 
 
 class WeatherSet:
@@ -25,6 +34,9 @@ class WeatherSet:
     Supports:
     1. Conversion from/to csv, dataframe (from_csv, to_csv, from_dataframe, to_dataframe)
     2. Conversion from/to EMOD weather files, .bin and .bin.json (from_file, to_file)
+    3. Conversion from/to Parquet and Arrow IPC (Feather) files (from_parquet, to_parquet, from_feather, to_feather)
+    4. Transformations of weather data (apply, scale, offset, roll, clip, resample, select_years)
+    5. Weather statistics, persisted next to weather files (summary_index)
     """
 
     def __init__(self,
@@ -114,6 +126,101 @@ class WeatherSet:
         """The list of weather columns."""
         return self._weather_columns
 
+    # Transformations
+    # Each transformation is applied to the weather data of selected weather variables, see WeatherData methods.
+
+    def apply(self,
+              func: Callable[[np.ndarray], np.ndarray],
+              weather_variables: List[WeatherVariable] = None) -> WeatherSet:
+        """Applies a function to weather data, a 2d array of unique series (rows) and time steps (columns)."""
+        return self._transform("apply", weather_variables, func)
+
+    def scale(self,
+              factor: Union[float, Iterable[float]],
+              weather_variables: List[WeatherVariable] = None) -> WeatherSet:
+        """Multiplies weather values by a factor, a single one or one per time step."""
+        return self._transform("scale", weather_variables, factor)
+
+    def offset(self,
+               value: Union[float, Iterable[float]],
+               weather_variables: List[WeatherVariable] = None) -> WeatherSet:
+        """Adds a value to weather values, a single one or one per time step."""
+        return self._transform("offset", weather_variables, value)
+
+    def roll(self, steps: int, weather_variables: List[WeatherVariable] = None) -> WeatherSet:
+        """Shifts weather time series by a number of time steps (circularly)."""
+        return self._transform("roll", weather_variables, steps)
+
+    def clip(self,
+             min_value: float = None,
+             max_value: float = None,
+             weather_variables: List[WeatherVariable] = None) -> WeatherSet:
+        """Limits weather values to an interval."""
+        return self._transform("clip", weather_variables, min_value, max_value)
+
+    def resample(self, period: str = "month", how: str = "mean") -> WeatherSet:
+        """Aggregates daily weather values of all weather variables by calendar weeks, months or years."""
+        return self._transform("resample", None, period, how)
+
+    def select_years(self, start_year: int, end_year: int = None) -> WeatherSet:
+        """Selects daily weather values of all weather variables for a range of years."""
+        return self._transform("select_years", None, start_year, end_year)
+
+    def _transform(self, name: str, weather_variables: List[WeatherVariable] = None, *args) -> WeatherSet:
+        """
+        Applies WeatherData transformation to selected weather variables.
+
+        Args:
+            name: WeatherData transformation method name.
+            weather_variables: (Optional) Weather variables to be transformed. The default is all.
+            *args: Transformation arguments.
+
+        Returns:
+            This WeatherSet object (to support method chaining).
+        """
+        weather_variables = self.weather_variables if weather_variables is None else weather_variables
+        for v in weather_variables:
+            getattr(self[v], name)(*args)
+
+        self.validate()
+        return self
+
+    # Summary
+
+    def summary_index(self,
+                      percentiles: Iterable[float] = None,
+                      dry_threshold: float = 1.0,
+                      force: bool = False) -> Dict[WeatherVariable, WeatherSummary]:
+        """
+        Returns weather statistics (monthly means, percentiles and rainfall dry spells) of all weather variables.
+        Statistics are computed once per unique weather time series. For weather data read from (or written to)
+        weather files, statistics are saved in sidecar summary files (.bin.summary.npz) and reused while weather
+        files are unchanged. Combined with memory-mapped loading (from_files with mmap=True), reused statistics
+        are served without reading weather data.
+
+            **Example**::
+
+                summaries = WeatherSet.from_files(dir_path="path/to/weather_dir", mmap=True).summary_index()
+                df = summaries[WeatherVariable.RAINFALL].to_dataframe()
+
+        Args:
+            percentiles: (Optional) Percentiles to compute, between 0 and 100. The default is 5, 25, 50, 75, 95.
+            dry_threshold: (Optional) Rainfall values below the threshold are dry days. The default is 1.0.
+            force: (Optional) Flag indicating whether to recompute statistics, even if summary files are valid.
+
+        Returns:
+            Dictionary of weather variables and WeatherSummary objects.
+        """
+        summaries = {}
+        for v, wd in self.items():
+            threshold = dry_threshold if v == WeatherVariable.RAINFALL else None
+            if wd.file_path:
+                summaries[v] = WeatherSummary.from_file(wd.file_path, percentiles, threshold, wd, force=force)
+            else:
+                summaries[v] = WeatherSummary.from_weather_data(wd, percentiles, threshold)
+
+        return summaries
+
     # Export/import
 
     @classmethod
@@ -197,14 +304,29 @@ class WeatherSet:
         infos, weather_columns = cls._init_dataframe_info_dict(node_column, step_column, weather_columns)
         # Construct the final weather column dictionary (relevant if weather_columns was None or None column names)
         attributes = attributes or WeatherAttributes()
+        info0 = list(infos.values())[0]
+        if isinstance(data_csv, str):
+            # Read the csv file once, only node, step and weather columns, shared by all weather variables.
+            columns = [info0.node_column, info0.step_column] + [info.value_column for info in infos.values()]
+            dtypes = {info.value_column: np.float32 for info in infos.values()}
+            df = pd.read_csv(data_csv, usecols=list(dict.fromkeys(columns)), dtype=dtypes)
+        elif isinstance(data_csv, pd.DataFrame):
+            df = data_csv
+        else:
+            raise TypeError(f"Unsupported argument type {type(data_csv)}. Only string or dataframe are expected.")
+
+        if len(df) == 0:
+            raise ValueError("Weather data must contain at least one row.")
+
+        # Sort and index rows by node and step once, then build WeatherData objects for weather variables in parallel.
+        nodes, order = WeatherData._index_series_rows(df=df, info=info0)
         ws = WeatherSet(weather_columns=weather_columns)
-        for v, info in infos.items():
-            if isinstance(data_csv, str):
-                ws[v] = WeatherData.from_csv(file_path=data_csv, info=info, attributes=attributes)
-            elif isinstance(data_csv, pd.DataFrame):
-                ws[v] = WeatherData.from_dataframe(df=data_csv, info=info, attributes=attributes)
-            else:
-                raise TypeError(f"Unsupported argument type {type(data_csv)}. Only string or dataframe are expected.")
+        with ThreadPoolExecutor(max_workers=len(infos)) as executor:
+            futures = {v: executor.submit(WeatherData._from_series_column, df=df, info=info, nodes=nodes,
+                                          order=order, attributes=WeatherAttributes(dict(attributes.attributes_dict)))
+                       for v, info in infos.items()}
+            for v, future in futures.items():
+                ws[v] = future.result()
 
         ws.validate()
         return ws
@@ -212,7 +334,8 @@ class WeatherSet:
     def to_dataframe(self,
                      node_column: str = None,
                      step_column: str = None,
-                     weather_columns: Dict[WeatherVariable, str] = None) -> pd.DataFrame:
+                     weather_columns: Dict[WeatherVariable, str] = None,
+                     nodes: List[int] = None) -> pd.DataFrame:
         """
         Creates a dataframe containing node ids, time steps and weather columns.
 
@@ -221,6 +344,7 @@ class WeatherSet:
             step_column: (Optional) Column containing node index for weather time series values. The default is "steps".
             weather_columns: (Optional) Dictionary of weather variables (keys) and weather column names (values).
                              Defaults are WeatherVariables values are used: "airtemp", "humidity", "rainfall", "landtemp".
+            nodes: (Optional) Node ids to include, used to export weather data in blocks of nodes. The default is all.
         Returns:
             Dataframe containing node ids and weather time series.
         """
@@ -236,7 +360,7 @@ class WeatherSet:
         self._weather_columns = weather_columns
         df = None                                   # used to collect all weather columns in a single df
         for v in infos:                             # for each dataframe info (weather variable)
-            df2 = self[v].to_dataframe(infos[v])    # get dataframe for current weather variable
+            df2 = self[v].to_dataframe(infos[v], nodes=nodes)   # get dataframe for current weather variable
             if df is None:                          # if first iteration
                 df = df2                            # init outer dataframe
             else:                                   # if 2nd or higher iteration
@@ -249,7 +373,8 @@ class WeatherSet:
                file_path: Union[str, Path],
                node_column: str = None,
                step_column: str = None,
-               weather_columns: Dict[WeatherVariable, str] = None) -> pd.DataFrame:
+               weather_columns: Dict[WeatherVariable, str] = None,
+               chunk_nodes: int = None) -> Union[pd.DataFrame, None]:
         """
         Creates a csv file containing node ids, time steps and weather columns.
 
@@ -259,23 +384,163 @@ class WeatherSet:
             step_column: (Optional) Column containing node index for weather time series values. The default is "steps".
             weather_columns: (Optional) Dictionary of weather variables (keys) and weather column names (values).
                              Defaults are WeatherVariables values are used: "airtemp", "humidity", "rainfall", "landtemp".
+            chunk_nodes: (Optional) Number of nodes written at once. If specified, the csv file is written in blocks
+                         of nodes, without creating the dataframe for all nodes (memory-mapped weather data, see
+                         from_files, is then read one block at a time).
 
         Returns:
             Dataframe containing node ids and weather time series, used to create the csv file.
+            If chunk_nodes is specified, None is returned.
         """
-        df = self.to_dataframe(node_column, step_column, weather_columns)
-        df.to_csv(file_path, index=False)
-        return df
+        make_path(Path(file_path).parent)
+        if chunk_nodes is None:
+            df = self.to_dataframe(node_column, step_column, weather_columns)
+            df.to_csv(file_path, index=False)
+            return df
+
+        if not isinstance(chunk_nodes, int) or chunk_nodes <= 0:
+            raise ValueError("The number of nodes per chunk must be a positive integer.")
+
+        nodes = sorted(self.values()[0].metadata.nodes) if len(self) > 0 else []
+        for start in range(0, max(len(nodes), 1), chunk_nodes):
+            df = self.to_dataframe(node_column, step_column, weather_columns, nodes=nodes[start:start + chunk_nodes])
+            df.to_csv(file_path, index=False, mode="w" if start == 0 else "a", header=start == 0)
+
+        return None
+
+    def to_parquet(self,
+                   file_path: Union[str, Path],
+                   node_column: str = None,
+                   step_column: str = None,
+                   weather_columns: Dict[WeatherVariable, str] = None,
+                   chunk_nodes: int = None,
+                   compression: str = "snappy") -> NoReturn:
+        """
+        Creates a Parquet file containing node ids, time steps and weather columns (float32). Weather attributes and
+        node offsets are stored in the file schema metadata, so from_parquet restores the same weather set.
+        Requires pyarrow package.
+
+        Args:
+            file_path: The path of a Parquet file to be generated.
+            node_column: (Optional) Column containing node ids. The default is "nodes".
+            step_column: (Optional) Column containing node index for weather time series values. The default is "steps".
+            weather_columns: (Optional) Dictionary of weather variables (keys) and weather column names (values).
+                             Defaults are WeatherVariables values are used: "airtemp", "humidity", "rainfall", "landtemp".
+            chunk_nodes: (Optional) Number of nodes per row group. Row groups are written one at a time and allow
+                         reading only selected nodes (see from_parquet). The default is a single row group.
+            compression: (Optional) Parquet compression codec. The default is "snappy".
+
+        Returns:
+            None
+        """
+        pa, pq = _import_pyarrow("parquet")
+        make_path(Path(file_path).parent)
+        writer = None
+        try:
+            for table in self._to_arrow_tables(node_column, step_column, weather_columns, chunk_nodes):
+                writer = writer or pq.ParquetWriter(str(file_path), table.schema, compression=compression)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+
+    @classmethod
+    def from_parquet(cls, file_path: Union[str, Path], nodes: Iterable[int] = None) -> WeatherSet:
+        """
+        Initializes WeatherSet object from a Parquet file created by to_parquet. Requires pyarrow package.
+
+        Args:
+            file_path: The Parquet file path.
+            nodes: (Optional) Node ids to load. Row groups not containing these nodes are not read. The default is all.
+
+        Returns:
+            WeatherSet object.
+        """
+        pa, pq = _import_pyarrow("parquet")
+        assert Path(file_path).is_file(), f"The Parquet file not found: {str(file_path)}."
+        content = cls._arrow_metadata(pq.read_schema(str(file_path)))
+        filters = None if nodes is None else [(content["node_column"], "in", list(nodes))]
+        table = pq.read_table(str(file_path), filters=filters)
+        return cls._from_arrow_table(table, content, selected=nodes is not None)
+
+    def to_feather(self,
+                   file_path: Union[str, Path],
+                   node_column: str = None,
+                   step_column: str = None,
+                   weather_columns: Dict[WeatherVariable, str] = None,
+                   chunk_nodes: int = None,
+                   compression: str = None) -> NoReturn:
+        """
+        Creates an Arrow IPC (Feather V2) file containing node ids, time steps and weather columns (float32).
+        Weather attributes and node offsets are stored in the file schema metadata. Requires pyarrow package.
+
+        Args:
+            file_path: The path of a Feather file to be generated.
+            node_column: (Optional) Column containing node ids. The default is "nodes".
+            step_column: (Optional) Column containing node index for weather time series values. The default is "steps".
+            weather_columns: (Optional) Dictionary of weather variables (keys) and weather column names (values).
+                             Defaults are WeatherVariables values are used: "airtemp", "humidity", "rainfall", "landtemp".
+            chunk_nodes: (Optional) Number of nodes per record batch, written one at a time. The default is all nodes.
+            compression: (Optional) Compression codec, "lz4" or "zstd". The default is no compression.
+
+        Returns:
+            None
+        """
+        pa, _ = _import_pyarrow()
+        make_path(Path(file_path).parent)
+        writer = None
+        try:
+            for table in self._to_arrow_tables(node_column, step_column, weather_columns, chunk_nodes):
+                options = pa.ipc.IpcWriteOptions(compression=compression)
+                writer = writer or pa.ipc.new_file(str(file_path), table.schema, options=options)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+
+    @classmethod
+    def from_feather(cls, file_path: Union[str, Path], nodes: Iterable[int] = None) -> WeatherSet:
+        """
+        Initializes WeatherSet object from an Arrow IPC (Feather V2) file created by to_feather.
+        The file is memory-mapped. Requires pyarrow package.
+
+        Args:
+            file_path: The Feather file path.
+            nodes: (Optional) Node ids to load. Record batches not containing these nodes are skipped, and for an
+                   uncompressed file only their node column is read from the memory map. The default is all.
+
+        Returns:
+            WeatherSet object.
+        """
+        pa, _ = _import_pyarrow()
+        assert Path(file_path).is_file(), f"The Feather file not found: {str(file_path)}."
+        with pa.memory_map(str(file_path), "r") as source:
+            reader = pa.ipc.open_file(source)
+            content = cls._arrow_metadata(reader.schema)
+            if nodes is None:
+                table = reader.read_all()
+            else:
+                node_column = content["node_column"]
+                value_set = pa.array(list(nodes), type=reader.schema.field(node_column).type)
+                batches = []
+                for i in range(reader.num_record_batches):
+                    batch = reader.get_batch(i)
+                    selected = pa.compute.is_in(batch.column(node_column), value_set=value_set)
+                    if pa.compute.any(selected).as_py():
+                        batches.append(batch.filter(selected))
+                table = pa.Table.from_batches(batches, schema=reader.schema)
+
+        return cls._from_arrow_table(table, content, selected=nodes is not None)
 
     # Save/load DTK files
 
-    def _load(self) -> WeatherSet:
-        """Loads weather files based on weather set attributes."""
+    def _load(self, mmap: bool = False) -> WeatherSet:
+        """Loads weather files based on weather set attributes, memory-mapping weather data if mmap is set."""
         assert self.dir_path and Path(self.dir_path).is_dir(), "A valid dir is a required argument."
         assert isinstance(self.file_names, Dict) and len(self.file_names) > 0, "File names dictionary is required."
         for v, n in self.file_names.items():
             bin_path = self._weather_file_path(n)
-            self[v] = WeatherData.from_file(bin_path)
+            self[v] = WeatherData.open(bin_path, mmap=mmap)
 
         self.validate()
 
@@ -296,7 +561,8 @@ class WeatherSet:
     def from_files(cls,
                    dir_path: Union[str, Path],
                    prefix: str = "",
-                   file_names: Dict[WeatherVariable, str] = None) -> WeatherSet:
+                   file_names: Dict[WeatherVariable, str] = None,
+                   mmap: bool = False) -> WeatherSet:
         """
         Instantiates WeatherSet from to weather files which paths are determined based on given arguments.
 
@@ -304,6 +570,8 @@ class WeatherSet:
             dir_path: Directory path containing weather files.
             prefix: Weather files prefix, e.g. "dtk_15arcmin\_"
             file_names: Dictionary of weather variables (keys) and weather .bin file names (values).
+            mmap: (Optional) Flag indicating whether to memory-map weather data instead of loading it (see
+                  WeatherData.open). The default is False.
 
         Returns:
             WeatherSet object.
@@ -311,7 +579,7 @@ class WeatherSet:
         WeatherVariable.validate_types(file_names, [str, Path])
         file_names = file_names or cls.select_weather_files(dir_path=dir_path, prefix=prefix)
         ws = WeatherSet(dir_path=dir_path, file_names=file_names)
-        ws._load()
+        ws._load(mmap=mmap)
 
         return ws
 
@@ -326,6 +594,101 @@ class WeatherSet:
 
     # Helpers
 
+    def _to_arrow_tables(self,
+                         node_column: str = None,
+                         step_column: str = None,
+                         weather_columns: Dict[WeatherVariable, str] = None,
+                         chunk_nodes: int = None):
+        """
+        Creates Arrow tables, one per block of nodes, with weather columns, attributes and node offsets stored in the
+        schema metadata.
+
+        Args:
+            node_column: (Optional) Column containing node ids. The default is "nodes".
+            step_column: (Optional) Column containing node index for weather time series values. The default is "steps".
+            weather_columns: (Optional) Dictionary of weather variables (keys) and weather column names (values).
+            chunk_nodes: (Optional) Number of nodes per table. The default is all nodes.
+
+        Returns:
+            Iterator of Arrow tables.
+        """
+        pa, _ = _import_pyarrow()
+        assert len(self) > 0, "Weather set is empty."
+        if chunk_nodes is not None and (not isinstance(chunk_nodes, int) or chunk_nodes <= 0):
+            raise ValueError("The number of nodes per chunk must be a positive integer.")
+
+        nodes = sorted(self.values()[0].metadata.nodes)
+        chunk_nodes = chunk_nodes or len(nodes)
+        schema = None
+        for start in range(0, len(nodes), chunk_nodes):
+            df = self.to_dataframe(node_column, step_column, weather_columns, nodes=nodes[start:start + chunk_nodes])
+            if schema is None:
+                info = DataFrameInfo(node_column=node_column, step_column=step_column)
+                content = {
+                    "node_column": info.node_column,
+                    "step_column": info.step_column,
+                    "weather_columns": {v.name: c for v, c in self.weather_columns.items()},
+                    "variables": {v.name: {"Metadata": self[v].metadata.attributes_dict,
+                                           "NodeOffsets": self[v].metadata.node_offset_str}
+                                  for v in self.weather_columns}
+                }
+                schema = pa.Schema.from_pandas(df, preserve_index=False)
+                schema = schema.with_metadata({**(schema.metadata or {}), _ARROW_METADATA_KEY: json.dumps(content)})
+
+            yield pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+    @classmethod
+    def _arrow_metadata(cls, schema) -> Dict:
+        """Reads weather set content description (columns, attributes and node offsets) from Arrow schema metadata."""
+        if not schema.metadata or _ARROW_METADATA_KEY not in schema.metadata:
+            raise ValueError("The file doesn't contain weather set metadata, it was not created from a weather set.")
+
+        return json.loads(schema.metadata[_ARROW_METADATA_KEY])
+
+    @classmethod
+    def _from_arrow_table(cls, table, content: Dict, selected: bool = False) -> WeatherSet:
+        """
+        Creates WeatherSet from an Arrow table created by _to_arrow_tables.
+
+        Args:
+            table: Arrow table containing node, step and weather columns.
+            content: Weather set content description, stored in the table schema metadata.
+            selected: Flag indicating the table contains only selected nodes. In that case node offsets stored in the
+                      schema metadata don't apply and unique weather time series are identified again.
+
+        Returns:
+            WeatherSet object.
+        """
+        node_column, step_column = content["node_column"], content["step_column"]
+        weather_columns = {WeatherVariable[name]: c for name, c in content["weather_columns"].items()}
+        df = table.to_pandas()
+        if len(df) == 0:
+            raise ValueError("No weather data found for selected nodes.")
+
+        nodes, order = WeatherData._index_series_rows(df=df, info=DataFrameInfo(node_column, step_column))
+        ws = WeatherSet(weather_columns=weather_columns)
+        for v, column in weather_columns.items():
+            variable = content["variables"][v.name]
+            if selected:
+                # Node offsets don't apply to the selected nodes, identify unique series again.
+                info = DataFrameInfo(node_column, step_column, column)
+                attributes = WeatherAttributes(attributes_dict=variable["Metadata"])
+                ws[v] = WeatherData._from_series_column(df=df, info=info, nodes=nodes, order=order,
+                                                        attributes=attributes)
+                continue
+
+            wm = WeatherMetadata(node_ids=decode_node_offsets(variable["NodeOffsets"]),
+                                 series_len=order.shape[1],
+                                 attributes=variable["Metadata"])
+            # Unique series are stored in the order of offsets, each is the series of the first node with that offset.
+            first_nodes = [nn[0] for nn in wm.offset_nodes.values()]
+            rows = np.searchsorted(nodes, first_nodes)
+            assert np.array_equal(nodes[np.minimum(rows, len(nodes) - 1)], first_nodes), "Node series are missing."
+            ws[v] = WeatherData(data=df[column].to_numpy(dtype=np.float32)[order[rows]], metadata=wm)
+
+        ws.validate()
+        return ws
+
     @classmethod
     def _init_weather_columns(cls, weather_columns: Dict[WeatherVariable, Union[str, None]] = None
                               ) -> Dict[WeatherVariable, str]:
@@ -565,3 +928,15 @@ class WeatherSet:
                 none_has = v not in self._weather_dict and v not in self._weather_columns
                 assert both_has or none_has, ""
 
+
+def _import_pyarrow(*modules: str):
+    """Imports pyarrow (and listed pyarrow submodules), which is an optional dependency used for columnar files."""
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.ipc
+        submodules = [importlib.import_module(f"pyarrow.{m}") for m in modules]
+    except ImportError as ex:
+        raise ImportError("Parquet and Feather files require pyarrow package (pip install pyarrow).") from ex
+
+    return (pyarrow, *submodules) if submodules else (pyarrow, None)
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+
+"""
+Weather summary module, computing weather statistics (climatology) once per unique weather time series and
+persisting them in sidecar files (.bin.summary.npz) next to weather files.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from typing import Dict, Iterable, List, NoReturn, Tuple, Union
+
+from emodpy_malaria.weather.weather_data import WeatherData, _DAILY_UPDATE_RESOLUTIONS
+from emodpy_malaria.weather.weather_utils import replace_file
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+_SUMMARY_FILE_SUFFIX = ".summary.npz"
+_HEADER_KEY = "header"
+_NODE_IDS_KEY = "node_ids"
+_ROWS_KEY = "rows"
+_BLOCK_VALUE_COUNT = 1 << 22    # number of weather values converted to float64 at once (32 MB)
+
+
+class WeatherSummary:
+    """
+    Weather statistics of unique weather time series: monthly means (climatology), percentiles and, if a dry day
+    threshold is specified (rainfall), dry days and dry spell statistics. Node statistics are the statistics of
+    the series nodes share, based on weather metadata node offsets.
+    """
+
+    def __init__(self,
+                 stats: Dict[str, np.ndarray],
+                 node_ids: np.ndarray,
+                 rows: np.ndarray,
+                 parameters: Dict[str, Union[List[float], float, None]]):
+        """
+        Initializes weather summary object.
+
+        Args:
+            stats: Dictionary of statistic names and arrays, with one row per unique weather time series.
+            node_ids: Node ids.
+            rows: Rows of statistics arrays, one per node id.
+            parameters: Parameters used to compute statistics (percentiles and dry day threshold).
+        """
+        self._stats: Dict[str, np.ndarray] = stats
+        self._node_ids: np.ndarray = np.asarray(node_ids, dtype=np.int64)
+        self._rows: np.ndarray = np.asarray(rows, dtype=np.int64)
+        self._parameters = parameters
+        self._node_rows: Union[Dict[int, int], None] = None     # node id to row dictionary, created when needed
+
+    @property
+    def stats(self) -> Dict[str, np.ndarray]:
+        """Dictionary of statistic names and arrays, with one row per unique weather time series."""
+        return self._stats
+
+    @property
+    def parameters(self) -> Dict[str, Union[List[float], float, None]]:
+        """Parameters used to compute statistics."""
+        return self._parameters
+
+    @property
+    def nodes(self) -> List[int]:
+        """Node ids, sorted."""
+        return sorted(self._node_ids.tolist())
+
+    def node(self, node_id: int) -> Dict[str, np.ndarray]:
+        """
+        Returns statistics of a node.
+
+        Args:
+            node_id: Node id.
+
+        Returns:
+            Dictionary of statistic names and values.
+        """
+        if self._node_rows is None:
+            self._node_rows = dict(zip(self._node_ids.tolist(), self._rows.tolist()))
+        if node_id not in self._node_rows:
+            raise KeyError(f"Node not found in weather summary: {node_id}")
+
+        row = self._node_rows[node_id]
+        return {name: values[row] for name, values in self._stats.items()}
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Creates a dataframe of node statistics, one row per node (index), sorted by node id.
+        Multi-value statistics are split into columns, e.g. monthly means into "monthly_mean_1" to "monthly_mean_12".
+
+        Returns:
+            Dataframe of node statistics.
+        """
+        order = np.argsort(self._node_ids)
+        rows = self._rows[order]
+        columns = {}
+        for name, values in self._stats.items():
+            if values.ndim == 1:
+                columns[name] = values[rows]
+            else:
+                labels = self._percentile_labels() if name == "percentiles" else range(1, values.shape[1] + 1)
+                prefix = "p" if name == "percentiles" else f"{name}_"
+                columns.update({f"{prefix}{label}": values[rows, i] for i, label in enumerate(labels)})
+
+        return pd.DataFrame(columns, index=pd.Index(self._node_ids[order], name="nodes"))
+
+    @classmethod
+    def from_weather_data(cls,
+                          weather_data: WeatherData,
+                          percentiles: Iterable[float] = None,
+                          dry_threshold: float = None) -> WeatherSummary:
+        """
+        Computes weather statistics of unique weather time series.
+
+        Args:
+            weather_data: WeatherData object.
+            percentiles: (Optional) Percentiles to compute, between 0 and 100. The default is 5, 25, 50, 75, 95.
+            dry_threshold: (Optional) Values below the threshold are dry days. If not specified (e.g., for weather
+                           variables other than rainfall), dry spell statistics are not computed.
+
+        Returns:
+            WeatherSummary object.
+        """
+        parameters = cls._parameters(percentiles, dry_threshold)
+        data = weather_data.data
+        row_count, step_count = data.shape
+        stats = {}
+
+        # Monthly means (climatology), over all years, only for daily weather data.
+        month_matrix = None
+        if weather_data.metadata.update_resolution in _DAILY_UPDATE_RESOLUTIONS:
+            months = weather_data._step_dates().month.to_numpy() - 1
+            month_matrix = np.zeros((len(months), 12))
+            month_matrix[np.arange(len(months)), months] = 1
+            stats["monthly_mean"] = np.empty((row_count, 12))
+
+        stats["percentiles"] = np.empty((row_count, len(parameters["percentiles"])))
+        if dry_threshold is not None:
+            stats.update({"dry_days": np.empty(row_count, dtype=np.int64),
+                          "dry_spell_max": np.empty(row_count, dtype=np.int64),
+                          "dry_spell_mean": np.empty(row_count)})
+
+        # Compute statistics in blocks of rows, so only one block is converted to float64 (and read, if memory-mapped).
+        block_rows = max(1, _BLOCK_VALUE_COUNT // max(step_count, 1))
+        for start in range(0, row_count, block_rows):
+            block = slice(start, start + block_rows)
+            values = np.asarray(data[block], dtype=np.float64)
+            if month_matrix is not None:
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    stats["monthly_mean"][block] = (values @ month_matrix) / month_matrix.sum(axis=0)
+
+            stats["percentiles"][block] = np.percentile(values, parameters["percentiles"], axis=1).T
+            if dry_threshold is not None:
+                for name, block_values in cls._dry_spell_stats(values < dry_threshold).items():
+                    stats[name][block] = block_values
+
+        node_ids, offsets = weather_data.metadata.node_offset_arrays
+        rows = np.searchsorted(np.unique(offsets), offsets)
+        return cls(stats=stats, node_ids=node_ids, rows=rows, parameters=parameters)
+
+    @classmethod
+    def from_file(cls,
+                  file_path: Union[str, Path],
+                  percentiles: Iterable[float] = None,
+                  dry_threshold: float = None,
+                  weather_data: WeatherData = None,
+                  force: bool = False) -> WeatherSummary:
+        """
+        Returns weather statistics of a weather file from its sidecar summary file (.bin.summary.npz), or computes
+        and saves them, if the summary file doesn't exist, was computed with different parameters or weather files
+        have changed. Weather files are considered unchanged if their sizes and modification times match, or
+        otherwise their content hash matches.
+
+        Args:
+            file_path: The weather binary (.bin) file path.
+            percentiles: (Optional) Percentiles to compute, between 0 and 100. The default is 5, 25, 50, 75, 95.
+            dry_threshold: (Optional) Values below the threshold are dry days. If not specified, dry spell
+                           statistics are not computed.
+            weather_data: (Optional) WeatherData object of the weather file, to avoid reading it again.
+            force: (Optional) Flag indicating whether to compute statistics even if the summary file is valid.
+
+        Returns:
+            WeatherSummary object.
+        """
+        file_path = Path(file_path)
+        summary_path = cls.summary_file_path(file_path)
+        parameters = cls._parameters(percentiles, dry_threshold)
+        file_stat = cls._file_stat(file_path)
+        file_hash = None
+        if not force and summary_path.is_file():
+            summary, header = cls._read(summary_path)
+            if header["parameters"] == parameters:
+                if header["file_stat"] == file_stat:
+                    return summary
+
+                file_hash = cls._file_hash(file_path)
+                if header["file_hash"] == file_hash:
+                    summary._write(summary_path, file_stat, file_hash)     # files were touched or copied
+                    return summary
+
+        weather_data = weather_data or WeatherData.open(file_path)
+        summary = cls.from_weather_data(weather_data, parameters["percentiles"], parameters["dry_threshold"])
+        summary._write(summary_path, file_stat, file_hash or cls._file_hash(file_path))
+        return summary
+
+    @classmethod
+    def summary_file_path(cls, file_path: Union[str, Path]) -> Path:
+        """Returns the summary file path of a weather binary (.bin) file."""
+        return Path(f"{file_path}{_SUMMARY_FILE_SUFFIX}")
+
+    # Helpers
+
+    @classmethod
+    def _parameters(cls, percentiles: Iterable[float] = None, dry_threshold: float = None) -> Dict:
+        percentiles = [float(p) for p in (DEFAULT_PERCENTILES if percentiles is None else percentiles)]
+        dry_threshold = None if dry_threshold is None else float(dry_threshold)
+        return {"percentiles": percentiles, "dry_threshold": dry_threshold}
+
+    def _percentile_labels(self) -> List[str]:
+        return [f"{p:g}" for p in self._parameters["percentiles"]]
+
+    @classmethod
+    def _dry_spell_stats(cls, dry: np.ndarray) -> Dict[str, np.ndarray]:
+        """Dry days count, max and mean dry spell length, per row of a 2d boolean array of dry days."""
+        row_count = dry.shape[0]
+        padded = np.zeros((row_count, dry.shape[1] + 2), dtype=np.int8)
+        padded[:, 1:-1] = dry
+        changes = np.diff(padded, axis=1)
+        start_rows, start_steps = np.nonzero(changes == 1)
+        _, end_steps = np.nonzero(changes == -1)
+        lengths = end_steps - start_steps
+
+        spell_max = np.zeros(row_count, dtype=np.int64)
+        np.maximum.at(spell_max, start_rows, lengths)
+        spell_count = np.bincount(start_rows, minlength=row_count)
+        spell_days = np.bincount(start_rows, weights=lengths, minlength=row_count)
+        spell_mean = np.divide(spell_days, spell_count, out=np.zeros(row_count), where=spell_count > 0)
+
+        return {
+            "dry_days": dry.sum(axis=1),
+            "dry_spell_max": spell_max,
+            "dry_spell_mean": spell_mean,
+        }
+
+    @classmethod
+    def _file_stat(cls, file_path: Path) -> List[List[int]]:
+        """Sizes and modification times (ns) of weather binary and metadata files."""
+        stats = [Path(f).stat() for f in [file_path, f"{file_path}.json"]]
+        return [[s.st_size, s.st_mtime_ns] for s in stats]
+
+    @classmethod
+    def _file_hash(cls, file_path: Path) -> str:
+        """Content hash of weather binary and metadata files."""
+        file_hash = hashlib.sha256()
+        for f in [file_path, f"{file_path}.json"]:
+            with open(f, "rb") as file:
+                for block in iter(lambda: file.read(1 << 20), b""):
+                    file_hash.update(block)
+
+        return file_hash.hexdigest()
+
+    @classmethod
+    def _read(cls, summary_path: Path) -> Tuple[WeatherSummary, Dict]:
+        with np.load(summary_path, allow_pickle=False) as content:
+            header = json.loads(str(content[_HEADER_KEY]))
+            stats = {name: content[name] for name in header["stats"]}
+            summary = WeatherSummary(stats=stats,
+                                     node_ids=content[_NODE_IDS_KEY],
+                                     rows=content[_ROWS_KEY],
+                                     parameters=header["parameters"])
+
+        return summary, header
+
+    def _write(self, summary_path: Path, file_stat: List[List[int]], file_hash: str) -> NoReturn:
+        header = {
+            "parameters": self._parameters,
+            "file_stat": file_stat,
+            "file_hash": file_hash,
+            "stats": list(self._stats),
+        }
+        # Write to a temp file unique to this process and thread, which then replaces the summary file.
+        with replace_file(summary_path) as file:
+            np.savez(file, **{_HEADER_KEY: np.array(json.dumps(header)),
+                              _NODE_IDS_KEY: self._node_ids,
+                              _ROWS_KEY: self._rows,
+                              **self._stats})
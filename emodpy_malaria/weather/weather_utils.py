@@ -6,11 +6,14 @@ The module for weather utility functions.
 
 import numpy as np
 import json
+import os
+import threading
 
 from collections import defaultdict
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Iterable, NoReturn, Union
+from typing import Dict, Iterable, NoReturn, Tuple, Union
 
 
 def invert_dict(in_dict: Dict, sort=False, single_value=False) -> Dict:
@@ -73,6 +76,45 @@ def hash_series(series: Iterable[np.float32]) -> int:
     return h
 
 
+def unique_series(series: np.ndarray, tolerance: float = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find unique rows of a 2d array of weather time series, in the order of their first appearance.
+    Series are compared by their exact bytes, each row is viewed as a single (void) value so that a single np.unique
+    call finds them. Used for grouping nodes by weather time series, and determining unique series.
+
+    If tolerance is specified, near-duplicate series are also merged: series values are rounded to the nearest
+    multiple of tolerance and series which are the same after rounding are represented by the first of them.
+
+    For example,
+        [[1, 2], [3, 4], [1, 2]] -> unique rows [0, 1], inverse [0, 1, 0]
+
+    Args:
+        series: The 2d array of float values, one time series per row.
+        tolerance: (Optional) The rounding step used to merge near-duplicate series. By default, only exact.
+
+    Returns:
+        Tuple of two arrays:
+            unique rows: indices of the rows representing unique series, in the order of their first appearance,
+            inverse: for each row, the position of its representative in the unique rows array.
+    """
+    series = np.asarray(series)
+    assert series.ndim == 2, "Time series must be a 2d array, one series per row."
+    if tolerance is not None:
+        if not tolerance > 0:
+            raise ValueError("Tolerance must be a positive number.")
+        # Adding 0.0 turns -0.0 into 0.0, so that rounded values of the same sign compare equal as bytes.
+        series = np.round(series.astype(np.float64) / tolerance) + 0.0
+
+    series = np.ascontiguousarray(series)
+    rows = series.view(np.dtype((np.void, series.dtype.itemsize * series.shape[1]))).reshape(-1)
+    _, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+    # np.unique sorts by value, rank unique rows by first appearance instead.
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return first[order], rank[inverse.reshape(-1)]
+
+
 def save_json(content: Dict[str, str], file_path: Union[str, Path]) -> NoReturn:
     """
     Save dictionary to a json file.
@@ -85,10 +127,33 @@ def save_json(content: Dict[str, str], file_path: Union[str, Path]) -> NoReturn:
             None
 
     """
-    with open(str(file_path), "wt") as file:
+    with replace_file(file_path, "wt") as file:
         json.dump(content, file, indent=2, separators=(",", ": "))
 
 
+@contextmanager
+def replace_file(file_path: Union[str, Path], mode: str = "wb"):
+    """
+    Open a temp file in the same dir for writing, which replaces the file once written. An existing file is never
+    modified in place, so files hardlinked from the weather cache stay intact and readers never see partial files.
+
+    Args:
+        file_path: The path of the file to be written.
+        mode: (Optional) File open mode. The default is "wb".
+
+    Returns:
+        Context manager yielding the open temp file.
+    """
+    file_path = Path(file_path)
+    temp_path = file_path.with_name(f".{file_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(temp_path, mode) as file:
+            yield file
+        os.replace(temp_path, file_path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+
+
 def make_path(dir_path: Union[str, Path]) -> NoReturn:
     """Make path directories."""
     if dir_path:
@@ -0,0 +1,127 @@
+import json
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from pathlib import Path
+
+import emodpy_malaria.migration.convert_csv_to_bin_vector_migration as convert_csv
+import emodpy_malaria.migration.convert_json_to_bin as convert_json
+from emodpy_malaria.migration.edge_list import (find_duplicate_destinations, read_edges, summarize_edges,
+                                                write_edges_to_bin)
+
+
+class EdgeListConverterTests(unittest.TestCase):
+    """
+    Compare the edge list converters against files generated with the original (whole file, per-record) converters,
+    see baseline/README.md.
+    """
+    baseline_dir = Path(__file__).parent.joinpath("baseline")
+
+    def setUp(self) -> None:
+        self.output_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+
+    def load_metadata(self, filename):
+        with open(filename) as file:
+            metadata = json.load(file)
+        # time and tool name depend on when and how the file was written
+        for key in ["DateCreated", "Tool"]:
+            metadata["Metadata"].pop(key, None)
+        return metadata
+
+    def assert_same_files(self, filename, baseline_name):
+        self.assertEqual(Path(filename).read_bytes(), self.baseline_dir.joinpath(baseline_name).read_bytes())
+        self.assertEqual(self.load_metadata(f"{filename}.json"),
+                         self.load_metadata(self.baseline_dir.joinpath(f"{baseline_name}.json")))
+
+    def test_csv_matches_baseline(self):
+        for name in ["edges_rate", "edges_gender", "edges_genetics"]:
+            with self.subTest(name=name):
+                metadata = convert_csv.MetaData()
+                metadata.ref_id = "edges"
+                metadata.filename_in = str(self.baseline_dir.joinpath(f"{name}.csv"))
+                metadata.filename_out = str(self.output_dir.joinpath(f"{name}.bin"))
+                convert_csv.get_summary_data(metadata)
+                convert_csv.write_bin_file(metadata)
+                convert_csv.write_metadata_file(metadata)
+                self.assert_same_files(metadata.filename_out, f"{name}.bin")
+
+    def test_csv_small_chunks(self):
+        filename_in = self.baseline_dir.joinpath("edges_rate.csv")
+        filename_out = self.output_dir.joinpath("edges_rate.bin")
+        summary = summarize_edges(filename_in, chunksize=2)
+        self.assertEqual(summary.nodes.tolist(), [5, 3, 1])
+        self.assertEqual(summary.counts.tolist(), [3, 2, 1])
+        self.assertEqual(summary.max_destinations_per_node, 3)
+        write_edges_to_bin(filename_in, filename_out, summary, chunksize=2)
+        self.assertEqual(filename_out.read_bytes(), self.baseline_dir.joinpath("edges_rate.bin").read_bytes())
+        self.assertIsNone(find_duplicate_destinations(filename_out, summary))
+
+    def test_csv_duplicate_destinations(self):
+        filename_in = self.output_dir.joinpath("duplicates.csv")
+        filename_in.write_text("FromNodeID,ToNodeID,Rate\n1,2,0.1\n2,1,0.2\n1,3,0.3\n1,2,0.4\n")
+        metadata = convert_csv.MetaData()
+        metadata.ref_id = "edges"
+        metadata.filename_in = str(filename_in)
+        metadata.filename_out = str(self.output_dir.joinpath("duplicates.bin"))
+        convert_csv.get_summary_data(metadata)
+        with self.assertRaises(ValueError):
+            convert_csv.write_bin_file(metadata)
+        self.assertFalse(Path(metadata.filename_out).exists())
+
+    def test_txt_matches_baseline(self):
+        filename_in = self.baseline_dir.joinpath("edges.txt")
+        filename_out = self.output_dir.joinpath("edges_txt.bin")
+        # same calls as the convert_txt_to_bin script
+        summary = summarize_edges(filename_in, header=None, columns=[0, 1, 2])
+        write_edges_to_bin(filename_in, filename_out, summary, header=None, columns=[0, 1, 2])
+        self.assertEqual(filename_out.read_bytes(), self.baseline_dir.joinpath("edges_txt.bin").read_bytes())
+        expected = self.load_metadata(self.baseline_dir.joinpath("edges_txt.bin.json"))
+        self.assertEqual(summary.offset_str, expected["NodeOffsets"])
+        self.assertEqual(summary.node_count, expected["Metadata"]["NodeCount"])
+        self.assertEqual(summary.max_destinations_per_node, expected["Metadata"]["DatavalueCount"])
+
+    def test_read_edges_columns(self):
+        chunks = list(read_edges(self.baseline_dir.joinpath("edges_gender.csv"), header=None, columns=[0, 1, 3],
+                                 chunksize=3))
+        self.assertEqual([len(sources) for sources, _, _ in chunks], [3, 1])
+        sources, destinations, rates = chunks[0]
+        np.testing.assert_array_equal(sources, [5, 5, 3])
+        np.testing.assert_array_equal(destinations, [1, 2, 5])
+        np.testing.assert_array_equal(rates, [[0.2], [0.35], [0.5]])
+
+    def test_selected_columns_small_chunks(self):
+        filename_in = self.baseline_dir.joinpath("edges_gender.csv")
+        summary = summarize_edges(filename_in, header=None, columns=[0, 1, 3])
+        self.assertEqual(summary.rate_columns, [3])
+        files = []
+        for chunksize in (1, 2, 100):
+            filename_out = self.output_dir.joinpath(f"edges_gender_{chunksize}.bin")
+            write_edges_to_bin(filename_in, filename_out, summary, header=None, columns=[0, 1, 3],
+                               chunksize=chunksize)
+            files.append(filename_out.read_bytes())
+        self.assertEqual(files[0], files[1])
+        self.assertEqual(files[0], files[2])
+        # one layer with the male rates of the baseline file, which holds the female layer first
+        baseline = self.baseline_dir.joinpath("edges_gender.bin").read_bytes()
+        self.assertEqual(files[0], baseline[len(baseline) // 2:])
+
+    def test_json_matches_baseline(self):
+        with open(self.baseline_dir.joinpath("rates.json")) as file:
+            json_data = json.load(file)
+        summary = convert_json.get_summary_data(json_data)
+        filename_out = self.output_dir.joinpath("rates_json.bin")
+        convert_json.write_bin_file(str(filename_out), json_data, summary)
+        self.assertEqual(filename_out.read_bytes(), self.baseline_dir.joinpath("rates_json.bin").read_bytes())
+        expected = self.load_metadata(self.baseline_dir.joinpath("rates_json.bin.json"))
+        self.assertEqual(summary.offset_str, expected["NodeOffsets"])
+        self.assertEqual(summary.num_nodes, expected["Metadata"]["NodeCount"])
+        self.assertEqual(summary.max_destinations_per_node, expected["Metadata"]["DatavalueCount"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,17 @@
+import unittest
+
+from migration_fixtures import MigrationBaselineTestCase
+
+
+class VectorMigrationBaselineTests(MigrationBaselineTestCase):
+
+    def test_to_file_matches_baseline(self):
+        migration = self.layers_migration()
+        for gender, age, source, destination, rate in self.layer_rates():
+            migration[source:gender:age][destination] = rate
+        filename = migration.to_file(self.output_dir.joinpath("layers.bin"), value_limit=5)
+        self.assert_same_files(filename, "layers.bin")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import json
+import unittest
+import numpy as np
+
+from emod_api.demographics.Demographics import Demographics
+from emod_api.demographics.Node import Node
+
+import emodpy_malaria.migration.vector_migration as vm
+from migration_fixtures import MigrationBaselineTestCase
+
+
+class GravityVectorMigrationTests(MigrationBaselineTestCase):
+
+    def test_gravity_matches_baseline(self):
+        nodes = [Node(lat=0.1 * (i % 5), lon=0.1 * (i // 5), pop=1000 + 250 * i, forced_id=i + 1) for i in range(20)]
+        demographics = Demographics(nodes=nodes, idref="gravity")
+        filename = self.output_dir.joinpath("gravity.bin")
+        for processes in (1, 2):
+            vm.from_demographics_and_gravity_params(demographics, [7.5e-6, 1.0, 1.0, -2.0], filename=str(filename),
+                                                    block_size=7, processes=processes)
+            # the baseline computed geodesic distances with geographiclib, so rates agree to rounding only
+            migration = vm.from_file(filename)
+            expected = vm.from_file(self.baseline_dir.joinpath("gravity.bin"))
+            self.assertEqual(migration.Nodes, expected.Nodes)
+            self.assertEqual(migration.DatavalueCount, expected.DatavalueCount)
+            for node in expected.Nodes:
+                rates, expected_rates = migration[node], expected[node]
+                self.assertEqual(sorted(rates), sorted(expected_rates))
+                np.testing.assert_allclose([rates[key] for key in sorted(rates)],
+                                           [expected_rates[key] for key in sorted(expected_rates)], rtol=1e-6)
+            with open(f"{filename}.json") as file:
+                self.assertEqual(json.load(file)["Metadata"]["IdReference"], "gravity")
+
+
+if __name__ == '__main__':
+    unittest.main()
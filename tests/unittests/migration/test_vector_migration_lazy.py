@@ -0,0 +1,50 @@
+import unittest
+
+import emodpy_malaria.migration.vector_migration as vm
+from migration_fixtures import MigrationBaselineTestCase
+
+
+class LazyVectorMigrationTests(MigrationBaselineTestCase):
+
+    def test_lazy_and_eager_loading_agree(self):
+        eager = vm.from_file(self.baseline_dir.joinpath("layers.bin"))
+        lazy = vm.from_file(self.baseline_dir.joinpath("layers.bin"), lazy=True)
+        self.assertEqual(eager.NodeCount, 12)
+        self.assert_same_layers(lazy, eager)
+
+        # the baseline metadata has no GenderDataType, so only the first two (age) layers are read
+        expected = {}
+        for gender, age, source, destination, rate in self.layer_rates():
+            if gender == 0:
+                expected.setdefault((age, source), {})[destination] = rate
+        for layer, age in zip(lazy._layers, (5, 30)):
+            for source in range(1, 13):
+                rates = expected[(age, source)]
+                kept = dict(layer[source])
+                self.assertEqual(len(kept), min(5, len(rates)))
+                for destination, rate in kept.items():
+                    self.assertEqual(rates[destination], rate)
+
+    def test_lazy_loading_round_trip(self):
+        for lazy in (False, True):
+            migration = self.fixed_metadata(vm.from_file(self.baseline_dir.joinpath("from_params.bin"), lazy=lazy))
+            filename = migration.to_file(self.output_dir.joinpath(f"from_params_{lazy}.bin"))
+            self.assert_same_files(filename, "from_params.bin")
+
+    def test_zero_rows_are_not_present(self):
+        migration = vm.VectorMigration()
+        for source in range(1, 11):
+            migration[source][source % 10 + 1] = 0.5
+        for source in range(11, 14):
+            migration[source][1] = 0.0
+        filename = migration.to_file(self.output_dir.joinpath("zeros.bin"))
+        eager = vm.from_file(filename)
+        lazy = vm.from_file(filename, lazy=True)
+        self.assertEqual(eager.NodeCount, 10)
+        self.assertEqual(lazy.NodeCount, eager.NodeCount)
+        self.assertEqual(lazy.Nodes, eager.Nodes)
+        self.assertNotIn(12, lazy._layers[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
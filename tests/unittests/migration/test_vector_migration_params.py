@@ -0,0 +1,18 @@
+import unittest
+import numpy as np
+
+import emodpy_malaria.migration.vector_migration as vm
+from migration_fixtures import MigrationBaselineTestCase
+
+
+class FromParamsVectorMigrationTests(MigrationBaselineTestCase):
+
+    def test_from_params_matches_baseline(self):
+        np.random.seed(5)
+        migration = self.fixed_metadata(vm.from_params(population=10000, num_nodes=40, id_ref="params"))
+        filename = migration.to_file(self.output_dir.joinpath("from_params.bin"))
+        self.assert_same_files(filename, "from_params.bin")
+
+
+if __name__ == '__main__':
+    unittest.main()
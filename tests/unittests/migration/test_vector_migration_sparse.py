@@ -0,0 +1,37 @@
+import unittest
+
+import emodpy_malaria.migration.vector_migration as vm
+from migration_fixtures import MigrationBaselineTestCase
+
+
+class SparseVectorMigrationTests(MigrationBaselineTestCase):
+
+    def test_sparse_set_rates_matches_baseline(self):
+        migration = self.layers_migration(sparse=True)
+        rates = {}
+        for gender, age, source, destination, rate in self.layer_rates():
+            rates.setdefault((gender, age), []).append((source, destination, rate))
+        for (gender, age), rows in rates.items():
+            # add the rates in two batches so that the second one is merged into existing rows
+            half = len(rows) // 2
+            for batch in (rows[:half], rows[half:]):
+                sources, destinations, values = zip(*batch)
+                migration.set_rates(sources, destinations, values, gender=gender, age=age)
+        filename = migration.to_file(self.output_dir.joinpath("layers.bin"), value_limit=5)
+        self.assert_same_files(filename, "layers.bin")
+
+    def test_sparse_layer_merges_updates(self):
+        migration = vm.VectorMigration(sparse=True)
+        migration.set_rates([1, 1, 2], [2, 3, 1], [0.1, 0.2, 0.3])
+        migration.set_rates([1, 2, 3], [3, 4, 1], [0.5, 0.6, 0.7])
+        self.assertEqual(migration.NodeCount, 3)
+        self.assertEqual(dict(migration[1]), {2: 0.1, 3: 0.5})
+        self.assertEqual(dict(migration[2]), {1: 0.3, 4: 0.6})
+        migration[3][2] = 0.8
+        migration.set_rates([3], [4], [0.9])
+        self.assertEqual(dict(migration[3]), {1: 0.7, 2: 0.8, 4: 0.9})
+        self.assertEqual(migration.DatavalueCount, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
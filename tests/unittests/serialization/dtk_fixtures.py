@@ -0,0 +1,165 @@
+"""
+Builds small synthetic serialized population (.dtk) files for the serialization tests: version 1 files (a single
+chunk), version 2 and 4 files (a simulation chunk and one chunk per node) and version 6 files (node chunks and human
+collection chunks).
+"""
+
+import json
+import random
+import lz4.block
+import emod_api.serialization.SerializedPopulation as SerPop
+
+from pathlib import Path
+from typing import List, Tuple
+
+from emodpy_malaria.serialization.zero_infections import UNINFECTED_HUMAN
+
+# VectorStateEnum values
+STATE_INFECTIOUS = 0
+STATE_INFECTED = 1
+STATE_ADULT = 2
+
+
+def human_id(node_id: int, index: int) -> int:
+    return node_id * 100000 + index
+
+
+def _human(suid: int, infected: bool) -> dict:
+    human = {"suid": {"id": suid}, "m_age": 100.0 + suid}
+    human.update(UNINFECTED_HUMAN)
+    if infected:
+        human.update({"infections": [{"suid": {"id": suid}}], "infectiousness": 0.5, "m_is_infected": True,
+                      "m_female_gametocytes": 3, "m_new_infection_state": 1})
+    return human
+
+
+def _cohort(cohort_id: int, state: int) -> dict:
+    strain = {"__class__": "StrainIdentity", "m_Hash": 1} if state != STATE_ADULT else {"__class__": "nullptr"}
+    return {"__class__": "VectorCohortIndividual", "m_ID": cohort_id, "state": state, "progress": 0.5,
+            "m_pStrain": strain}
+
+
+def _genome(rng: random.Random, length: int) -> dict:
+    sequence = [rng.randrange(4) for _ in range(length)]
+    return {"m_pInner": {"__class__": "ParasiteGenomeInner", "m_HashCode": 1, "m_BarcodeHashcode": 1,
+                         "m_NucleotideSequence": sequence, "m_AlleleRoots": [0] * length}}
+
+
+def _genetics_adult(cohort_id: int, rng: random.Random, length: int) -> dict:
+    def cohorts(counts):
+        return [{"m_MaleGametocyteGenome": _genome(rng, length),
+                 "m_pStrainIdentity": {"m_Genome": _genome(rng, length)}} for _ in range(rng.choice(counts))]
+
+    return {"__class__": "VectorCohortIndividual", "m_ID": cohort_id, "state": STATE_ADULT, "progress": 0.0,
+            "m_OocystCohorts": cohorts([0, 1, 2]), "m_SporozoiteCohorts": cohorts([0, 1])}
+
+
+def _node(node_id: int, humans_per_node: int, rng: random.Random, genome_length: int = None) -> Tuple[dict, List[dict]]:
+    """Returns a node (without humans) and its humans."""
+    humans = [_human(human_id(node_id, i), rng.random() < 0.3) for i in range(humans_per_node)]
+    if genome_length:
+        for human in humans:
+            human["infections"] = [{"infection_strain": {"m_Genome": _genome(rng, genome_length)}}
+                                   for _ in range(rng.choice([0, 0, 1, 2]))]
+        queues = {"AdultQueues": [_genetics_adult(node_id * 1000 + i, rng, genome_length) for i in range(10)],
+                  "InfectedQueues": [], "InfectiousQueues": []}
+    else:
+        queues = {"AdultQueues": [_cohort(node_id * 1000 + i, STATE_ADULT) for i in range(5)],
+                  "InfectedQueues": [_cohort(node_id * 1000 + 10 + i, STATE_INFECTED) for i in range(4)],
+                  "InfectiousQueues": [_cohort(node_id * 1000 + 20 + i, STATE_INFECTIOUS) for i in range(3)]}
+    node = {"__class__": "NodeMalaria", "externalId": node_id, "suid": {"id": node_id},
+            "m_vectorpopulations": [{queue: {"collection": cohorts} for queue, cohorts in queues.items()}]}
+    return node, humans
+
+
+def _compress(content: dict) -> bytes:
+    return lz4.block.compress(json.dumps(content, separators=(",", ":")).encode())
+
+
+def _write(file_path: Path, header: dict, chunks: List[bytes]) -> None:
+    header = json.dumps(header, separators=(",", ":"))
+    with open(file_path, "wb") as file:
+        file.write(b"IDTK")
+        file.write(f"{len(header):>12}".encode())
+        file.write(header.encode())
+        for chunk in chunks:
+            file.write(chunk)
+
+
+def make_dtk(file_path: Path, version: int, node_ids: List[int] = (1, 2, 3), humans_per_node: int = 50,
+             genome_length: int = None, seed: int = 1) -> Path:
+    """
+    Writes a serialized population file. About 30% of humans are infected and each node has adult, infected and
+    infectious vector cohorts. If genome_length is set, humans and vectors carry parasite genomes instead.
+
+    Args:
+        file_path: Output file.
+        version: File version, 1, 2, 4 or 6.
+        node_ids: Node ids (also used as node suids).
+        humans_per_node: Number of humans in each node, in version 6 files split into two human collections.
+        genome_length: (Optional) Length of parasite genomes in infections, oocysts and sporozoites.
+        seed: Random seed.
+
+    Returns:
+        The file path.
+    """
+    rng = random.Random(seed)
+    simulation = {"__class__": "SimulationMalaria", "nodes": [],
+                  "infectionSuidGenerator": {"next_suid": {"id": 5}, "numtasks": 1}}
+    if genome_length:
+        simulation["ParasiteGenetics"] = {"m_ParasiteGenomeMap": [{"key": 1, "value": {}}]}
+
+    nodes = [_node(node_id, humans_per_node, rng, genome_length) for node_id in node_ids]
+    if version < 6:
+        for node, humans in nodes:
+            node["individualHumans"] = humans
+        if version == 1:
+            # Compressed version 1 files use Snappy, write the single chunk uncompressed instead.
+            simulation["nodes"] = [{"suid": node["suid"], "node": node} for node, _ in nodes]
+            chunks = [json.dumps({"simulation": simulation}, separators=(",", ":")).encode()]
+        else:
+            chunks = [_compress({"simulation": simulation} if version == 2 else simulation)]
+            chunks += [_compress({"suid": node["suid"], "node": node} if version == 2 else node) for node, _ in nodes]
+        header = {"author": "tests", "bytecount": sum(map(len, chunks)), "chunkcount": len(chunks),
+                  "chunksizes": [len(chunk) for chunk in chunks], "date": "today", "tool": "tests",
+                  "version": version}
+        if version >= 4:
+            header["compression"] = "LZ4"
+        elif version == 1:
+            header["compressed"] = False
+        else:
+            header.update({"compressed": True, "engine": "LZ4"})
+        _write(file_path, header if version > 3 else {"metadata": header}, chunks)
+        return file_path
+
+    def hex_value(value: int) -> str:
+        return format(value, "016x")
+
+    node_chunks, human_chunks, human_node_suids, human_counts = [], [], [], []
+    for node, humans in nodes:
+        node_chunks.append(_compress(node))
+        half = len(humans) // 2
+        for collection in (humans[:half], humans[half:]):
+            human_chunks.append(_compress({"human_collection": collection}))
+            human_node_suids.append(node["suid"]["id"])
+            human_counts.append(len(collection))
+    simulation_chunk = _compress(simulation)
+    header = {"version": 6, "author": "tests", "tool": "tests", "date": "today", "emod_info": {},
+              "sim_compression": "LZ4", "sim_chunk_size": hex_value(len(simulation_chunk)),
+              "node_suids": [hex_value(node_id) for node_id in node_ids],
+              "node_compressions": ["LZ4"] * len(node_chunks),
+              "node_chunk_sizes": [hex_value(len(chunk)) for chunk in node_chunks],
+              "human_compressions": ["LZ4"] * len(human_chunks),
+              "human_node_suids": [hex_value(suid) for suid in human_node_suids],
+              "human_num_humans": [hex_value(count) for count in human_counts],
+              "human_chunk_sizes": [hex_value(len(chunk)) for chunk in human_chunks]}
+    _write(file_path, header, [simulation_chunk] + node_chunks + human_chunks)
+    return file_path
+
+
+def read_population(file_path: Path) -> tuple:
+    """Returns nodes (humans and vectors) and the genome map of a serialized population file, as plain objects."""
+    ser_pop = SerPop.SerializedPopulation(str(file_path))
+    nodes = {node.externalId: (list(node.individualHumans), node["m_vectorpopulations"]) for node in ser_pop.nodes}
+    genome_map = ser_pop.dtk.simulation.get("ParasiteGenetics", {}).get("m_ParasiteGenomeMap")
+    return json.loads(json.dumps([nodes, genome_map]))
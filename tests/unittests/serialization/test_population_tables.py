@@ -0,0 +1,84 @@
+import importlib.util
+import shutil
+import tempfile
+import unittest
+
+from pathlib import Path
+
+from emodpy_malaria.serialization.population_tables import TABLES, extract
+from dtk_fixtures import human_id, make_dtk
+
+
+@unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+class PopulationTablesTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.test_dir = Path(tempfile.mkdtemp(suffix="emodpy_malaria_unittests"))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    @staticmethod
+    def read(paths: dict) -> dict:
+        import pyarrow.parquet as pq
+        return {table: pq.read_table(path) for table, path in paths.items()}
+
+    def test_extract_all_tables(self):
+        for version in [2, 4, 6]:
+            with self.subTest(version=version):
+                source = make_dtk(self.test_dir.joinpath(f"genetics-v{version}.dtk"), version, node_ids=[1, 2, 3],
+                                  humans_per_node=20, genome_length=8)
+                tables = self.read(extract(source, self.test_dir.joinpath(f"v{version}")))
+                self.assertEqual(sorted(tables), sorted(TABLES))
+                for table, arrow_table in tables.items():
+                    self.assertEqual(arrow_table.column_names, [c[0] for c in TABLES[table]])
+
+                humans = tables["humans"].to_pandas()
+                self.assertEqual(len(humans), 60)
+                self.assertEqual(humans.groupby("node_id").size().to_dict(), {1: 20, 2: 20, 3: 20})
+                self.assertEqual(len(tables["drugs"]), 0)
+                # Parasite genomes can be joined with the genome map.
+                genome_hashes = set(tables["genomes"].column("genome_hash").to_pylist())
+                parasites = tables["vector_parasites"].to_pandas()
+                self.assertGreater(len(parasites), 0)
+                self.assertTrue(set(parasites.female_genome_hash).issubset(genome_hashes))
+                self.assertEqual(sorted(set(parasites.stage)), ["oocyst", "sporozoite"])
+
+    def test_extract_projection_jobs(self):
+        source = make_dtk(self.test_dir.joinpath("state.dtk"), 6, node_ids=[1, 2, 3, 4, 5])
+        columns = {"humans": ["human_id", "node_id", "is_infected"], "vectors": ["state", "node_id"]}
+        results = []
+        for jobs in [1, 3]:
+            paths = extract(source, self.test_dir.joinpath(f"jobs-{jobs}"), tables=["humans", "vectors"],
+                            columns=columns, jobs=jobs)
+            self.assertEqual(sorted(paths), ["humans", "vectors"])
+            results.append(self.read(paths))
+
+        for table in ["humans", "vectors"]:
+            self.assertEqual(results[0][table].column_names, columns[table])
+            self.assertTrue(results[0][table].equals(results[1][table]))
+        humans = results[0]["humans"].to_pandas()
+        self.assertEqual(humans.human_id.tolist()[:3], [human_id(1, i) for i in range(3)])
+        self.assertEqual(humans.node_id.unique().tolist(), [1, 2, 3, 4, 5])
+
+        with self.assertRaises(ValueError):
+            extract(source, self.test_dir.joinpath("unknown"), columns={"humans": ["height"]})
+
+    def test_extract_large_node_ids(self):
+        # EMOD node ids are unsigned 32 bit integers, above the int32 range for e.g. lat/lon based ids
+        node_ids = [2 ** 31 + 5, 4000000000]
+        source = make_dtk(self.test_dir.joinpath("large_ids.dtk"), 6, node_ids=node_ids, humans_per_node=10)
+        tables = self.read(extract(source, self.test_dir.joinpath("large_ids"), tables=["humans", "vectors"]))
+        for arrow_table in tables.values():
+            self.assertEqual(str(arrow_table.schema.field("node_id").type), "uint32")
+            self.assertEqual(sorted(set(arrow_table.column("node_id").to_pylist())), node_ids)
+
+    def test_extract_failure_removes_output(self):
+        out_dir = self.test_dir.joinpath("missing")
+        with self.assertRaises(FileNotFoundError):
+            extract(self.test_dir.joinpath("missing.dtk"), out_dir)
+        self.assertFalse(out_dir.exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
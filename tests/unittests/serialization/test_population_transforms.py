@@ -0,0 +1,76 @@
+import dataclasses
+import shutil
+import tempfile
+import unittest
+
+from pathlib import Path
+
+from emodpy_malaria.serialization import CallbackTransform, ZeroInfectionsTransform, scan_population, \
+    transform_population
+from dtk_fixtures import human_id, make_dtk, read_population
+
+GENOME_LENGTH = 12
+
+
+def remove_odd_humans(human, node):
+    return human["suid"]["id"] % 2 == 0
+
+
+def count_infections(infection, human, node):
+    pass
+
+
+class PopulationTransformTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.test_dir = Path(tempfile.mkdtemp(suffix="emodpy_malaria_unittests"))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def genetics_file(self, version: int) -> Path:
+        return make_dtk(self.test_dir.joinpath(f"genetics-v{version}.dtk"), version, node_ids=[1, 2, 3, 4],
+                        humans_per_node=40, genome_length=GENOME_LENGTH)
+
+    @staticmethod
+    def counts(reports) -> list:
+        return [{k: v for k, v in dataclasses.asdict(r).items() if k != "seconds"} for r in reports]
+
+    def test_transform_population_jobs(self):
+        for version in [2, 4, 6]:
+            with self.subTest(version=version):
+                source = make_dtk(self.test_dir.joinpath(f"state-v{version}.dtk"), version)
+                outputs, all_reports = [], []
+                for jobs in [1, 2]:
+                    transforms = [ZeroInfectionsTransform(ignore_nodes=[2], keep_individuals=[human_id(1, 2)]),
+                                  CallbackTransform(on_human=remove_odd_humans)]
+                    output = self.test_dir.joinpath(f"state-v{version}-{jobs}.dtk")
+                    all_reports.append(self.counts(transform_population(source, output, transforms, jobs=jobs)))
+                    outputs.append(read_population(output))
+
+                self.assertEqual(outputs[0], outputs[1])
+                self.assertEqual(all_reports[0], all_reports[1])
+                nodes = outputs[0][0]
+                self.assertEqual(list(nodes), ["1", "2", "3"])
+                # Node 2 is only skipped by the zeroing transform, humans are removed from all nodes.
+                self.assertTrue(all([h["suid"]["id"] % 2 == 0 for n in nodes.values() for h in n[0]]))
+                self.assertEqual([r["removed_humans"] for r in all_reports[0]], [25, 25, 25])
+                infected = {n: [h["suid"]["id"] for h in nodes[n][0] if h["m_is_infected"]] for n in nodes}
+                self.assertTrue(set(infected["1"]).issubset({human_id(1, 2)}))
+                self.assertEqual(infected["3"], [])
+                self.assertGreater(len(infected["2"]), 0)
+
+    def test_scan_population(self):
+        source = self.genetics_file(6)
+        source_bytes = source.read_bytes()
+        for jobs in [1, 3]:
+            reports = scan_population(source, [CallbackTransform(on_infection=count_infections)], jobs=jobs)
+            expected = read_population(source)[0]
+            self.assertEqual([r.node_id for r in reports], [1, 2, 3, 4])
+            self.assertEqual([r.infections for r in reports],
+                             [sum([len(h["infections"]) for h in expected[str(n)][0]]) for n in range(1, 5)])
+        self.assertEqual(source.read_bytes(), source_bytes)
+
+
+if __name__ == '__main__':
+    unittest.main()
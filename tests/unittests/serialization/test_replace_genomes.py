@@ -0,0 +1,220 @@
+import json
+import pickle
+import numpy as np
+import random
+import shutil
+import tempfile
+import unittest
+
+from pathlib import Path
+from unittest import mock
+
+import emod_api.serialization.SerializedPopulation as SerPop
+
+from emodpy_malaria.serialization import ReplaceGenomesTransform, transform_population
+from emodpy_malaria.serialization.replace_genomes import AlleleFrequencySampler, Genome, _BarcodeStream, \
+    replace_genomes
+from dtk_fixtures import make_dtk, read_population
+
+GENOME_LENGTH = 12
+
+
+class CyclicBarcodes:
+    """Barcode function returning barcodes of a small pool in turn, so genomes repeat."""
+
+    def __init__(self, count: int = 7, seed: int = 3):
+        rng = random.Random(seed)
+        self.barcodes = ["".join(rng.choice("ACGT") for _ in range(GENOME_LENGTH)) for _ in range(count)]
+        self.position = 0
+
+    def __call__(self):
+        barcode = self.barcodes[self.position % len(self.barcodes)]
+        self.position += 1
+        return barcode
+
+
+def wrap_int32(value: int) -> int:
+    return (value + 2 ** 31) % 2 ** 32 - 2 ** 31
+
+
+def scalar_genome(barcode: str, allele_root_id: int) -> dict:
+    """Genome of a barcode, computed one nucleotide at a time as ParasiteGenome does."""
+    nucleotides = ["ACGT".index(ch) for ch in barcode]
+    hash_code, barcode_hash_code = 17, 17
+    for value in nucleotides:
+        barcode_hash_code = wrap_int32(31 * barcode_hash_code + value)
+        hash_code = wrap_int32(31 * hash_code + value)
+        hash_code = wrap_int32(31 * hash_code + allele_root_id)
+    return {"__class__": "ParasiteGenomeInner", "m_HashCode": hash_code, "m_BarcodeHashcode": barcode_hash_code,
+            "m_NucleotideSequence": nucleotides, "m_AlleleRoots": [allele_root_id] * len(nucleotides)}
+
+
+def reference_replace_genomes(file_path: Path, next_barcode) -> tuple:
+    """Replaces genomes in memory, one genome at a time. Returns nodes (humans and vectors) and the genome map."""
+    ser_pop = SerPop.SerializedPopulation(str(file_path))
+    genome_map, cache = [], {}
+
+    def next_genome(allele_root_id):
+        key = (next_barcode(), allele_root_id)
+        if key not in cache:
+            cache[key] = scalar_genome(*key)
+            genome_map.append({"key": cache[key]["m_HashCode"], "value": cache[key]})
+        return {"m_pInner": cache[key]}
+
+    nodes = {}
+    for node in ser_pop.nodes:
+        humans = list(node.individualHumans)
+        for human in humans:
+            for infection in human["infections"]:
+                infection["infection_strain"]["m_Genome"] = next_genome(human["suid"]["id"])
+        for vector_population in node["m_vectorpopulations"]:
+            for vector in vector_population["AdultQueues"]["collection"]:
+                for cohort in vector["m_OocystCohorts"] + vector["m_SporozoiteCohorts"]:
+                    cohort["m_MaleGametocyteGenome"] = next_genome(-999)
+                    cohort["m_pStrainIdentity"]["m_Genome"] = next_genome(-999)
+        nodes[node.externalId] = (humans, node["m_vectorpopulations"])
+
+    return nodes, genome_map
+
+
+class ReplaceGenomesTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.test_dir = Path(tempfile.mkdtemp(suffix="emodpy_malaria_unittests"))
+        self.frequencies = [[0.1, 0.2, 0.3, 0.4]] * GENOME_LENGTH
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def genetics_file(self, version: int) -> Path:
+        return make_dtk(self.test_dir.joinpath(f"genetics-v{version}.dtk"), version, node_ids=[1, 2, 3, 4],
+                        humans_per_node=40, genome_length=GENOME_LENGTH)
+
+    def test_create_genomes_matches_scalar_hashes(self):
+        rng = random.Random(5)
+        # Long barcodes and large allele root ids overflow int32 many times.
+        barcodes = ["".join(rng.choice("ACGT") for _ in range(length)) for length in [1, 12, 12, 40, 100]]
+        allele_root_ids = [-999, 0, 123456789, 2 ** 31 - 1, -(2 ** 31)]
+        genomes = Genome.create_genomes(barcodes, allele_root_ids)
+        for barcode, allele_root_id, genome in zip(barcodes, allele_root_ids, genomes):
+            self.assertEqual(genome.to_dtk_dict()["m_pInner"], scalar_genome(barcode, allele_root_id))
+            self.assertEqual(genome.barcode, barcode)
+
+        nucleotides = Genome.convert_barcodes_to_ints(barcodes[1:3])
+        self.assertEqual(nucleotides.tolist(), [["ACGT".index(ch) for ch in barcode] for barcode in barcodes[1:3]])
+        hash_codes, barcode_hash_codes = Genome.hash_nucleotides(nucleotides, -999)
+        self.assertEqual(hash_codes.dtype, np.int32)
+        self.assertEqual(hash_codes.tolist(), [scalar_genome(b, -999)["m_HashCode"] for b in barcodes[1:3]])
+        self.assertEqual(barcode_hash_codes.tolist(),
+                         [scalar_genome(b, -999)["m_BarcodeHashcode"] for b in barcodes[1:3]])
+        with self.assertRaises(Exception):
+            Genome.convert_barcodes_to_ints(["ACGT", "ACGN"])
+
+    def test_replace_genomes_matches_scalar_reference(self):
+        for version in [2, 4, 6]:
+            with self.subTest(version=version):
+                source = self.genetics_file(version)
+                output = self.test_dir.joinpath(f"replaced-v{version}.dtk")
+                replace_genomes(source, CyclicBarcodes(), output)
+                nodes, genome_map = json.loads(json.dumps(reference_replace_genomes(source, CyclicBarcodes())))
+
+                replaced_nodes, replaced_genome_map = read_population(output)
+                self.assertEqual(replaced_nodes, {str(k): v for k, v in nodes.items()})
+                self.assertEqual(replaced_genome_map, genome_map)
+                self.assertEqual(len({entry["key"] for entry in genome_map}), len(genome_map))
+
+
+    def test_allele_frequency_sampler(self):
+        frequencies = [[1, 0, 0, 0], [0, 0, 2, 2], [1, 1, 1, 1]]
+        barcodes = AlleleFrequencySampler(frequencies, seed=7).next_barcodes(500).tolist()
+        self.assertTrue(all([b[0] == "A" and b[1] in "GT" for b in barcodes]))
+        self.assertEqual(set([b[2] for b in barcodes]), set("ACGT"))
+
+        # Drawing in bulk or one at a time gives the same barcodes.
+        sampler = AlleleFrequencySampler(frequencies, seed=7)
+        self.assertEqual([sampler() for _ in range(10)], barcodes[:10])
+
+        sampler = AlleleFrequencySampler(frequencies, seed=7)
+        substreams = [sampler.substream(key).next_barcodes(20).tolist() for key in [1, 2, 1]]
+        self.assertEqual(substreams[0], substreams[2])
+        self.assertNotEqual(substreams[0], substreams[1])
+        self.assertEqual(sampler.next_barcodes(10).tolist(), barcodes[:10])
+
+        for invalid in [[[0.5, 0.5]], [[0, 0, 0, 0]], [[-1, 1, 1, 1]]]:
+            with self.assertRaises(Exception):
+                AlleleFrequencySampler(invalid)
+
+    def test_barcode_stream(self):
+        sampler = AlleleFrequencySampler(self.frequencies, seed=3)
+        expected = AlleleFrequencySampler(self.frequencies, seed=3).next_barcodes(20).tolist()
+        with mock.patch.object(sampler, "next_barcodes", wraps=sampler.next_barcodes) as next_barcodes:
+            stream = _BarcodeStream(sampler, block_size=4)
+            barcodes = stream.take(3) + stream.take(0) + stream.take(6) + stream.take(1)
+        self.assertEqual(barcodes, expected[:10])
+        self.assertEqual([c.args for c in next_barcodes.call_args_list], [(4,), (5,), (4,)])
+
+        function = CyclicBarcodes()
+        stream = _BarcodeStream(function)
+        self.assertEqual(stream.take(3) + stream.take(5), CyclicBarcodes().barcodes + CyclicBarcodes().barcodes[:1])
+
+    def test_replace_genomes_batches(self):
+        # Genomes are created once per batch: humans of a node (version 6: of a human collection) and vectors of a
+        # node.
+        for version, human_batches in [(4, 4), (6, 8)]:
+            with self.subTest(version=version):
+                source = self.genetics_file(version)
+                output = self.test_dir.joinpath(f"sampled-v{version}.dtk")
+                with mock.patch.object(Genome, "create_genomes", wraps=Genome.create_genomes) as create_genomes:
+                    replace_genomes(source, AlleleFrequencySampler(self.frequencies, seed=42), output)
+                self.assertEqual(create_genomes.call_count, human_batches + 4)
+
+                nodes, genome_map = read_population(output)
+                keys = {entry["key"] for entry in genome_map}
+                self.assertEqual(len(keys), len(genome_map))
+                for humans, _ in nodes.values():
+                    for human in humans:
+                        for infection in human["infections"]:
+                            self.assertIn(infection["infection_strain"]["m_Genome"]["m_pInner"]["m_HashCode"], keys)
+
+    def test_sampler_jobs_byte_identical(self):
+        for version in [4, 6]:
+            with self.subTest(version=version):
+                source = self.genetics_file(version)
+                outputs = []
+                with mock.patch("emodpy_malaria.serialization.dtk_chunks.time.strftime", return_value="today"):
+                    for jobs in [1, 3]:
+                        output = self.test_dir.joinpath(f"sampled-v{version}-{jobs}.dtk")
+                        replace_genomes(source, AlleleFrequencySampler(self.frequencies, seed=42), output, jobs=jobs)
+                        outputs.append(output.read_bytes())
+
+                self.assertEqual(outputs[0], outputs[1])
+                nodes, genome_map = read_population(self.test_dir.joinpath(f"sampled-v{version}-1.dtk"))
+                keys = {entry["key"] for entry in genome_map}
+                self.assertEqual(len(keys), len(genome_map))
+                for humans, _ in nodes.values():
+                    for human in humans:
+                        for infection in human["infections"]:
+                            self.assertIn(infection["infection_strain"]["m_Genome"]["m_pInner"]["m_HashCode"], keys)
+
+    def test_replace_genomes_transform_pickle(self):
+        transform = ReplaceGenomesTransform(AlleleFrequencySampler(self.frequencies, seed=1))
+        transform.merge_node([{"key": 1, "value": {}}, {"key": 2, "value": {}}])
+        node_copy = pickle.loads(pickle.dumps(transform))
+        self.assertEqual(node_copy.genome_map, [])
+        self.assertEqual(node_copy._hash_codes, set())
+        self.assertEqual(len(transform.genome_map), 2)
+        self.assertLess(len(pickle.dumps(transform)), len(pickle.dumps(transform.__dict__)))
+
+    def test_replace_genomes_transform_pickle_requires_substreams(self):
+        source = self.genetics_file(4)
+        transform = ReplaceGenomesTransform(CyclicBarcodes())
+        with self.assertRaisesRegex(Exception, "per-node substreams"):
+            pickle.dumps(transform)
+        with self.assertRaisesRegex(Exception, "per-node substreams"):
+            transform_population(source, self.test_dir.joinpath("cyclic.dtk"), [transform], jobs=2)
+        with self.assertRaisesRegex(Exception, "per-node substreams"):
+            replace_genomes(source, CyclicBarcodes(), self.test_dir.joinpath("cyclic.dtk"), jobs=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
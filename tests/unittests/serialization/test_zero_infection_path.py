@@ -0,0 +1,107 @@
+import shutil
+import tempfile
+import unittest
+
+from pathlib import Path
+from unittest import mock
+
+import emod_api.serialization.SerializedPopulation as SerPop
+
+from emodpy_malaria.serialization.zero_infections import UNINFECTED_HUMAN, _get_paths, zero_infection_path, \
+    zero_infections
+from dtk_fixtures import make_dtk
+
+
+class ZeroInfectionPathTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.test_dir = Path(tempfile.mkdtemp(suffix="emodpy_malaria_unittests"))
+        self.sim_dirs = [self.test_dir.joinpath(f"sim{i}") for i in range(2)]
+        for sim_dir, version in zip(self.sim_dirs, [4, 6]):
+            sim_dir.mkdir()
+            for day in ["0010", "0020", "0030"]:
+                make_dtk(sim_dir.joinpath(f"state-{day}.dtk"), version, humans_per_node=10, seed=int(day))
+        # An input which is already zeroed, and a file with 'zero' in its name
+        shutil.copy(self.sim_dirs[1].joinpath("state-0020.dtk"), self.sim_dirs[1].joinpath("state-0020_zero.dtk"))
+        shutil.copy(self.sim_dirs[0].joinpath("state-0010.dtk"), self.sim_dirs[0].joinpath("zero-0010.dtk"))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    @staticmethod
+    def infected_count(file_path: Path) -> int:
+        ser_pop = SerPop.SerializedPopulation(str(file_path))
+        return len([h for node in ser_pop.nodes for h in node.individualHumans
+                    if any([h[key] != value for key, value in UNINFECTED_HUMAN.items()])])
+
+    def expected_paths(self):
+        paths = [self.sim_dirs[0].joinpath("state-0010.dtk"), self.sim_dirs[0].joinpath("state-0020.dtk"),
+                 self.sim_dirs[1].joinpath("state-0010.dtk")]
+        return [[path, path.with_name(f"{path.stem}_zero.dtk")] for path in paths]
+
+    def test_get_paths(self):
+        self.assertEqual(_get_paths(self.sim_dirs, ["0010", "0020"]), self.expected_paths())
+
+    def test_zero_infection_path(self):
+        zeroed = self.sim_dirs[1].joinpath("state-0020_zero.dtk")
+        zeroed_bytes = zeroed.read_bytes()
+        for jobs in [1, 2]:
+            with self.subTest(jobs=jobs):
+                results = zero_infection_path(self.sim_dirs, ["0010", "0020"], jobs=jobs)
+                self.assertEqual([r[:2] for r in results], self.expected_paths())
+                for in_path, out_path, in_size, out_size, seconds in results:
+                    self.assertEqual(in_size, in_path.stat().st_size)
+                    self.assertEqual(out_size, out_path.stat().st_size)
+                    self.assertGreaterEqual(seconds, 0)
+                    self.assertGreater(self.infected_count(in_path), 0)
+                    self.assertEqual(self.infected_count(out_path), 0)
+                self.assertEqual(zeroed.read_bytes(), zeroed_bytes)
+
+                # All outputs exist now, so nothing is processed again.
+                self.assertEqual(zero_infection_path(self.sim_dirs, ["0010", "0020"], jobs=jobs), [])
+                for _, out_path in self.expected_paths():
+                    out_path.unlink()
+
+    def test_zero_infection_path_failures(self):
+        failing = self.sim_dirs[0].joinpath("state-0020.dtk")
+        failing.write_bytes(b"IDTK not a serialized population")
+        for jobs in [1, 2]:
+            with self.subTest(jobs=jobs):
+                with self.assertRaisesRegex(RuntimeError, "failed for 1 of 3 file"):
+                    zero_infection_path(self.sim_dirs, ["0010", "0020"], jobs=jobs)
+                # The other files are zeroed, nothing is left behind for the failed file.
+                self.assertFalse(failing.with_name("state-0020_zero.dtk").exists())
+                self.assertEqual(list(self.test_dir.glob("**/.*.tmp")), [])
+                for in_path, out_path in self.expected_paths():
+                    if in_path != failing:
+                        self.assertEqual(self.infected_count(out_path), 0)
+                        out_path.unlink()
+
+    def test_zero_infections_version_1(self):
+        source = make_dtk(self.test_dir.joinpath("state-v1.dtk"), 1)
+        destination = self.test_dir.joinpath("output", "state-v1_zero.dtk")
+        zero_infections(source, destination, ignore_nodes=[3], keep_individuals=[])
+        ser_pop = SerPop.SerializedPopulation(str(destination))
+        infected = [len([h for h in node.individualHumans if h.m_is_infected]) for node in ser_pop.nodes]
+        self.assertEqual(infected[:2], [0, 0])
+        self.assertGreater(infected[2], 0)     # ignored node
+
+    def test_zero_infections_failed_write(self):
+        # A partial output would be skipped as already zeroed by zero_infection_path.
+        def write_partial(ser_pop, output_file):
+            Path(output_file).write_bytes(b"IDTK")
+            raise OSError("No space left on device")
+
+        source = make_dtk(self.test_dir.joinpath("state-0040.dtk"), 1)
+        destination = self.test_dir.joinpath("state-0040_zero.dtk")
+        with mock.patch.object(SerPop.SerializedPopulation, "write", write_partial):
+            with self.assertRaises(OSError):
+                zero_infections(source, destination, ignore_nodes=[], keep_individuals=[])
+        self.assertEqual([p.name for p in self.test_dir.iterdir() if p.is_file()], ["state-0040.dtk"])
+
+        zero_infections(source, destination, ignore_nodes=[], keep_individuals=[])
+        self.assertEqual(self.infected_count(destination), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
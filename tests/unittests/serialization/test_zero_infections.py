@@ -0,0 +1,110 @@
+import json
+import shutil
+import tempfile
+import unittest
+
+from pathlib import Path
+
+import emod_api.serialization.SerializedPopulation as SerPop
+import emod_api.serialization.dtkFileSupport as dtk
+
+from emodpy_malaria.serialization.zero_infections import UNINFECTED_HUMAN, zero_human_infections, zero_infections
+from dtk_fixtures import STATE_ADULT, STATE_INFECTED, STATE_INFECTIOUS, human_id, make_dtk
+
+
+class ZeroInfectionsTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.test_dir = Path(tempfile.mkdtemp(suffix="emodpy_malaria_unittests"))
+        self.keep_ids = [human_id(1, 1), human_id(2, 7)]
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    @staticmethod
+    def read_nodes(file_path: Path) -> dict:
+        """Returns node ids and (humans, vector populations) of a serialized population file."""
+        ser_pop = SerPop.SerializedPopulation(str(file_path))
+        return {node.externalId: (list(node.individualHumans), node.m_vectorpopulations) for node in ser_pop.nodes}
+
+    @staticmethod
+    def is_infected(human) -> bool:
+        return any([human[key] != value for key, value in UNINFECTED_HUMAN.items()])
+
+    def zero(self, version: int, remove: bool):
+        source = make_dtk(self.test_dir.joinpath(f"state-v{version}.dtk"), version)
+        destination = self.test_dir.joinpath("output", f"state-v{version}_zero.dtk")
+        zero_infections(source, destination, ignore_nodes=[3], keep_individuals=self.keep_ids, remove=remove)
+        return self.read_nodes(source), self.read_nodes(destination)
+
+    def test_zero_infections(self):
+        for version in [2, 4, 6]:
+            with self.subTest(version=version):
+                source, zeroed = self.zero(version, remove=False)
+                self.assertEqual(list(zeroed), [1, 2, 3])
+                self.assertEqual(zeroed[3], source[3])     # ignored node
+
+                for node_id in [1, 2]:
+                    humans, vector_populations = zeroed[node_id]
+                    source_humans = {h.suid.id: h for h in source[node_id][0]}
+                    for human in humans:
+                        if human.suid.id in self.keep_ids:
+                            self.assertEqual(human, source_humans[human.suid.id])
+                        else:
+                            self.assertFalse(self.is_infected(human))
+                    for queue in ["AdultQueues", "InfectedQueues", "InfectiousQueues"]:
+                        cohorts = vector_populations[0][queue]["collection"]
+                        self.assertEqual(len(cohorts), len(source[node_id][1][0][queue]["collection"]))
+                        self.assertTrue(all([c.state == STATE_ADULT and c.progress == 0.0 for c in cohorts]))
+                        self.assertTrue(all([c.m_pStrain["__class__"] == "nullptr" for c in cohorts]))
+
+    def test_zero_infections_remove(self):
+        for version in [2, 4, 6]:
+            with self.subTest(version=version):
+                source, zeroed = self.zero(version, remove=True)
+                self.assertEqual(zeroed[3], source[3])
+                for node_id in [1, 2]:
+                    vector_populations = zeroed[node_id][1]
+                    self.assertEqual(len(vector_populations[0]["AdultQueues"]["collection"]), 5)
+                    self.assertEqual(vector_populations[0]["InfectedQueues"]["collection"], [])
+                    self.assertEqual(vector_populations[0]["InfectiousQueues"]["collection"], [])
+                    states = [c.state for c in vector_populations[0]["AdultQueues"]["collection"]]
+                    self.assertNotIn(STATE_INFECTED, states)
+                    self.assertNotIn(STATE_INFECTIOUS, states)
+
+    def test_zero_infections_saves_node_chunks(self):
+        # Regression: for version 2 to 5 files, edits of nodes loaded with SerializedPopulation were not saved,
+        # so the output file still had all infections.
+        for version in [2, 4]:
+            with self.subTest(version=version):
+                source, zeroed = self.zero(version, remove=False)
+                self.assertGreater(len([h for h in source[1][0] if self.is_infected(h)]), 0)
+                infected = [h.suid.id for h in zeroed[1][0] + zeroed[2][0] if self.is_infected(h)]
+                self.assertTrue(set(infected).issubset(self.keep_ids))
+
+    def test_zero_human_infections_validates_first_human(self):
+        def infected_humans():
+            humans = [{"suid": {"id": i}, **UNINFECTED_HUMAN, "m_is_infected": True} for i in range(3)]
+            return json.loads(json.dumps(humans), object_hook=dtk.SerialObject)
+
+        humans = infected_humans()
+        del humans[0]["m_new_infection_state"]
+        with self.assertRaises(KeyError):
+            zero_human_infections(humans)
+
+        # Only the first zeroed human is validated, later humans get missing keys added.
+        humans = infected_humans()
+        del humans[2]["m_new_infection_state"]
+        zero_human_infections(humans)
+        self.assertEqual(humans[2]["m_new_infection_state"], 0)
+        self.assertFalse(any([h["m_is_infected"] for h in humans]))
+
+        # Kept humans are not validated.
+        humans = infected_humans()
+        del humans[0]["m_new_infection_state"]
+        zero_human_infections(humans, keep_ids=[0])
+        self.assertTrue(humans[0]["m_is_infected"])
+        self.assertFalse(humans[1]["m_is_infected"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+import hashlib
+import shutil
+import tempfile
+import unittest
+import uuid
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List
+
+from emodpy_malaria.weather import *
+
+
+class LocalAsset:
+    """Stand-in for a COMPS asset, downloaded from a local file. The first 'fail_count' downloads are interrupted."""
+    def __init__(self, file_path: Path, fail_count: int = 0, checksum: str = None):
+        self.file_path = file_path
+        self.filename = file_path.name
+        self.length = file_path.stat().st_size
+        self.checksum = checksum or hashlib.md5(file_path.read_bytes()).hexdigest()
+        self.fail_count = fail_count
+        self.resume_positions = []
+
+    @property
+    def download_count(self):
+        return len(self.resume_positions)
+
+    def download_generator_hook(self, chunk_size: int = 128, resume_byte_pos: int = None):
+        self.resume_positions.append(resume_byte_pos or 0)
+        content = self.file_path.read_bytes()
+        start = resume_byte_pos or 0
+        end = start + (len(content) - start) // 2 if self.fail_count > 0 else len(content)
+        for i in range(start, end, chunk_size):
+            yield content[i:min(i + chunk_size, end)]
+
+        if end < len(content):
+            self.fail_count -= 1
+            raise ConnectionError("Connection lost.")
+
+
+class LocalPlatform:
+    """Stand-in for COMPS platform, serving weather files from a local dir as an asset collection."""
+    endpoint = "local"
+
+    def __init__(self, asset_dir: Path):
+        self.assets: List[LocalAsset] = [LocalAsset(f) for f in sorted(asset_dir.glob("dtk_15arcmin_*.bin*"))]
+
+    def get_item(self, item_id, item_type):
+        return self.assets
+
+    @property
+    def download_count(self):
+        return sum([a.download_count for a in self.assets])
+
+
+class LocalWeatherRequest(WeatherRequest):
+    """Weather request running work items on the local stand-in platform."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.work_item_count = 0
+
+    def _run_work_item(self, weather_args: WeatherArgs, request_name: str = None) -> str:
+        self.work_item_count += 1
+        return str(uuid.uuid4())
+
+
+def put_entry(cache_dir: Path, key: str, files: List[Path]):
+    """Adds a cache entry from another process."""
+    WeatherCache(cache_dir=cache_dir).put(key=key, files=files, data_id=f"id-{key}")
+
+
+class WeatherCacheTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.current_dir: Path = Path(__file__).parent
+        self.sites_csv: Path = self.current_dir.joinpath("ssmt/sites.csv")
+        self.weather_dir: Path = self.current_dir.joinpath("case_default_names_all")
+        self.test_dir: Path = Path(tempfile.mkdtemp(suffix="emodpy_malaria_unittests"))
+        self.cache = WeatherCache(cache_dir=self.test_dir.joinpath("cache"))
+        self.platform = LocalPlatform(asset_dir=self.weather_dir)
+        self.wa = WeatherArgs(site_file=self.sites_csv, start_date=2015, node_column="nodes")
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_make_key(self):
+        key = WeatherCache.make_key(self.wa, "ERA5")
+        self.assertEqual(key, WeatherCache.make_key(self.wa, "ERA5"))
+        self.assertNotEqual(key, WeatherCache.make_key(self.wa, "ERA5-LAND"))
+        wa2 = WeatherArgs(site_file=self.sites_csv, start_date=2016, node_column="nodes")
+        self.assertNotEqual(key, WeatherCache.make_key(wa2, "ERA5"))
+
+        # The same site file content in a different dir
+        sites_csv = self.test_dir.joinpath("sites.csv")
+        shutil.copy(self.sites_csv, sites_csv)
+        wa3 = WeatherArgs(site_file=sites_csv, start_date=2015, node_column="nodes")
+        self.assertEqual(key, WeatherCache.make_key(wa3, "ERA5"))
+
+    def test_put_get(self):
+        files = [f.file_path for f in self.platform.assets]
+        self.cache.put(key="a", files=files, data_id="id-a")
+        self.assertTrue(self.cache.contains("a"))
+        self.assertEqual(self.cache.find("id-a"), "a")
+        self.assertEqual(self.cache.size, sum([f.stat().st_size for f in files]))
+
+        target_dir = self.test_dir.joinpath("target")
+        placed = self.cache.get(key="a", target_dir=target_dir)
+        self.assertEqual(len(placed), len(files))
+        for f in files:
+            self.assertEqual(f.read_bytes(), target_dir.joinpath(f.name).read_bytes())
+
+        self.assertIsNone(self.cache.get(key="b", target_dir=target_dir))
+        self.assertEqual(WeatherSet.from_files(target_dir), WeatherSet.from_files(self.weather_dir))
+
+    def test_get_does_not_share_files(self):
+        files = [f.file_path for f in self.platform.assets]
+        for link in [False, True]:
+            cache = WeatherCache(cache_dir=self.test_dir.joinpath(f"cache-{link}"), link=link)
+            cache.put(key="a", files=files)
+            target_dir = self.test_dir.joinpath(f"target-{link}")
+            cache.get(key="a", target_dir=target_dir)
+
+            # Saving weather files over placed files must not change cached files, also when they are hardlinked.
+            ws = WeatherSet.from_files(target_dir)
+            for wd in ws.values():
+                wd.data[:] = 0
+            ws.to_files(target_dir)
+            for f in files:
+                self.assertEqual(f.read_bytes(), cache.cache_dir.joinpath("a", f.name).read_bytes())
+            self.assertEqual(WeatherSet.from_files(cache.cache_dir.joinpath("a")), WeatherSet.from_files(self.weather_dir))
+
+    def test_put_from_processes(self):
+        files = [f.file_path for f in self.platform.assets]
+        keys = [f"k{i}" for i in range(8)]
+        with ProcessPoolExecutor(max_workers=4) as executor:
+            list(executor.map(put_entry, [self.cache.cache_dir] * len(keys), keys, [files] * len(keys)))
+
+        self.assertEqual(sorted(self.cache.keys), keys)
+        self.assertTrue(all([self.cache.contains(k) for k in keys]))
+        self.assertEqual(self.cache.find("id-k3"), "k3")
+
+    def test_evict_lru(self):
+        files = [f.file_path for f in self.platform.assets]
+        size = sum([f.stat().st_size for f in files])
+        cache = WeatherCache(cache_dir=self.test_dir.joinpath("lru"), max_size=2 * size)
+        cache.put(key="a", files=files)
+        cache.put(key="b", files=files)
+        cache.get(key="a", target_dir=self.test_dir.joinpath("target"))
+        cache.put(key="c", files=files)
+        self.assertEqual(cache.keys, ["a", "c"])
+        self.assertFalse(cache.cache_dir.joinpath("b").exists())
+        self.assertEqual(cache.size, 2 * size)
+
+        cache.clear()
+        self.assertEqual(cache.keys, [])
+        self.assertEqual(cache.size, 0)
+
+    def test_request_generate_cached(self):
+        wr1 = LocalWeatherRequest(platform=self.platform, local_dir=self.test_dir.joinpath("wr1"), cache=self.cache)
+        wr1.generate(weather_args=self.wa).download()
+        self.assertEqual(wr1.work_item_count, 1)
+        self.assertEqual(len(wr1.report.download["ok"]), len(self.platform.assets))
+        self.assertEqual(len(self.cache.keys), 1)
+
+        # The same weather arguments in a new local dir, files are placed from the cache.
+        download_count = self.platform.download_count
+        wr2 = LocalWeatherRequest(platform=self.platform, local_dir=self.test_dir.joinpath("wr2"), cache=self.cache)
+        wr2.generate(weather_args=self.wa).download()
+        self.assertEqual(wr2.work_item_count, 0)
+        self.assertEqual(wr2.data_id, wr1.data_id)
+        self.assertTrue(wr2.files_exist)
+        self.assertEqual(self.platform.download_count, download_count)
+        self.assertEqual(WeatherSet.from_files(wr1.local_dir), WeatherSet.from_files(wr2.local_dir))
+
+        # Forced request runs a new work item.
+        wr3 = LocalWeatherRequest(platform=self.platform, local_dir=self.test_dir.joinpath("wr3"), cache=self.cache)
+        wr3.generate(weather_args=self.wa, force=True)
+        self.assertEqual(wr3.work_item_count, 1)
+
+    def test_request_download_cached(self):
+        data_id = str(uuid.uuid4())
+        wr1 = WeatherRequest(platform=self.platform, local_dir=self.test_dir.joinpath("wr1"), cache=self.cache)
+        wr1.download(data_id=data_id)
+        self.assertEqual(self.cache.find(data_id), WeatherCache.make_data_key(data_id))
+
+        download_count = self.platform.download_count
+        wr2 = WeatherRequest(platform=self.platform, cache=self.cache)
+        wr2.download(data_id=data_id, local_dir=self.test_dir.joinpath("wr2"))
+        self.assertEqual(self.platform.download_count, download_count)
+        self.assertEqual(len(wr2.report.download["cache"]), len(self.platform.assets))
+        self.assertTrue(wr2.files_exist)
+
+
+if __name__ == '__main__':
+    unittest.main()
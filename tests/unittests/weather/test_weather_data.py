@@ -9,6 +9,7 @@ from typing import Dict, List
 
 from emodpy_malaria.weather.weather_metadata import WeatherMetadata, WeatherAttributes
 from emodpy_malaria.weather.weather_data import WeatherData, DataFrameInfo
+from emodpy_malaria.weather.weather_utils import unique_series
 from test_weather_metadata import read_metafile
 
 
@@ -101,6 +102,35 @@ class WeatherDataTests(unittest.TestCase):
         self.assertEqual(wd.data.shape, (wm.series_count, wm.series_len))
         self.assertTrue(np.array_equal(expected_data, wd.data.reshape(-1)))
 
+    def test_open_mmap(self):
+        wd1: WeatherData = WeatherData.from_file(self.case_dtk_data_file)
+        wd2: WeatherData = WeatherData.open(self.case_dtk_data_file)
+
+        self.assertIsInstance(wd2.data, np.memmap)
+        self.assertEqual(wd1, wd2)
+
+        data_dict = wd1.to_dict()
+        for node, series in data_dict.items():
+            self.assertTrue(np.array_equal(series, wd2.series(node)))
+
+        with self.assertRaises(KeyError):
+            wd2.series(max(data_dict) + 1)
+
+    def test_slice(self):
+        wd = WeatherData.from_dict(node_series=self.repeated_node_series)
+        actual = wd.slice(nodes=[30, 20], start_step=1)
+        expected = np.array([[2., 3.], [5., 6.]], dtype=np.float32)
+        self.assertTrue(np.array_equal(actual, expected))
+        self.assertEqual(wd.slice().shape, (3, 3))
+
+    def test_node_groups(self):
+        wd = WeatherData.from_dict(node_series=self.repeated_node_series)
+        groups = list(wd.node_groups())
+        self.assertEqual(len(groups), 2)
+        self.assertSequenceEqual(groups[0][0], [10, 30])
+        self.assertSequenceEqual(groups[1][0], [20])
+        self.assertTrue(np.array_equal(groups[1][1], np.array([4., 5., 6.], dtype=np.float32)))
+
     def test_to_dict(self):
         wd1 = WeatherData.from_dict(node_series=self.repeated_node_series)
         data_dict1 = wd1.to_dict()
@@ -273,6 +303,25 @@ class WeatherDataTests(unittest.TestCase):
             with self.assertRaises(ValueError):
                 WeatherData.from_dataframe(df)
 
+    def test_from_dataframe_unsorted(self):
+        df = pd.DataFrame({"nodes": [20, 10, 20, 10], "steps": [2, 2, 1, 1], "values": [4., 2., 3., 1.]})
+        wd = WeatherData.from_dataframe(df)
+        self.assertSequenceEqual(wd.metadata.nodes, [10, 20])
+        self.assertTrue(np.array_equal(wd.data, np.array([[1., 2.], [3., 4.]], dtype=np.float32)))
+
+    def test_from_dataframe_invalid_series(self):
+        with self.assertRaises(ValueError):
+            df = pd.DataFrame({"nodes": [10, 10, 20], "steps": [1, 2, 1], "values": [1., 2., 3.]})
+            WeatherData.from_dataframe(df)
+
+        with self.assertRaises(ValueError):
+            df = pd.DataFrame({"nodes": [10, 10, 20, 20], "steps": [1, 1, 1, 2], "values": [1., 2., 3., 4.]})
+            WeatherData.from_dataframe(df)
+
+        with self.assertRaises(ValueError):
+            df = pd.DataFrame({"nodes": [10, 20], "steps": [1, 1], "values": ["a", "b"]})
+            WeatherData.from_dataframe(df)
+
     def test_from_dict_exceptions(self):
         with self.assertRaises(TypeError):
             WeatherData.from_dict([1, 2])
@@ -307,11 +356,83 @@ class WeatherDataTests(unittest.TestCase):
             d[10][0] = np.float64(np.finfo(np.float32).max) + one
             WeatherData.from_dict(node_series=d)
 
+    def test_from_dict_tolerance(self):
+        d = {10: [1.001, 2.], 20: [1.002, 2.], 30: [1.1, 2.]}
+        wd1 = WeatherData.from_dict(node_series=d)
+        self.assertEqual(wd1.data.shape[0], 3)
+
+        wd2 = WeatherData.from_dict(node_series=d, tolerance=0.01)
+        self.assertEqual(wd2.data.shape[0], 2)
+        self.assertEqual(wd2.metadata.node_offsets[10], wd2.metadata.node_offsets[20])
+        self.assertTrue(np.array_equal(wd2.data, np.array([d[10], d[30]], dtype=np.float32)))
+
+        with self.assertRaises(ValueError):
+            WeatherData.from_dict(node_series=d, tolerance=0)
+
+    def test_unique_series(self):
+        series = np.array([[3, 4], [1, 2], [3, 4], [1, 2], [5, 6]], dtype=np.float32)
+        unique_rows, inverse = unique_series(series)
+        self.assertSequenceEqual(unique_rows.tolist(), [0, 1, 4])
+        self.assertSequenceEqual(inverse.tolist(), [0, 1, 0, 1, 2])
+        self.assertTrue(np.array_equal(series[unique_rows][inverse], series))
+
     def test_from_dict_single_value(self):
         d = {10: [1.1]}
         wd = WeatherData.from_dict(node_series=d)
         self.assertTrue(np.array_equal(wd.data, np.array([[1.1]], dtype=np.float32)))
 
+    # Transformations
+
+    def test_transform_values(self):
+        wd = WeatherData.from_dict(node_series=self.repeated_node_series)
+        metadata = wd.metadata
+        wd.scale(2).offset(1).clip(max_value=12)
+        self.assertIs(wd.metadata, metadata)
+        self.assertTrue(np.array_equal(wd.series(30), np.array([3, 5, 7], dtype=np.float32)))
+        self.assertTrue(np.array_equal(wd.series(20), np.array([9, 11, 12], dtype=np.float32)))
+
+        wd.roll(1).apply(np.negative)
+        self.assertTrue(np.array_equal(wd.series(10), np.array([-7, -3, -5], dtype=np.float32)))
+        wd.offset([0, 1, 2])
+        self.assertTrue(np.array_equal(wd.series(10), np.array([-7, -2, -3], dtype=np.float32)))
+
+    def test_transform_apply_series_len(self):
+        wd = WeatherData.from_dict(node_series=self.repeated_node_series)
+        wd.apply(lambda data: data[:, :2])
+        self.assertEqual(wd.metadata.series_len, 2)
+        self.assertEqual(wd.metadata.node_offsets, {10: 0, 20: 8, 30: 0})
+        self.assertTrue(np.array_equal(wd.series(20), np.array([4, 5], dtype=np.float32)))
+
+    def test_resample(self):
+        wd = WeatherData.from_file(self.case_dtk_data_file)
+        wd2 = WeatherData.from_file(self.case_dtk_data_file).resample("month", how="mean")
+        self.assertEqual(wd2.metadata.series_len, 36)
+        self.assertEqual(wd2.metadata.update_resolution, "CLIMATE_UPDATE_MONTH")
+        self.assertEqual(wd2.metadata.nodes, wd.metadata.nodes)
+
+        # Compare to pandas monthly means of one node.
+        node = wd.metadata.nodes[5]
+        series = pd.Series(wd.series(node).astype(np.float64), index=pd.date_range("2010-01-01", periods=1096))
+        expected = series.groupby(series.index.to_period("M")).mean().to_numpy(dtype=np.float32)
+        self.assertTrue(np.allclose(wd2.series(node), expected))
+
+        wd3 = WeatherData.from_file(self.case_dtk_data_file).resample("year", how="sum")
+        self.assertTrue(np.allclose(wd3.series(node), [series[str(y)].sum() for y in [2010, 2011, 2012]]))
+
+    def test_select_years(self):
+        wd = WeatherData.from_file(self.case_dtk_data_file)
+        wd2 = WeatherData.from_file(self.case_dtk_data_file).select_years(2011, 2012)
+        self.assertEqual(wd2.metadata.series_len, 731)
+        self.assertEqual(wd2.metadata.data_years, "2011-2012")
+        self.assertEqual(wd2.metadata.attributes_dict["StartDayOfYear"], "January 1")
+        node = wd.metadata.nodes[0]
+        self.assertTrue(np.array_equal(wd2.series(node), wd.series(node)[365:]))
+
+        wd2.to_file(self.test_data_file)
+        self.assertEqual(WeatherData.from_file(self.test_data_file), wd2)
+        with self.assertRaises(ValueError):
+            wd.select_years(2015)
+
     # Helpers
 
 
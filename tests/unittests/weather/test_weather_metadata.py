@@ -6,6 +6,7 @@ import unittest
 from datetime import datetime
 from pathlib import Path
 
+from emodpy_malaria.node_offsets import decode_node_offsets, encode_node_offsets
 from emodpy_malaria.weather import WeatherMetadata, WeatherAttributes
 from emodpy_malaria.weather.weather_metadata import _META_ID_REFERENCE
 
@@ -104,6 +105,46 @@ class WeatherMetadataTests(unittest.TestCase):
         self.assertEqual(wm1.author, expected_meta["Author"])
         self.assertEqual(expected_offset_str, wm2.node_offset_str)
 
+    def test_metadata_node_offset_arrays(self):
+        wm1: WeatherMetadata = WeatherMetadata.from_file(self.case_dtk_file)
+        wm2: WeatherMetadata = WeatherMetadata(node_ids=wm1.node_offset_arrays, attributes=wm1.attributes)
+        self.assertEqual(wm1, wm2)
+        self.assertEqual(wm1.node_offsets, wm2.node_offsets)
+        self.assertEqual(wm1.node_offset_str, wm2.node_offset_str)
+
+        wm3: WeatherMetadata = WeatherMetadata(node_ids={2: 0, 1: 12}, series_len=3)
+        self.assertNotEqual(WeatherMetadata(node_ids={1: 0, 2: 12}, series_len=3), wm3)
+        self.assertEqual(wm3.offset_nodes, {0: [2], 12: [1]})
+
+    def test_metadata_node_offsets_edits_are_saved(self):
+        wm: WeatherMetadata = WeatherMetadata(node_ids={1: 0, 2: 12}, series_len=3)
+        wm.node_offsets[3] = 0
+        del wm.node_offsets[2]
+        wm.to_file(self.test_file)
+
+        self.assertEqual(wm.nodes, [1, 3])
+        self.assertEqual(wm.node_count, 2)
+        self.assertEqual(WeatherMetadata.from_file(self.test_file).node_offsets, {1: 0, 3: 0})
+
+        wm.node_offsets.update({4: 12})
+        wm.node_offsets.pop(1)
+        self.assertEqual(wm.nodes, [3, 4])
+        self.assertEqual(wm.node_offset_arrays[1].tolist(), [0, 12])
+
+    def test_node_offsets_codec(self):
+        offset_str = "0000000100000000000000020000000c0000000300000018"
+        nodes, offsets = decode_node_offsets(offset_str.upper())
+        self.assertSequenceEqual(nodes.tolist(), [1, 2, 3])
+        self.assertSequenceEqual(offsets.tolist(), [0, 12, 24])
+        self.assertEqual(encode_node_offsets(nodes, offsets), offset_str)
+        self.assertEqual(encode_node_offsets([1, 2, 3], [0, 12, 24], uppercase=True), offset_str.upper())
+
+        with self.assertRaises(ValueError):
+            decode_node_offsets(offset_str[:-1])
+
+        with self.assertRaises(ValueError):
+            encode_node_offsets([self.max_uint32 + 1], [0])
+
     def test_metadata_required_defaults(self):
         required = WeatherMetadata.required_metadata_defaults_dict()
         required2 = WeatherMetadata.required_metadata_defaults_dict(exclude_keys=list(required))
@@ -1,6 +1,10 @@
+import asyncio
+import concurrent.futures
 import os
 import tempfile
+import threading
 import unittest
+import uuid
 
 from typing import List
 
@@ -9,9 +13,22 @@ from idmtools_platform_comps.ssmt_work_items.comps_workitems import SSMTWorkItem
 
 from emodpy_malaria.weather import *
 
+from test_weather_cache import LocalAsset, LocalPlatform, LocalWeatherRequest
+
 _FILE_COUNT = 8
 
 
+class BlockingWeatherRequest(LocalWeatherRequest):
+    """Local weather request which work item runs until released."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.release = threading.Event()
+
+    def _run_work_item(self, weather_args: WeatherArgs, request_name: str = None) -> str:
+        self.release.wait()
+        return super()._run_work_item(weather_args=weather_args, request_name=request_name)
+
+
 def ls_glob(local_dir: Union[str, Path]):
     return list(Path(local_dir).glob("*.bin*"))
 
@@ -136,6 +153,86 @@ class WeatherRequestTests(unittest.TestCase):
         # Confirm only one file is downloaded.
         self._validate_download_report(wr=wr.download(), ok_count=1, skip_count=_FILE_COUNT-1)
 
+    # Download tests, using a local stand-in platform
+    def test_weather_request_download_local(self):
+        platform = LocalPlatform(asset_dir=self.current_dir.joinpath("case_default_names_all"))
+        wr = WeatherRequest(platform=platform, local_dir=self.test_dir)
+        wr.download(data_id=str(uuid.uuid4()), max_workers=3)
+        self._validate_download_report(wr)
+        self._validate_file_read(ls_glob(self.test_dir))
+        self.assertEqual(wr.report.download_bytes, sum([a.length for a in platform.assets]))
+        self.assertGreater(wr.report.download_throughput, 0)
+
+        # Confirm all files are skipped, or downloaded again if forced
+        self._validate_download_report(wr=wr.download(), ok_count=0, skip_count=_FILE_COUNT)
+        self._validate_download_report(wr=wr.download(force=True))
+
+    def test_weather_request_download_resume(self):
+        platform = LocalPlatform(asset_dir=self.current_dir.joinpath("case_default_names_all"))
+        asset: LocalAsset = platform.assets[0]
+        asset.fail_count = 2
+        wr = WeatherRequest(platform=platform, local_dir=self.test_dir)
+        wr._download_backoff = 0
+        wr.download(data_id=str(uuid.uuid4()))
+        self._validate_download_report(wr)
+        self.assertEqual(asset.resume_positions, [0, asset.length // 2, asset.length // 2 + asset.length // 4])
+        self.assertEqual(self.test_dir.joinpath(asset.filename).read_bytes(), asset.file_path.read_bytes())
+        self.assertEqual(wr.report.download_bytes, sum([a.length for a in platform.assets]))
+
+    def test_weather_request_download_invalid_checksum(self):
+        platform = LocalPlatform(asset_dir=self.current_dir.joinpath("case_default_names_all"))
+        asset: LocalAsset = platform.assets[0]
+        asset.checksum = "0" * 32
+        wr = WeatherRequest(platform=platform, local_dir=self.test_dir)
+        wr._download_backoff = 0
+        wr.download(data_id=str(uuid.uuid4()), retries=1)
+        self.assertEqual(wr.report.download["fail"], [str(self.test_dir.joinpath(asset.filename))])
+        self.assertEqual(len(wr.report.download["ok"]), _FILE_COUNT - 1)
+        self.assertEqual(asset.download_count, 2)
+        self.assertEqual(list(self.test_dir.glob("*.part")), [])
+        self.assertFalse(self.test_dir.joinpath(asset.filename).exists())
+
+    # Asynchronous and batch requests, using a local stand-in platform
+    def test_weather_request_generate_async(self):
+        platform = LocalPlatform(asset_dir=self.current_dir.joinpath("case_default_names_all"))
+        wr = BlockingWeatherRequest(platform=platform, local_dir=self.test_dir)
+        job = wr.generate_async(weather_args=self.wa, download=True)
+        self.assertIn(job.status(), ["pending", "running"])
+        with self.assertRaises(concurrent.futures.TimeoutError):
+            job.wait(timeout=0.05)
+
+        wr.release.set()
+        self.assertIs(job.wait(timeout=10), wr)
+        self.assertEqual(job.status(), "succeeded")
+        self.assertEqual(len(wr.data_id), 36)
+        self.assertTrue(wr.files_exist)
+
+    def test_weather_request_generate_await(self):
+        platform = LocalPlatform(asset_dir=self.current_dir.joinpath("case_default_names_all"))
+        requests = [LocalWeatherRequest(platform=platform, local_dir=self.test_dir.joinpath(str(i))) for i in range(3)]
+
+        async def generate_all():
+            return await asyncio.gather(*[wr.generate_async(weather_args=self.wa, download=True) for wr in requests])
+
+        self.assertEqual(asyncio.run(generate_all()), requests)
+        for wr in requests:
+            self.assertEqual(wr.work_item_count, 1)
+            self._validate_file_list(ls_glob(wr.local_dir))
+
+    def test_generate_weather_batch_cached(self):
+        platform = LocalPlatform(asset_dir=self.current_dir.joinpath("case_default_names_all"))
+        cache = WeatherCache(cache_dir=self.test_dir.joinpath("cache"))
+        wa_list = [self.wa, WeatherArgs(site_file=str(self.sites_csv), start_date=2016, node_column="nodes")]
+        for wa in wa_list:
+            cache.put(key=WeatherCache.make_key(wa, "ERA5"), files=[a.file_path for a in platform.assets])
+
+        local_dirs = [self.test_dir.joinpath("2015"), self.test_dir.joinpath("2016")]
+        requests = generate_weather_batch(platform=platform, weather_args=wa_list, local_dirs=local_dirs, cache=cache)
+        self.assertEqual([wr.local_dir for wr in requests], local_dirs)
+        self.assertEqual(platform.download_count, 0)
+        for wr in requests:
+            self.assertTrue(wr.files_exist)
+
     def _validate_file_list(self, files: Union[List[str], List[Path]]):
         files = [Path(f) for f in files]
         self.assertEqual(len(files), _FILE_COUNT)
@@ -1,3 +1,4 @@
+import importlib.util
 import numpy as np
 import pandas as pd
 import shutil
@@ -9,7 +10,7 @@ from typing import Dict, Union
 
 from emodpy_malaria.weather.weather_variable import WeatherVariable
 from emodpy_malaria.weather.weather_metadata import WeatherMetadata, WeatherAttributes
-from emodpy_malaria.weather.weather_data import WeatherData
+from emodpy_malaria.weather.weather_data import WeatherData, DataFrameInfo
 from emodpy_malaria.weather.weather_set import WeatherSet
 
 from test_weather_data import read_df, read_bin
@@ -150,6 +151,18 @@ class WeatherSetTests(unittest.TestCase):
 
         self.validate_weather_set(ws)
 
+    def test_from_csv_same_as_weather_data(self):
+        ws = WeatherSet.from_csv(file_path=self.data_all_csv,
+                                 node_column="node",
+                                 step_column="step",
+                                 weather_columns=self.data_all_csv_columns)
+
+        for v, column in self.data_all_csv_columns.items():
+            info = DataFrameInfo(node_column="node", step_column="step", value_column=column)
+            wd = WeatherData.from_csv(self.data_all_csv, info=info)
+            self.assertEqual(wd.metadata.node_offsets, ws[v].metadata.node_offsets)
+            self.assertTrue(np.array_equal(wd.data, ws[v].data))
+
     def test_from_csv_custom_cols_meta(self):
         ws = WeatherSet.from_csv(file_path=self.data_all_csv,
                                  node_column="node",
@@ -204,6 +217,85 @@ class WeatherSetTests(unittest.TestCase):
         df_expected = read_df(self.data_all_defaults_csv)
         self.assertTrue(df_expected.equals(df_actual))
 
+    def test_to_csv_chunk_nodes(self):
+        ws = WeatherSet.from_csv(self.data_all_defaults_csv)
+        ws.to_files(dir_path=self.test_dir)
+        ws_mmap = WeatherSet.from_files(dir_path=self.test_dir, mmap=True)
+
+        csv_path = self.test_dir.joinpath("data_all.csv")
+        chunk_csv_path = self.test_dir.joinpath("data_all_chunks.csv")
+        ws.to_csv(csv_path)
+        self.assertIsNone(ws_mmap.to_csv(chunk_csv_path, chunk_nodes=2))
+        self.assertEqual(Path(csv_path).read_text(), Path(chunk_csv_path).read_text())
+
+    # Test transformations
+    def test_transform(self):
+        ws = WeatherSet.from_files(dir_path=self.dtk_dir_all)
+        ws2 = WeatherSet.from_files(dir_path=self.dtk_dir_all)
+        air, rain = WeatherVariable.AIR_TEMPERATURE, WeatherVariable.RAINFALL
+        ws2.offset(1.5, weather_variables=[air]).scale(0.5, weather_variables=[rain]).roll(1)
+        self.assertTrue(np.allclose(ws2[air].data, np.roll(ws[air].data + 1.5, 1, axis=1)))
+        self.assertTrue(np.allclose(ws2[rain].data, np.roll(ws[rain].data * 0.5, 1, axis=1)))
+        self.assertEqual(ws2[air].metadata, ws[air].metadata)
+
+        ws2.resample("year", how="max")
+        for v in ws2.weather_variables:
+            self.assertEqual(ws2[v].metadata.series_len, 1)
+            self.assertEqual(ws2[v].metadata.update_resolution, "CLIMATE_UPDATE_YEAR")
+
+    # Test from/to Parquet and Feather files
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+    def test_to_from_parquet(self):
+        ws = WeatherSet.from_csv(self.data_all_defaults_csv)
+        file_path = self.test_dir.joinpath("data_all.parquet")
+        ws.to_parquet(file_path, chunk_nodes=2)
+        ws2 = WeatherSet.from_parquet(file_path)
+        self.assertEqual(ws, ws2)
+        for v in ws.weather_variables:
+            self.assertEqual(ws[v].metadata.node_offsets, ws2[v].metadata.node_offsets)
+            self.assertEqual(ws[v].metadata.attributes, ws2[v].metadata.attributes)
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+    def test_from_parquet_nodes(self):
+        ws = WeatherSet.from_csv(self.data_all_defaults_csv)
+        file_path = self.test_dir.joinpath("data_all.parquet")
+        ws.to_parquet(file_path, chunk_nodes=1)
+        nodes = sorted(ws.values()[0].metadata.nodes)[1:3]
+        ws2 = WeatherSet.from_parquet(file_path, nodes=nodes)
+        self.assertEqual(sorted(ws2.values()[0].metadata.nodes), nodes)
+        pd.testing.assert_frame_equal(ws.to_dataframe(nodes=nodes), ws2.to_dataframe())
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+    def test_to_from_feather(self):
+        ws = WeatherSet.from_csv(self.data_all_defaults_csv)
+        file_path = self.test_dir.joinpath("data_all.feather")
+        ws.to_feather(file_path, chunk_nodes=2)
+        self.assertEqual(ws, WeatherSet.from_feather(file_path))
+        nodes = sorted(ws.values()[0].metadata.nodes)[:1]
+        ws2 = WeatherSet.from_feather(file_path, nodes=nodes)
+        pd.testing.assert_frame_equal(ws.to_dataframe(nodes=nodes), ws2.to_dataframe())
+
+        ws.to_feather(file_path, chunk_nodes=2, compression="zstd")
+        nodes = sorted(ws.values()[0].metadata.nodes)[1:4]   # spans record batches
+        ws3 = WeatherSet.from_feather(file_path, nodes=nodes)
+        self.assertEqual(sorted(ws3.values()[0].metadata.nodes), nodes)
+        pd.testing.assert_frame_equal(ws.to_dataframe(nodes=nodes), ws3.to_dataframe())
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+    def test_arrow_variable_attributes(self):
+        ws = WeatherSet.from_csv(self.data_all_defaults_csv)
+        for v in ws.weather_variables:
+            ws[v].metadata.provenance = f"{v.name} source"
+        nodes = sorted(ws.values()[0].metadata.nodes)[1:3]
+        for suffix, to_file, from_file in [("parquet", ws.to_parquet, WeatherSet.from_parquet),
+                                           ("feather", ws.to_feather, WeatherSet.from_feather)]:
+            file_path = self.test_dir.joinpath(f"data_all.{suffix}")
+            to_file(file_path, chunk_nodes=2)
+            for selected in [None, nodes]:
+                ws2 = from_file(file_path, nodes=selected)
+                for v in ws.weather_variables:
+                    self.assertEqual(ws2[v].metadata.provenance, f"{v.name} source")
+
     # Test from/to files
     def test_from_files(self):
         ws = WeatherSet.from_files(dir_path=self.dtk_dir_all)
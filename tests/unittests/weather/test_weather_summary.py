@@ -0,0 +1,130 @@
+import numpy as np
+import os
+import pandas as pd
+import shutil
+import tempfile
+import unittest
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+from emodpy_malaria.weather.weather_variable import WeatherVariable
+from emodpy_malaria.weather.weather_data import WeatherData
+from emodpy_malaria.weather.weather_set import WeatherSet
+from emodpy_malaria.weather.weather_summary import WeatherSummary
+
+
+def summarize_file(bin_path: Path, percentiles: list) -> pd.DataFrame:
+    return WeatherSummary.from_file(bin_path, percentiles=percentiles).to_dataframe()
+
+
+class WeatherSummaryTests(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.current_dir = Path(__file__).parent
+        self.test_dir = Path(tempfile.mkdtemp(suffix="emodpy_malaria_unittests"))
+        # Copy weather files, summary files are created next to them.
+        file_name = "dtk_15arcmin_air_temperature_daily.bin"
+        for f in [file_name, f"{file_name}.json"]:
+            shutil.copy(self.current_dir.joinpath("case_default_names", f), self.test_dir.joinpath(f))
+        self.bin_path = self.test_dir.joinpath(file_name)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.test_dir)
+
+    def test_from_weather_data(self):
+        wd = WeatherData.from_file(self.bin_path)
+        summary = WeatherSummary.from_weather_data(wd, percentiles=[10, 50])
+        self.assertEqual(summary.nodes, sorted(wd.metadata.nodes))
+        self.assertEqual(summary.stats["monthly_mean"].shape, (wd.data.shape[0], 12))
+
+        node = wd.metadata.nodes[3]
+        series = pd.Series(wd.series(node).astype(np.float64), index=pd.date_range("2010-01-01", periods=1096))
+        expected = series.groupby(series.index.month).mean().to_numpy()
+        node_stats = summary.node(node)
+        self.assertTrue(np.allclose(node_stats["monthly_mean"], expected))
+        self.assertTrue(np.allclose(node_stats["percentiles"], np.percentile(series, [10, 50])))
+        self.assertNotIn("dry_days", node_stats)
+
+        df = summary.to_dataframe()
+        self.assertEqual(list(df.columns), [f"monthly_mean_{m}" for m in range(1, 13)] + ["p10", "p50"])
+        self.assertEqual(len(df), len(wd.metadata.nodes))
+        self.assertAlmostEqual(df.loc[node, "p50"], np.median(series))
+
+    def test_dry_spells(self):
+        node_series = {1: [0, 0, 5, 0, 0, 0, 2], 2: [3, 3, 3, 3, 3, 3, 3], 3: [0, 0, 5, 0, 0, 0, 2]}
+        wd = WeatherData.from_dict(node_series)
+        summary = WeatherSummary.from_weather_data(wd, dry_threshold=1.0)
+        self.assertEqual(summary.node(1)["dry_days"], 5)
+        self.assertEqual(summary.node(1)["dry_spell_max"], 3)
+        self.assertEqual(summary.node(3)["dry_spell_mean"], 2.5)
+        self.assertEqual(summary.node(2)["dry_spell_max"], 0)
+        self.assertEqual(summary.stats["dry_days"].shape, (2,))
+
+    def test_from_weather_data_blocks(self):
+        wd = WeatherData.open(self.bin_path, mmap=True)
+        summary = WeatherSummary.from_weather_data(wd, dry_threshold=10.0)
+        # Blocks of 3 rows (the last one partial) give the same statistics as a single block.
+        with mock.patch("emodpy_malaria.weather.weather_summary._BLOCK_VALUE_COUNT", 3 * wd.data.shape[1]):
+            blocks_summary = WeatherSummary.from_weather_data(wd, dry_threshold=10.0)
+
+        self.assertEqual(list(summary.stats), list(blocks_summary.stats))
+        for name, values in summary.stats.items():
+            np.testing.assert_allclose(blocks_summary.stats[name], values, equal_nan=True)
+        self.assertEqual(summary.stats["dry_days"].dtype, np.int64)
+
+    def test_from_file_cached(self):
+        summary = WeatherSummary.from_file(self.bin_path)
+        summary_path = WeatherSummary.summary_file_path(self.bin_path)
+        self.assertTrue(summary_path.is_file())
+
+        # Unchanged or only touched files, statistics are read from the summary file.
+        with mock.patch.object(WeatherSummary, "from_weather_data", side_effect=AssertionError("Not cached")):
+            summary2 = WeatherSummary.from_file(self.bin_path)
+            os.utime(self.bin_path, ns=(1, 1))
+            summary3 = WeatherSummary.from_file(self.bin_path)
+        for s in [summary2, summary3]:
+            pd.testing.assert_frame_equal(summary.to_dataframe(), s.to_dataframe())
+
+        # Different parameters or changed files, statistics are computed again.
+        summary4 = WeatherSummary.from_file(self.bin_path, percentiles=[50])
+        self.assertEqual(list(summary4.to_dataframe().columns)[-1], "p50")
+        WeatherData.from_file(self.bin_path).offset(1.0).to_file(self.bin_path)
+        summary5 = WeatherSummary.from_file(self.bin_path)
+        self.assertTrue(np.allclose(summary5.stats["percentiles"], summary.stats["percentiles"] + 1.0))
+
+    def test_from_file_processes(self):
+        # Processes summarizing the same file each write their own temp file before replacing the summary file.
+        percentiles = [[50], [5, 95]] * 4
+        with ProcessPoolExecutor(max_workers=4) as executor:
+            dfs = list(executor.map(summarize_file, [self.bin_path] * len(percentiles), percentiles))
+
+        self.assertEqual(list(self.test_dir.glob(".*.tmp")), [])
+        summary = WeatherSummary.from_file(self.bin_path, percentiles=percentiles[-1])
+        pd.testing.assert_frame_equal(summary.to_dataframe(), dfs[-1])
+
+        with mock.patch.object(np, "savez", wraps=np.savez) as savez:
+            WeatherSummary.from_file(self.bin_path, percentiles=[25])
+        self.assertIn(f".{os.getpid()}.", savez.call_args.args[0].name)
+        self.assertTrue(WeatherSummary.summary_file_path(self.bin_path).is_file())
+
+    def test_weather_set_summary_index(self):
+        weather_dir = self.test_dir.joinpath("weather")
+        shutil.copytree(self.current_dir.joinpath("case_default_names_all"), weather_dir)
+        ws = WeatherSet.from_files(dir_path=weather_dir, mmap=True)
+        summaries = ws.summary_index(percentiles=[50])
+        self.assertEqual(list(summaries), ws.weather_variables)
+        self.assertIn("dry_spell_max", summaries[WeatherVariable.RAINFALL].stats)
+        self.assertNotIn("dry_spell_max", summaries[WeatherVariable.AIR_TEMPERATURE].stats)
+        self.assertEqual(len(list(weather_dir.glob("*.summary.npz"))), len(ws.weather_variables))
+
+        # Transformed data is summarized in memory.
+        ws.offset(1.0, weather_variables=[WeatherVariable.AIR_TEMPERATURE])
+        summaries2 = ws.summary_index(percentiles=[50])
+        air = WeatherVariable.AIR_TEMPERATURE
+        self.assertTrue(np.allclose(summaries2[air].stats["percentiles"], summaries[air].stats["percentiles"] + 1))
+
+
+if __name__ == '__main__':
+    unittest.main()